@@ -124,6 +124,28 @@ def _add_require_log_level():
     logging.Logger.require = require
 
 
+def _initialize_worker():
+    """Set up logging in a worker process.
+
+    Worker processes that are not forked from the main process do not inherit the "require" log
+    level or the handlers added by :func:`initialize`. The level is added, and if the root logger
+    has no handlers, warnings and errors are written to stderr, with errors stopping the worker.
+    Used as the initializer of process pools.
+
+    """
+    _add_require_log_level()
+    logger = logging.getLogger()
+    if not logger.handlers:
+        logging_handler_err = _ErrorHandler()
+        logging_handler_err.setLevel(logging.WARNING)
+        logging_handler_err.setFormatter(
+            logging.Formatter(
+                fmt="%(asctime)s %(levelname)-10s: %(name)s - %(message)s", datefmt="%H:%M:%S"
+            )
+        )
+        logger.addHandler(logging_handler_err)
+
+
 def _get_verbosity_number(verbosity):
     """Get the numerical level associated with the verbosity.
 
@@ -1,5 +1,8 @@
 from .abaqus_IO import read_abaqus_file
+from .gmsh_IO import read_gmsh_model
 from .grid_mesh import GridMesh
 from .make_gridmesh import make_gridmesh
 from .mesh import Mesh
-from .xdmf_IO import write_xdmf_file
+from .ray_tracing import trace_tracks
+from .spatial_index import BoundingVolumeHierarchy
+from .xdmf_IO import read_xdmf_file, write_xdmf_file
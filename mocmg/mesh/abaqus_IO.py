@@ -1,8 +1,17 @@
 """Functions for reading and writing Abaqus files."""
+import hashlib
 import logging
-
+import mmap
+import os
+import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import h5py
 import numpy as np
 
+from ..initialize import _initialize_worker
 from .mesh import Mesh
 
 module_log = logging.getLogger(__name__)
@@ -23,60 +32,388 @@ abaqus_1d = {
     "T3D2": "line",
 }
 
+# Increment when the layout of the cache file or the parsed mesh data changes.
+_cache_version = 1
+
 
-def read_abaqus_file(filepath):
+def read_abaqus_file(filepath, processes=None, cache=False):
     """Read an Abaqus file into a mesh object.
 
+    The file is memory-mapped and the keyword lines are located in one scan. Then each *NODE,
+    *ELEMENT, and *ELSET block is converted to a numpy array in a single call.
+
     Args:
         filepath (str): Filepath to the Abaqus file.
 
+        processes (int, optional): Number of worker processes used to parse the keyword blocks.
+            Each worker memory-maps the file and returns the arrays for its blocks.
+            By default, the blocks are parsed in this process.
+
+        cache (bool, optional): Save the parsed mesh to a binary sidecar file named
+            'filepath.cache.h5', and load the mesh from it on later reads instead of parsing the
+            text. The sidecar is used only if the size and content of the Abaqus file match those
+            it was made from, so the file content is hashed on every read. The loaded arrays are
+            memory-mapped from the sidecar.
+
     Returns:
         mocmg.mesh.Mesh : The mesh.
     """
+    module_log.require(
+        processes is None or processes > 0, "Number of processes must be greater than 0."
+    )
+    if cache:
+        cache_filepath = filepath + ".cache.h5"
+        file_key = _get_file_key(filepath, cache_filepath)
+        if file_key is None:
+            module_log.info(f"Reading cached mesh data from {cache_filepath}")
+            return _read_cache(cache_filepath)
+
     module_log.info(f"Reading mesh data from {filepath}")
-    # read data in blocks based upon keyword
-    nodes = {}
+    mesh = _parse_abaqus_file(filepath, processes)
+    if cache:
+        module_log.info(f"Writing cached mesh data to {cache_filepath}")
+        _write_cache(cache_filepath, mesh, file_key)
+
+    return mesh
+
+
+def _parse_abaqus_file(filepath, processes):
+    """Parse the keyword blocks of the Abaqus file into a mesh object."""
+    with _map_file(filepath) as data:
+        blocks = []
+        for header, start, end in _find_keyword_blocks(data):
+            keyword = header.partition(",")[0].strip().replace("*", "").upper()
+            if keyword in ("NODE", "ELEMENT", "ELSET"):
+                blocks.append((header, keyword, start, end))
+
+        if processes is None:
+            arrays = [_read_block(data, keyword, start, end) for _, keyword, start, end in blocks]
+
+    if processes is not None:
+        module_log.info(f"Parsing {len(blocks)} keyword blocks with {processes} processes")
+        chunksize = max(1, len(blocks) // (4 * processes))
+        with ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker) as executor:
+            arrays = list(
+                executor.map(
+                    _read_block_from_file,
+                    [filepath] * len(blocks),
+                    [keyword for _, keyword, _, _ in blocks],
+                    [start for _, _, start, _ in blocks],
+                    [end for _, _, _, end in blocks],
+                    chunksize=chunksize,
+                )
+            )
+
+    node_blocks, elements, element_sets = _gather_blocks(blocks, arrays)
+    if node_blocks:
+        nodes = np.concatenate(node_blocks)
+    else:
+        nodes = np.empty((0, 4))
+    elements = {
+        elem_type: np.concatenate(elem_blocks) for elem_type, elem_blocks in elements.items()
+    }
+    _convert_abaqus_to_topo_type(elements)
+
+    return Mesh.from_arrays(
+        nodes[:, 0].astype(np.int64),
+        nodes[:, 1:],
+        {elem_type: elem_block[:, 0] for elem_type, elem_block in elements.items()},
+        {elem_type: elem_block[:, 1:] for elem_type, elem_block in elements.items()},
+        element_sets,
+    )
+
+
+def _gather_blocks(blocks, arrays):
+    """Gather the arrays of the keyword blocks based upon keyword.
+
+    Returns:
+        list, dict, dict: The *NODE arrays, the *ELEMENT arrays of each element type, and the
+        *ELSET arrays by set name.
+    """
+    node_blocks = []
     elements = {}
     element_sets = {}
-    with open(filepath) as f:
-        line = f.readline()
-        while True:
-            # EOF
-            if not line:
-                break
-
-            # Comment
-            if line.startswith("**"):
-                line = f.readline()
-                continue
-
-            # Keywords
-            keyword = line.partition(",")[0].strip().replace("*", "").upper()
-            if keyword == "NODE":
-                nodes, line = _read_nodes(f, nodes)
-            elif keyword == "ELEMENT":
-                elem_type = _get_param(line, "TYPE")
-                elem_block, line = _read_elements(f)
-                if elem_type in elements:
-                    elements[elem_type].update(elem_block)
-                else:
-                    elements[elem_type] = elem_block
-            elif keyword == "ELSET":
-                element_set_name = _get_param(line, "ELSET")
-                elset, line = _read_element_set(f)
-                # If an elset is split into multiple sections, uncomment this code.
-                #                if element_set_name in element_sets:
-                #                    element_sets[element_set_name] = np.concatenate(
-                #                        element_sets[element_set_name], elset
-                #                    )
-                #                else:
-                element_sets[element_set_name] = elset
+    for (header, keyword, _, _), array in zip(blocks, arrays):
+        if keyword == "ELSET":
+            element_set_name = _get_param(header, "ELSET")
+            # If an elset is split into multiple sections, only the last section is kept.
+            element_sets[element_set_name] = array
+        elif array.size == 0:
+            # Empty *NODE and *ELEMENT blocks have no columns, so they are skipped
+            continue
+        elif keyword == "NODE":
+            node_blocks.append(array)
+        else:
+            elem_type = _get_param(header, "TYPE")
+            if elem_type in elements:
+                elements[elem_type].append(array)
             else:
-                line = f.readline()
+                elements[elem_type] = [array]
+
+    return node_blocks, elements, element_sets
 
-    _convert_abaqus_to_topo_type(elements)
 
-    return Mesh(nodes, elements, element_sets)
+@contextmanager
+def _map_file(filepath):
+    """Memory-map a file for reading. Empty files, which cannot be mapped, give empty bytes."""
+    with open(filepath, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+
+def _read_block(data, keyword, start, end):
+    """Convert the data of a keyword block to a numpy array."""
+    if keyword == "NODE":
+        return _read_nodes(data[start:end])
+    elif keyword == "ELEMENT":
+        return _read_elements(data[start:end])
+    else:
+        return _read_element_set(data[start:end])
+
+
+def _read_block_from_file(filepath, keyword, start, end):
+    """Convert the data of a keyword block to a numpy array. Used by worker processes."""
+    with _map_file(filepath) as data:
+        return _read_block(data, keyword, start, end)
+
+
+def _get_file_key(filepath, cache_filepath):
+    """Check if the cache file is valid for the Abaqus file.
+
+    The cache is valid if the file size and the SHA-1 hash of the file content match the values
+    stored in the cache. The content is always hashed, since a copy or an archive extraction can
+    change a file without changing its size or modification time. If only the modification time
+    changed, the new time is stored in the cache.
+
+    Returns:
+        dict: The size, modification time, and hash of the Abaqus file if the cache is not
+        valid, or None if it is valid.
+    """
+    stat = os.stat(filepath)
+    file_key = {"version": _cache_version, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    cache_key = {}
+    if os.path.isfile(cache_filepath):
+        try:
+            with h5py.File(cache_filepath, "r") as f:
+                cache_key = dict(f.attrs)
+        except OSError:
+            module_log.warning(f"Could not read cache file {cache_filepath}. Ignoring it.")
+
+    with _map_file(filepath) as data:
+        file_key["sha1"] = hashlib.sha1(data).hexdigest()
+    if any(cache_key.get(key) != file_key[key] for key in ("version", "size", "sha1")):
+        return file_key
+    if cache_key.get("mtime_ns") != stat.st_mtime_ns:
+        try:
+            with h5py.File(cache_filepath, "r+") as f:
+                f.attrs["mtime_ns"] = stat.st_mtime_ns
+        except OSError:
+            module_log.warning(f"Could not update cache file {cache_filepath}.")
+    return None
+
+
+def _write_cache(cache_filepath, mesh, file_key):
+    """Write the mesh arrays to the cache file.
+
+    The data is written to a temporary file that then replaces the cache file, so that a reader
+    never sees a partially written cache and existing memory maps of the old cache stay valid.
+    """
+    tmp_filepath = cache_filepath + f".{os.getpid()}.tmp"
+    try:
+        with h5py.File(tmp_filepath, "w") as f:
+            f.create_dataset("vertex_ids", data=mesh.vertex_ids)
+            f.create_dataset("vertex_coords", data=mesh.vertex_coords)
+            cells_group = f.create_group("cells")
+            for i, cell_type in enumerate(mesh.cell_ids.keys()):
+                cell_group = cells_group.create_group(cell_type)
+                cell_group.attrs["order"] = i
+                cell_group.create_dataset("ids", data=mesh.cell_ids[cell_type])
+                cell_group.create_dataset("connectivity", data=mesh.cell_connectivity[cell_type])
+            # Store the sets as one array, since set names may not be valid HDF5 names.
+            set_names = list(mesh.cell_sets.keys())
+            set_arrays = [mesh.cell_sets[set_name] for set_name in set_names]
+            f.create_dataset(
+                "cell_sets",
+                data=np.concatenate(set_arrays) if set_arrays else np.empty(0, dtype=np.int64),
+            )
+            f.create_dataset("cell_set_offsets", data=np.cumsum([0] + [len(a) for a in set_arrays]))
+            f.attrs["cell_set_names"] = set_names
+            for key, value in file_key.items():
+                f.attrs[key] = value
+        os.replace(tmp_filepath, cache_filepath)
+    except OSError:
+        module_log.warning(f"Could not write cache file {cache_filepath}.")
+        if os.path.isfile(tmp_filepath):
+            os.remove(tmp_filepath)
+
+
+def _read_cache(cache_filepath):
+    """Read the mesh arrays from the cache file, memory-mapping them where possible."""
+    with h5py.File(cache_filepath, "r") as f:
+        vertex_ids = _map_dataset(cache_filepath, f["vertex_ids"])
+        vertex_coords = _map_dataset(cache_filepath, f["vertex_coords"])
+        cell_ids = {}
+        cell_connectivity = {}
+        cell_types = sorted(f["cells"].keys(), key=lambda k: f["cells"][k].attrs["order"])
+        for cell_type in cell_types:
+            cell_ids[cell_type] = _map_dataset(cache_filepath, f["cells"][cell_type]["ids"])
+            cell_connectivity[cell_type] = _map_dataset(
+                cache_filepath, f["cells"][cell_type]["connectivity"]
+            )
+        set_data = _map_dataset(cache_filepath, f["cell_sets"])
+        set_offsets = f["cell_set_offsets"][()]
+        set_names = [str(name) for name in f.attrs["cell_set_names"]]
+
+    cell_sets = {}
+    for i, set_name in enumerate(set_names):
+        cell_sets[set_name] = set_data[set_offsets[i] : set_offsets[i + 1]]
+
+    return Mesh.from_arrays(vertex_ids, vertex_coords, cell_ids, cell_connectivity, cell_sets)
+
+
+def _map_dataset(filepath, dataset):
+    """Memory-map a contiguous HDF5 dataset, or read it if it cannot be mapped."""
+    offset = dataset.id.get_offset()
+    if offset is None:
+        return dataset[()]
+    return np.memmap(filepath, dtype=dataset.dtype, mode="r", offset=offset, shape=dataset.shape)
+
+
+def _find_keyword_blocks(data):
+    """Find the keyword lines of the file and the data that follows each of them.
+
+    Comment lines, which start with "**", are not keyword lines. They are left in the data
+    blocks and removed when a block is parsed.
+
+    Returns:
+        list of (str, int, int): The keyword line, and the start and end byte offsets of the
+        data following the keyword line.
+    """
+    keyword_starts = [0] if data[:1] == b"*" and data[1:2] != b"*" else []
+    pos = data.find(b"\n*")
+    while pos != -1:
+        if data[pos + 2 : pos + 3] != b"*":
+            keyword_starts.append(pos + 1)
+        pos = data.find(b"\n*", pos + 1)
+
+    blocks = []
+    for i, keyword_start in enumerate(keyword_starts):
+        header_end = data.find(b"\n", keyword_start)
+        if header_end == -1:
+            header_end = len(data)
+        if i + 1 < len(keyword_starts):
+            block_end = keyword_starts[i + 1]
+        else:
+            block_end = len(data)
+        header = data[keyword_start:header_end].decode()
+        blocks.append((header, min(header_end + 1, block_end), block_end))
+
+    return blocks
+
+
+def _normalize_block(block):
+    """Remove comment lines, blank lines, and whitespace at the end of lines from a block.
+
+    Returns:
+        bytes: The data lines of the block, separated by a single newline.
+    """
+    if block.startswith(b"**") or b"\n**" in block:
+        block = _remove_comment_lines(block)
+    if b"\r" in block:
+        block = block.replace(b"\r", b"")
+    # The substitution is slow, so it is skipped unless a newline follows whitespace
+    chars = np.frombuffer(block, dtype=np.uint8)
+    newlines = np.flatnonzero(chars[1:] == ord("\n"))
+    if np.any(np.isin(chars[newlines], list(b" \t\n\f\v"))):
+        block = re.sub(rb"\s*\n", b"\n", block)
+    return block.strip()
+
+
+def _remove_comment_lines(block):
+    """Remove the lines that start with "**" from a block."""
+    data = b"\n" + block
+    parts = []
+    start = 0
+    pos = data.find(b"\n**")
+    while pos != -1:
+        parts.append(data[start:pos])
+        start = data.find(b"\n", pos + 1)
+        if start == -1:
+            start = len(data)
+            break
+        pos = data.find(b"\n**", start)
+    parts.append(data[start:])
+    return b"".join(parts)
+
+
+def _count_values(block):
+    """Count the comma or newline separated values of a normalized block.
+
+    A line that ends with a comma is continued on the next line.
+    """
+    return (
+        block.count(b",") + block.count(b"\n") - block.count(b",\n") + 1 - int(block.endswith(b","))
+    )
+
+
+def _parse_block(block, dtype, keyword, n_values):
+    """Convert a normalized block of comma separated numbers to a flat numpy array.
+
+    Args:
+        block (bytes): The normalized block.
+        dtype (numpy.dtype): The type of the values.
+        keyword (str): The keyword of the block, used in error messages.
+        n_values (int): The number of values in the block. If fewer values are parsed, a value
+            could not be read. Integer values with a decimal point or exponent are also invalid.
+
+    Returns:
+        numpy.ndarray: The values.
+    """
+    if not block:
+        return np.empty(0, dtype=dtype)
+    with warnings.catch_warnings():
+        # numpy warns when it stops at a value it cannot parse. The count check reports it.
+        warnings.simplefilter("ignore", DeprecationWarning)
+        values = np.fromstring(block.replace(b",", b" "), dtype=dtype, sep=" ")
+    if values.size != n_values or (
+        np.issubdtype(dtype, np.integer) and (b"." in block or b"e" in block or b"E" in block)
+    ):
+        module_log.error(f"Could not read *{keyword} block. Invalid value in data line.")
+    return values
+
+
+def _parse_rows(block, dtype, keyword):
+    """Convert a block with one row per data line, or continued data lines, to a 2D array."""
+    block = _normalize_block(block)
+    if not block:
+        return np.empty((0, 0), dtype=dtype)
+    # Count the values of each row from the commas before its end
+    chars = np.frombuffer(block, dtype=np.uint8)
+    newlines = np.flatnonzero(chars == ord("\n"))
+    row_ends = np.append(newlines[chars[newlines - 1] != ord(",")], len(chars))
+    commas = np.flatnonzero(chars == ord(","))
+    values_per_row = np.diff(np.searchsorted(commas, row_ends), prepend=0) + 1
+    values_per_row[-1] -= int(block.endswith(b","))
+    if np.any(values_per_row != values_per_row[0]):
+        module_log.error(f"Could not read *{keyword} block. Inconsistent line length.")
+    values = _parse_block(block, dtype, keyword, int(values_per_row.sum()))
+    return values.reshape(len(row_ends), values_per_row[0])
+
+
+def _read_nodes(block):
+    return _parse_rows(block, np.float64, "NODE")
+
+
+def _read_elements(block):
+    return _parse_rows(block, np.int64, "ELEMENT")
+
+
+def _read_element_set(block):
+    block = _normalize_block(block)
+    return _parse_block(block, np.int64, "ELSET", _count_values(block))
 
 
 def _convert_abaqus_to_topo_type(elements):
@@ -89,8 +426,7 @@ def _convert_abaqus_to_topo_type(elements):
     # Convert T3D9 to 8 elements (remove last element)
     for key in keys:
         if key == "M3D9":
-            for k in elements[key].keys():
-                elements[key][k] = elements[key][k][:-1]
+            elements[key] = elements[key][:, :-1]
 
     # convert abaqus types to mesh class topological types
     keys = [k for k in elements.keys()]
@@ -99,49 +435,6 @@ def _convert_abaqus_to_topo_type(elements):
         elements[abaqus_to_topo_type[key]] = elements.pop(key)
 
 
-def _read_nodes(f, nodes):
-    while True:
-        line = f.readline()
-        if not line or line.startswith("*"):
-            break
-
-        line = line.strip().split(",")
-        point_id, coords = line[0], line[1:]
-        coords = np.array([float(x) for x in coords])
-        nodes[int(point_id)] = coords
-
-    return nodes, line
-
-
-def _read_elements(f):
-    elem_block = {}
-    while True:
-        line = f.readline()
-        if not line or line.startswith("*"):
-            break
-
-        line = line.strip().split(",")
-        elem_id, node_ids = line[0], line[1:]
-        node_ids = np.array([int(x) for x in node_ids], dtype=int)
-        elem_block[int(elem_id)] = node_ids
-
-    return elem_block, line
-
-
-def _read_element_set(f):
-    elset = []
-    while True:
-        line = f.readline()
-        if not line or line.startswith("*"):
-            break
-
-        line = line.strip().strip(",").split(",")
-        elems = [int(x) for x in line]
-        elset.extend(elems)
-
-    return np.array(elset, dtype=int), line
-
-
 def _get_param(line, param):
     words = [w.strip().replace("*", "").upper() for w in line.split(",")]
     words = [w.split("=") for w in words]
@@ -0,0 +1,83 @@
+"""Functions for reading meshes directly from gmsh."""
+import logging
+
+import numpy as np
+
+from .mesh import Mesh
+
+module_log = logging.getLogger(__name__)
+
+gmsh_to_topo_type = {
+    # 2D
+    # triangle
+    2: "triangle",
+    9: "triangle6",
+    # quad
+    3: "quad",
+    16: "quad8",
+    10: "quad8",
+}
+
+
+def read_gmsh_model(name=""):
+    """Read the mesh of the current gmsh model into a mesh object.
+
+    The nodes, 2D elements, and 2D physical groups are retrieved with the bulk gmsh array
+    functions, so no file is written or parsed. Each physical group becomes a cell set, with its
+    name in upper case, which gives the same mesh as writing the model to an Abaqus file and
+    reading it with :func:`mocmg.mesh.read_abaqus_file`.
+
+    Args:
+        name (str, optional): Name of the mesh.
+
+    Returns:
+        mocmg.mesh.Mesh : The mesh.
+    """
+    # Imported here so that the rest of mocmg.mesh may be used without the gmsh library.
+    import gmsh
+
+    module_log.info("Reading mesh data from the gmsh model")
+    node_tags, coords, _ = gmsh.model.mesh.getNodes()
+    vertex_ids = np.asarray(node_tags, dtype=np.int64)
+    vertex_coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+
+    cell_ids = {}
+    cell_connectivity = {}
+    elem_types, elem_tags, elem_node_tags = gmsh.model.mesh.getElements(dim=2)
+    for elem_type, tags, node_tags in zip(elem_types, elem_tags, elem_node_tags):
+        module_log.require(
+            int(elem_type) in gmsh_to_topo_type,
+            f"Unrecognized gmsh element type: '{elem_type}'.",
+        )
+        topo_type = gmsh_to_topo_type[int(elem_type)]
+        tags = np.asarray(tags, dtype=np.int64)
+        connectivity = np.asarray(node_tags, dtype=np.int64).reshape(len(tags), -1)
+        # Remove the center vertex of 9 vertex quadrilaterals
+        if int(elem_type) == 10:
+            connectivity = connectivity[:, :-1]
+        if topo_type in cell_ids:
+            cell_ids[topo_type] = np.concatenate([cell_ids[topo_type], tags])
+            cell_connectivity[topo_type] = np.concatenate(
+                [cell_connectivity[topo_type], connectivity]
+            )
+        else:
+            cell_ids[topo_type] = tags
+            cell_connectivity[topo_type] = connectivity
+
+    cell_sets = {}
+    for dim, tag in gmsh.model.getPhysicalGroups(dim=2):
+        set_name = gmsh.model.getPhysicalName(dim, tag).upper()
+        if set_name == "":
+            set_name = f"PHYSICALSURFACE{tag}"
+        set_cells = []
+        for entity in gmsh.model.getEntitiesForPhysicalGroup(dim, tag):
+            _, entity_elem_tags, _ = gmsh.model.mesh.getElements(dim, entity)
+            set_cells.extend(np.asarray(tags, dtype=np.int64) for tags in entity_elem_tags)
+        if set_cells:
+            cell_sets[set_name] = np.concatenate(set_cells)
+        else:
+            cell_sets[set_name] = np.empty(0, dtype=np.int64)
+
+    return Mesh.from_arrays(
+        vertex_ids, vertex_coords, cell_ids, cell_connectivity, cell_sets, name=name
+    )
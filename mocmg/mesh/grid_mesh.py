@@ -1,5 +1,10 @@
 """The grid mesh class and related functions."""
+
+import functools
 import logging
+import re
+
+import numpy as np
 
 from .mesh import Mesh
 
@@ -12,7 +17,30 @@ _has_quadratic_edges = {
     "triangle6": True,
 }
 
-# TODO: Add all the methods for the base mesh class, but make them work with children meshes
+# The offset in (i, j) of the neighbor of a grid in each direction
+_neighbor_offsets = {
+    "east": (1, 0),
+    "west": (-1, 0),
+    "north": (0, 1),
+    "south": (0, -1),
+}
+
+_grid_name_pattern = re.compile(r"GRID_L(\d+)_(\d+)_(\d+)", re.IGNORECASE)
+
+
+def _leaf_only(method):
+    """Wrap a Mesh method so that it logs an error when called on a GridMesh with children."""
+
+    @functools.wraps(method)
+    def leaf_method(self, *args, **kwargs):
+        if self.children is not None:
+            module_log.error(
+                f"GridMesh.{method.__name__} is not supported for a GridMesh with children."
+                + " Call it on the leaves instead."
+            )
+        return method(self, *args, **kwargs)
+
+    return leaf_method
 
 
 class GridMesh(Mesh):
@@ -74,8 +102,46 @@ class GridMesh(Mesh):
         children (list of mocmg.mesh.GridMesh): GridMesh objects that make up this GridMesh object.
 
         parent (mocmg.mesh.GridMesh): GridMesh object that this mesh belongs to.
+
+    Note:
+        A GridMesh created with :meth:`from_mesh_rows` is a view of part of another mesh. It
+        holds only the rows of the vertices and cells of the other mesh that belong to it, and
+        its arrays are gathered from the arrays of the other mesh when they are accessed.
+        Replacing its vertices or cells makes it independent of the other mesh.
+
+        The cell count, cell set areas, and bounding box of each GridMesh are summarized on
+        first use, from the summaries of its children, so queries on a GridMesh with children
+        cost O(number of GridMeshes in the tree). Replacing the vertices or cells of a GridMesh
+        clears the summaries of it and its parents. Changes to the cell sets are not tracked.
+
+        A GridMesh named "GRID_Ln_i_j" has the grid index (n, i, j). The root of a tree keeps an
+        index from name and from grid index to each GridMesh in the tree, built on first use,
+        so grids, their children, and their neighbors are found without walking the tree.
+
+        A GridMesh with children supports n_cells, get_cells, get_set_area, and the grid
+        queries. The Mesh methods that need vertices and cells, compact_arrays,
+        get_vertex_rows, get_cell_types_and_rows, get_cell_rows, get_vertices_for_cells,
+        get_vertices, get_cell_areas, get_cell_bounding_boxes, and get_cell_area, log an error
+        and must be called on the leaves.
     """
 
+    _source_mesh = None
+    _vertex_rows = None
+    _cell_rows = None
+    _summary = None
+    _grid_index = None
+    _level_grids = None
+
+    compact_arrays = _leaf_only(Mesh.compact_arrays)
+    get_vertex_rows = _leaf_only(Mesh.get_vertex_rows)
+    get_cell_types_and_rows = _leaf_only(Mesh.get_cell_types_and_rows)
+    get_cell_rows = _leaf_only(Mesh.get_cell_rows)
+    get_vertices_for_cells = _leaf_only(Mesh.get_vertices_for_cells)
+    get_vertices = _leaf_only(Mesh.get_vertices)
+    get_cell_areas = _leaf_only(Mesh.get_cell_areas)
+    get_cell_bounding_boxes = _leaf_only(Mesh.get_cell_bounding_boxes)
+    get_cell_area = _leaf_only(Mesh.get_cell_area)
+
     def __init__(
         self,
         vertices=None,
@@ -105,3 +171,416 @@ class GridMesh(Mesh):
         else:
             super().__init__(vertices, cells, cell_sets, name)
             self.children = None
+
+    @classmethod
+    def from_mesh_rows(cls, mesh, vertex_rows, cell_rows, cell_sets=None, name=""):
+        """Create a grid mesh that is a view of part of another mesh.
+
+        Args:
+            mesh (mocmg.mesh.Mesh): The mesh that holds the vertex and cell arrays.
+            vertex_rows (numpy.ndarray): The rows of mesh.vertex_coords of the vertices of the
+                grid mesh.
+            cell_rows (dict): The rows of mesh.cell_connectivity of the cells of the grid mesh.
+                A dictionary of the form: "cell_type": row np.array.
+            cell_sets (dict, optional): The sets of cells that share the same attributes.
+            name (str, optional): Name of the grid mesh.
+
+        Returns:
+            mocmg.mesh.GridMesh: The grid mesh.
+        """
+        grid_mesh = cls(None, None, cell_sets, name)
+        grid_mesh._source_mesh = mesh
+        grid_mesh._vertex_rows = np.asarray(vertex_rows)
+        grid_mesh._cell_rows = {k: np.asarray(v) for k, v in cell_rows.items()}
+        return grid_mesh
+
+    @Mesh.vertices.setter
+    def vertices(self, vertices):
+        """Replace the vertices, making the vertices independent of another mesh."""
+        Mesh.vertices.fset(self, vertices)
+        self._vertex_rows = None
+        self._clear_summary()
+
+    @Mesh.cells.setter
+    def cells(self, cells):
+        """Replace the cells, making the cells independent of another mesh."""
+        Mesh.cells.fset(self, cells)
+        self._cell_rows = None
+        self._clear_summary()
+
+    @property
+    def vertex_ids(self):
+        """numpy.ndarray: The integer IDs of the vertices."""
+        if self._vertex_rows is not None:
+            return self._source_mesh.vertex_ids[self._vertex_rows]
+        return Mesh.vertex_ids.fget(self)
+
+    @property
+    def vertex_coords(self):
+        """numpy.ndarray: The x,y,z location of the vertices, in the order of vertex_ids."""
+        if self._vertex_rows is not None:
+            return self._source_mesh.vertex_coords[self._vertex_rows]
+        return Mesh.vertex_coords.fget(self)
+
+    @property
+    def cell_ids(self):
+        """dict: The integer IDs of the cells of each type."""
+        if self._cell_rows is not None:
+            cell_ids = self._source_mesh.cell_ids
+            return {k: cell_ids[k][rows] for k, rows in self._cell_rows.items()}
+        return Mesh.cell_ids.fget(self)
+
+    @property
+    def cell_connectivity(self):
+        """dict: The vertex IDs of the cells of each type, in the order of cell_ids."""
+        if self._cell_rows is not None:
+            connectivity = self._source_mesh.cell_connectivity
+            return {k: connectivity[k][rows] for k, rows in self._cell_rows.items()}
+        return Mesh.cell_connectivity.fget(self)
+
+    def _set_vertex_arrays(self, vertex_ids, vertex_coords):
+        """Replace the vertex data with the given arrays."""
+        super()._set_vertex_arrays(vertex_ids, vertex_coords)
+        self._vertex_rows = None
+        self._clear_summary()
+
+    def _set_cell_arrays(self, cell_ids, cell_connectivity):
+        """Replace the cell data with the given arrays."""
+        super()._set_cell_arrays(cell_ids, cell_connectivity)
+        self._cell_rows = None
+        self._clear_summary()
+
+    def _clear_summary(self):
+        """Clear the summary and grid divisions of this grid mesh and its parents."""
+        mesh = self
+        while mesh is not None:
+            mesh._summary = None
+            mesh._level_grids = None
+            mesh = getattr(mesh, "parent", None)
+
+    def _get_summary(self):
+        """Get the summary of this grid mesh, computing it from its children if necessary.
+
+        Returns:
+            dict: The number of cells "n_cells", the area of each cell set "set_areas", and the
+            bounding box of the vertices "bounding_box".
+        """
+        if self._summary is None:
+            if self.children is None:
+                self._summary = self._summarize_leaf()
+            else:
+                summaries = [child._get_summary() for child in self.children]
+                set_areas = {}
+                for summary in summaries:
+                    for set_name, area in summary["set_areas"].items():
+                        set_areas[set_name] = set_areas.get(set_name, 0.0) + area
+                boxes = np.stack([summary["bounding_box"] for summary in summaries])
+                self._summary = {
+                    "n_cells": sum(summary["n_cells"] for summary in summaries),
+                    "set_areas": set_areas,
+                    "bounding_box": np.stack([boxes[:, 0].min(axis=0), boxes[:, 1].max(axis=0)]),
+                }
+        return self._summary
+
+    def _summarize_leaf(self):
+        """Compute the summary of a grid mesh without children."""
+        areas = self.get_cell_areas()
+        set_areas = {}
+        for set_name, cells in self.cell_sets.items():
+            set_area = 0.0
+            for cell_type, (_ids, rows) in self._group_cells_by_type(cells).items():
+                set_area = set_area + areas[cell_type][rows].sum()
+            set_areas[set_name] = float(set_area)
+        vertex_coords = self.vertex_coords
+        if len(vertex_coords) > 0:
+            bounding_box = np.stack([vertex_coords.min(axis=0), vertex_coords.max(axis=0)])
+        else:
+            bounding_box = np.array([[np.inf] * 3, [-np.inf] * 3])
+        return {
+            "n_cells": Mesh.n_cells(self),
+            "set_areas": set_areas,
+            "bounding_box": bounding_box,
+        }
+
+    def n_cells(self):
+        """Get the number of cells in the mesh, including the cells of all children.
+
+        returns:
+            int: number of cells.
+        """
+        if self.children is None:
+            return super().n_cells()
+        return self._get_summary()["n_cells"]
+
+    def get_cells(self, cell_set_name):
+        """Get the cell ids for a given cell set name, including the cells of all children.
+
+        args:
+            cell_set_name (str): name of the cell set for which to retrieve cell ids.
+
+        returns:
+            numpy.ndarray: cell ids of the set.
+        """
+        if self.children is None:
+            return super().get_cells(cell_set_name)
+        if cell_set_name in self._get_summary()["set_areas"]:
+            return np.concatenate(
+                [
+                    child.get_cells(cell_set_name)
+                    for child in self.children
+                    if cell_set_name in child._get_summary()["set_areas"]
+                ]
+            )
+        else:
+            module_log.error(f"no cell set named '{cell_set_name}'.")
+
+    def get_set_area(self, cell_set_name):
+        """Get the area of a cell set for a given cell set name, including all children.
+
+        Args:
+            cell_set_name (str): The name of the cell set.
+
+        Returns:
+            float: The area of the set.
+        """
+        if self.children is None:
+            return super().get_set_area(cell_set_name)
+        set_areas = self._get_summary()["set_areas"]
+        if cell_set_name in set_areas:
+            return set_areas[cell_set_name]
+        else:
+            module_log.error(f"no cell set named '{cell_set_name}'.")
+
+    def get_bounding_box(self):
+        """Get the bounding box of the vertices of the mesh, including the vertices of all children.
+
+        Vertices on quadratic edges are included, but the edges may extend slightly past them.
+
+        Returns:
+            numpy.ndarray: The minimum and maximum x,y,z coordinates, shape (2, 3).
+        """
+        return self._get_summary()["bounding_box"].copy()
+
+    @property
+    def grid_index(self):
+        """tuple: The level, x-index, and y-index of the grid, from its name "GRID_Ln_i_j".
+
+        None if the name is not of this form.
+        """
+        return _parse_grid_name(self.name)
+
+    def _get_root(self):
+        """Get the root of the tree that contains this grid mesh."""
+        mesh = self
+        while getattr(mesh, "parent", None) is not None:
+            mesh = mesh.parent
+        return mesh
+
+    def _get_grid_index(self):
+        """Get the index of the tree from name and from grid index to grid mesh.
+
+        The index is kept by the root of the tree.
+
+        Returns:
+            dict, dict: The grid meshes by name and by grid index.
+        """
+        root = self._get_root()
+        if root._grid_index is None:
+            by_name = {}
+            by_grid_index = {}
+            meshes = [root]
+            while meshes:
+                mesh = meshes.pop()
+                by_name[mesh.name] = mesh
+                if mesh.grid_index is not None:
+                    by_grid_index[mesh.grid_index] = mesh
+                if mesh.children is not None:
+                    meshes.extend(mesh.children)
+            root._grid_index = (by_name, by_grid_index)
+        return root._grid_index
+
+    def get_grid(self, grid):
+        """Get a grid mesh in the tree that contains this grid mesh.
+
+        Args:
+            grid (str or tuple of int): The name of the grid, or its grid index (level, i, j).
+                Names of the form "GRID_Ln_i_j" are matched by grid index, so the zero padding
+                and case of the name do not matter.
+
+        Returns:
+            mocmg.mesh.GridMesh: The grid mesh.
+        """
+        by_name, by_grid_index = self._get_grid_index()
+        if isinstance(grid, str):
+            if grid in by_name:
+                return by_name[grid]
+            grid_index = _parse_grid_name(grid)
+        else:
+            grid_index = tuple(int(index) for index in grid)
+        if grid_index in by_grid_index:
+            return by_grid_index[grid_index]
+        else:
+            module_log.error(f"No grid '{grid}' in the grid mesh.")
+
+    def get_child(self, i, j):
+        """Get the child of this grid mesh with the given grid x-index and y-index.
+
+        Args:
+            i (int): The x-index of the child.
+            j (int): The y-index of the child.
+
+        Returns:
+            mocmg.mesh.GridMesh: The child, or None if this grid mesh has no such child.
+        """
+        if self.children is None:
+            return None
+        if self.grid_index is None:
+            level = 1
+        else:
+            level = self.grid_index[0] + 1
+        child = self._get_grid_index()[1].get((level, i, j))
+        if child is not None and getattr(child, "parent", None) is self:
+            return child
+        return None
+
+    def get_neighbor(self, direction):
+        """Get the grid mesh of the same level next to this grid mesh.
+
+        Args:
+            direction (str): One of "east", "west", "north", or "south", the directions of
+                increasing x, decreasing x, increasing y, and decreasing y.
+
+        Returns:
+            mocmg.mesh.GridMesh: The neighbor, or None if there is no grid in that direction.
+        """
+        module_log.require(
+            direction.lower() in _neighbor_offsets,
+            f"Unknown direction '{direction}'. Directions are {list(_neighbor_offsets)}.",
+        )
+        module_log.require(
+            self.grid_index is not None,
+            f"Grid mesh '{self.name}' is not named like 'GRID_Ln_i_j', so it has no neighbors.",
+        )
+        level, i, j = self.grid_index
+        di, dj = _neighbor_offsets[direction.lower()]
+        return self._get_grid_index()[1].get((level, i + di, j + dj))
+
+    def get_neighbors(self):
+        """Get the grid meshes of the same level next to this grid mesh.
+
+        Returns:
+            dict: The neighbor in each direction, of the form: "direction": GridMesh, where the
+            GridMesh is None if there is no grid in that direction. See :meth:`get_neighbor`.
+        """
+        return {direction: self.get_neighbor(direction) for direction in _neighbor_offsets}
+
+    def _get_level_grids(self):
+        """Get the grid divisions and grids of each level of the tree below this grid mesh.
+
+        The divisions of a level are found from the bounding boxes of its grids. The grids of a
+        level must form a rectangular array, with x-index i between the x divisions i-1 and i,
+        and y-index j between the y divisions j-1 and j, counting from the smallest i and j.
+
+        Returns:
+            list of tuple: For each level, the x divisions, the y divisions, a table of the
+            position of the grid with each (i, j) in the list of grids of the level, or -1,
+            and the list of grids of the level.
+        """
+        if self._level_grids is None:
+            self._level_grids = []
+            meshes = self.children
+            while meshes:
+                for mesh in meshes:
+                    module_log.require(
+                        mesh.grid_index is not None,
+                        f"Grid mesh '{mesh.name}' is not named like 'GRID_Ln_i_j'.",
+                    )
+                indices = np.array([mesh.grid_index[1:] for mesh in meshes])
+                indices = indices - indices.min(axis=0)
+                boxes = np.stack([mesh.get_bounding_box()[:, :2] for mesh in meshes])
+                divisions = []
+                for axis in range(2):
+                    n = indices[:, axis].max() + 1
+                    lower = np.full(n, np.inf)
+                    upper = np.full(n, -np.inf)
+                    np.minimum.at(lower, indices[:, axis], boxes[:, 0, axis])
+                    np.maximum.at(upper, indices[:, axis], boxes[:, 1, axis])
+                    module_log.require(
+                        bool(np.isfinite(lower).all()),
+                        f"The grids of level {meshes[0].grid_index[0]} are not a rectangular array.",
+                    )
+                    divisions.append(np.append(lower, upper[-1]))
+                table = np.full((len(divisions[0]) - 1, len(divisions[1]) - 1), -1, dtype=np.int64)
+                table[indices[:, 0], indices[:, 1]] = np.arange(len(meshes))
+                self._level_grids.append((divisions[0], divisions[1], table, meshes))
+                meshes = [child for mesh in meshes if mesh.children for child in mesh.children]
+        return self._level_grids
+
+    def locate_points(self, xy):
+        """Find the cell that contains each point.
+
+        The grid that contains each point is found level by level, with a binary search of the
+        x and y divisions of the level, until the grid is a leaf. The cells of the leaf whose
+        bounding box contains the point are then tested exactly, including quadratic edges.
+        Cells are assumed to be convex, apart from their curved edges, with vertices in
+        counterclockwise order. A point on an edge is given one of the cells of the edge.
+
+        Args:
+            xy (numpy.ndarray): The x,y coordinates of the points, shape (n_points, 2). Any
+                further columns, such as z, are ignored.
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: The ID of the cell that contains each point, and the
+            name of the leaf GridMesh that contains the cell. Points outside of the mesh have
+            cell ID -1 and leaf name "".
+        """
+        xy = np.atleast_2d(np.asarray(xy, dtype=np.float64))[:, :2]
+        cell_ids = np.full(len(xy), -1, dtype=np.int64)
+        leaf_numbers = np.full(len(xy), -1, dtype=np.int64)
+        leaves = []
+        if self.children is None:
+            cell_ids = self._find_cells_containing_points(xy)
+            leaf_numbers[cell_ids >= 0] = 0
+            leaves.append(self)
+        else:
+            points = np.arange(len(xy))
+            for x_divisions, y_divisions, table, meshes in self._get_level_grids():
+                # Find the grid of this level that contains each point
+                grid_ij = []
+                inside = np.ones(len(points), dtype=bool)
+                for axis, divisions in enumerate([x_divisions, y_divisions]):
+                    coords = xy[points, axis]
+                    index = np.searchsorted(divisions, coords, side="right") - 1
+                    grid_ij.append(np.clip(index, 0, len(divisions) - 2))
+                    inside &= (divisions[0] <= coords) & (coords <= divisions[-1])
+                grids = np.where(inside, table[grid_ij[0], grid_ij[1]], -1)
+                points, grids = points[grids >= 0], grids[grids >= 0]
+
+                # Find the cells of the points in leaf grids
+                is_leaf = np.array([mesh.children is None for mesh in meshes])[grids]
+                leaf_points, leaf_grids = points[is_leaf], grids[is_leaf]
+                order = np.argsort(leaf_grids, kind="stable")
+                leaf_points, leaf_grids = leaf_points[order], leaf_grids[order]
+                unique_grids, starts = np.unique(leaf_grids, return_index=True)
+                for grid, grid_points in zip(unique_grids, np.split(leaf_points, starts[1:])):
+                    leaf_cell_ids = meshes[grid]._find_cells_containing_points(xy[grid_points])
+                    cell_ids[grid_points] = leaf_cell_ids
+                    leaf_numbers[grid_points[leaf_cell_ids >= 0]] = len(leaves)
+                    leaves.append(meshes[grid])
+                points = points[~is_leaf]
+
+        # Leaf number -1 gives the last name, ""
+        leaf_names = np.array([leaf.name for leaf in leaves] + [""])[leaf_numbers]
+        return cell_ids, leaf_names
+
+
+def _parse_grid_name(name):
+    """Get the level, x-index, and y-index from a name of the form "GRID_Ln_i_j".
+
+    Returns:
+        tuple of int: The level, x-index, and y-index, or None if the name is not of the form.
+    """
+    match = _grid_name_pattern.fullmatch(name)
+    if match is None:
+        return None
+    return tuple(int(index) for index in match.groups())
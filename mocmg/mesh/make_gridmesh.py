@@ -1,25 +1,40 @@
 """The mesh class and related functions."""
-import copy
+
 import logging
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 from anytree import Node  # , RenderTree
 
+from ..initialize import _initialize_worker
 from .grid_mesh import GridMesh
+from .mesh import _search_sorted_ids
 
 module_log = logging.getLogger(__name__)
 
+# The mesh arrays of a worker process, see _initialize_leaf_row_worker
+_worker_arrays = {}
+
 
-def make_gridmesh(mesh):
+def make_gridmesh(mesh, processes=None):
     """Turn a mesh with 'Grid_Ln_i_j' cell sets into :class:`mocmg.mesh.GridMesh` objects.
 
     Assumes that each grid cell sets is either partitioned by some combination of the next
     level of grid cell sets, or is the lowest level.
 
+    Args:
+        mesh (mocmg.mesh.Mesh): The mesh.
+        processes (int, optional) : Number of worker processes used to make the leaf meshes.
+            The result is the same as without workers. By default, the leaf meshes are made by
+            this process.
+
     Returns:
         mocmg.mesh.GridMesh: The root GridMesh object.
     """
     module_log.info("Converting Mesh to GridMesh")
+    module_log.require(
+        processes is None or processes > 0, "Number of processes must be greater than 0."
+    )
     # Process input
     set_names, grid_names, name, max_level = _process_make_gridmesh_input(mesh)
 
@@ -27,36 +42,26 @@ def make_gridmesh(mesh):
     root, leaf_nodes = _create_gridmesh_tree(mesh, grid_names, name, max_level)
 
     # Make the leaf meshes
-    leaf_meshes = _make_leaf_meshes(mesh, leaf_nodes, set_names)
+    leaf_meshes = _make_leaf_meshes(mesh, leaf_nodes, set_names, processes)
 
-    # Construct the mesh hierarchy
+    # Construct the mesh hierarchy, level by level from the leaves up. The meshes of each level
+    # are looked up by grid name and passed to their parents by reference.
     child_nodes = leaf_nodes
-    child_meshes = leaf_meshes
-    parent_nodes = []
-    parent_meshes = []
+    child_meshes = {mesh.name: mesh for mesh in leaf_meshes}
     for _level in range(max_level - 1, 0, -1):
-        # Gather all parents
-        for node in child_nodes:
-            parent_node = node.parent
-            if parent_node not in parent_nodes:
-                parent_nodes.append(parent_node)
+        # Gather all parents, keeping the order in which they are first found
+        parent_nodes = list(dict.fromkeys(node.parent for node in child_nodes))
         # Create meshes for parent meshes
+        parent_meshes = {}
         for node in parent_nodes:
-            node_children_names = [node_child.name for node_child in node.children]
-            mesh_children = []
-            for mesh in child_meshes:
-                if mesh.name in node_children_names:
-                    mesh_children.append(mesh)
-
-            parent_meshes.append(GridMesh(children=mesh_children, name=node.name))
+            mesh_children = [child_meshes[node_child.name] for node_child in node.children]
+            parent_meshes[node.name] = GridMesh(children=mesh_children, name=node.name)
 
-        child_nodes = copy.deepcopy(parent_nodes)
-        child_meshes = copy.deepcopy(parent_meshes)
-        parent_nodes = []
-        parent_meshes = []
+        child_nodes = parent_nodes
+        child_meshes = parent_meshes
 
     # Add L1 to root
-    root_mesh = GridMesh(children=child_meshes, name=root.name)
+    root_mesh = GridMesh(children=list(child_meshes.values()), name=root.name)
 
     return root_mesh
 
@@ -96,38 +101,34 @@ def _process_make_gridmesh_input(mesh):
 def _create_gridmesh_tree(mesh, grid_names, name, max_level):
     """Create a tree to store grid relationships.
 
+    The parent of each grid is found from a per cell label array for each level, which holds
+    the index of the grid of that level that contains each cell.
+
     Returns:
         anytree.Node, list of anytree.Node: The root node, the leaf nodes
     """
     root = Node(name)
-    current_nodes = []
-    next_nodes = []
-    old_grid_names = copy.deepcopy(grid_names)
+    # Group the grid names by level, keeping their order
+    level_grid_names = [[] for _level in range(max_level + 1)]
+    for grid_name in grid_names:
+        level_grid_names[int(grid_name[6])].append(grid_name)
+
     # Do first level
-    for grid_name in old_grid_names:
-        grid_level = int(grid_name[6])
-        if grid_level == 1:
-            # Add to appropriate node (root)
-            next_nodes.append(Node(grid_name, parent=root))
-            grid_names.remove(grid_name)
+    next_nodes = [Node(grid_name, parent=root) for grid_name in level_grid_names[1]]
     # Do all other levels:
     for level in range(2, max_level + 1):
-        old_grid_names = copy.deepcopy(grid_names)
         current_nodes = next_nodes
         next_nodes = []
-        for grid_name in old_grid_names:
-            grid_level = int(grid_name[6])
-            if grid_level == level:
-                # find the parent for this grid
-                grid_cells = set(mesh.cell_sets[grid_name])
-                # This next for loop will always hit the break.
-                # It is therefore excluded from coverage.
-                for node in current_nodes:  # pragma: no cover
-                    node_cells = set(mesh.cell_sets[node.name])
-                    if grid_cells.issubset(node_cells):
-                        next_nodes.append(Node(grid_name, parent=node))
-                        grid_names.remove(grid_name)
-                        break
+        # Label each cell with the index of the grid of the previous level that contains it
+        parent_labels = _make_grid_labels(mesh, level_grid_names[level - 1])
+        for grid_name in level_grid_names[level]:
+            # find the parent for this grid
+            labels = parent_labels[_get_global_cell_rows(mesh, mesh.cell_sets[grid_name])]
+            module_log.require(
+                len(labels) > 0 and labels[0] >= 0 and bool((labels == labels[0]).all()),
+                f"Grid '{grid_name}' is not contained in one grid of level {level - 1}.",
+            )
+            next_nodes.append(Node(grid_name, parent=current_nodes[labels[0]]))
 
     # Render the tree
     # for pre, fill, node in RenderTree(root):
@@ -136,71 +137,187 @@ def _create_gridmesh_tree(mesh, grid_names, name, max_level):
     return root, next_nodes
 
 
-def _make_leaf_meshes(mesh, leaf_nodes, set_names):
+def _get_global_cell_rows(mesh, cell_ids):
+    """Get the position of each cell in the concatenation of the cell ID arrays of the mesh."""
+    type_indices, rows = mesh.get_cell_types_and_rows(np.asarray(cell_ids))
+    type_offsets = np.cumsum([0] + [len(ids) for ids in mesh.cell_ids.values()])
+    return type_offsets[type_indices] + rows
+
+
+def _make_grid_labels(mesh, grid_names):
+    """Label each cell with the index of the grid that contains it, or -1 if there is none."""
+    labels = np.full(mesh.n_cells(), -1, dtype=np.int64)
+    for i, grid_name in enumerate(grid_names):
+        labels[_get_global_cell_rows(mesh, mesh.cell_sets[grid_name])] = i
+    return labels
+
+
+def _make_leaf_meshes(mesh, leaf_nodes, set_names, processes=None):
     """Generate the leaf meshes in the tree.
 
+    Each leaf mesh is a view of the rows of the mesh arrays that belong to it. See
+    :meth:`mocmg.mesh.GridMesh.from_mesh_rows`.
+
     Returns:
         list of mocmg.mesh.GridMesh: List of the leaf GridMeshes
     """
+    leaf_names = [node.name for node in leaf_nodes]
+    leaf_cell_sets = _make_leaf_cell_sets(mesh, leaf_names, set_names)
+    # Get the rows of the vertices and cells of each leaf
+    arrays = _get_leaf_row_arrays(mesh)
+    leaf_cells = [np.asarray(mesh.cell_sets[name]) for name in leaf_names]
+    if processes is None:
+        leaf_rows = [_get_leaf_rows(arrays, cells) for cells in leaf_cells]
+    else:
+        module_log.info(f"Making {len(leaf_names)} leaf meshes with {processes} processes")
+        leaf_rows = _get_leaf_rows_in_parallel(arrays, leaf_cells, processes)
+
     # Generate the leaf meshes (The smallest spatially)
+    cell_types = list(mesh.cell_ids.keys())
     leaf_meshes = []
-    for node in leaf_nodes:
-        name = node.name
-
-        # Get the cells
-        cells_list = list(mesh.cell_sets[name])
-        cells = _make_leaf_meshes_get_cells(mesh, cells_list)
-
-        # Get the vertices for all of these cells
-        vertices_set = set(np.concatenate(mesh.get_vertices_for_cells(cells_list)))
-        vertices = {}
-        for vertex in vertices_set:
-            vertices[vertex] = mesh.vertices[vertex]
-
-        # Get all the cell sets
-        cell_sets = {}
-        grid_cells_set = set(mesh.cell_sets[name])
-        for set_name in set_names:
-            # ignore the grid sets
-            if "GRID_" in set_name.upper():
-                continue
-            else:
-                cells_set = set(mesh.cell_sets[set_name])
-                intersection_cells = grid_cells_set.intersection(cells_set)
-                if intersection_cells:
-                    cell_sets[set_name] = np.array(list(intersection_cells))
-
-        # Initialize the mesh object
-        leaf_meshes.append(GridMesh(vertices, cells, cell_sets, name=name))
+    for name, cell_sets, (vertex_rows, cell_rows, found) in zip(
+        leaf_names, leaf_cell_sets, leaf_rows
+    ):
+        module_log.require(found, f"Could not find one or more vertices of grid '{name}'.")
+        cell_rows = {cell_types[i]: rows for i, rows in cell_rows.items()}
+        leaf_meshes.append(
+            GridMesh.from_mesh_rows(mesh, vertex_rows, cell_rows, cell_sets, name=name)
+        )
 
     return leaf_meshes
 
 
-def _make_leaf_meshes_get_cells(mesh, cells_list):
-    """Get the formatted cells for the leaf mesh.
+def _get_leaf_row_arrays(mesh):
+    """Get the mesh arrays needed to find the vertex and cell rows of a leaf.
+
+    Returns:
+        dict: The sorted cell and vertex indices of the mesh, the connectivity of each cell
+        type, under the key 'connectivity_i' for the i-th cell type, and the number of vertices
+        of a cell of each type.
+    """
+    # Build the sorted indices of the mesh
+    mesh.get_cell_types_and_rows(np.empty(0, dtype=np.int64))
+    mesh.get_vertex_rows(np.empty(0, dtype=np.int64))
+    cell_sorted_ids, cell_type_indices, cell_rows = mesh._cell_index
+    vertex_sorted_ids, vertex_order = mesh._vertex_index
+    arrays = {
+        "cell_sorted_ids": cell_sorted_ids,
+        "cell_type_indices": cell_type_indices,
+        "cell_rows": cell_rows,
+        "vertex_sorted_ids": vertex_sorted_ids,
+        "vertex_order": vertex_order,
+        "vertices_per_cell": np.array(
+            [conn.shape[1] for conn in mesh.cell_connectivity.values()], dtype=np.int64
+        ),
+    }
+    for i, connectivity in enumerate(mesh.cell_connectivity.values()):
+        arrays[f"connectivity_{i}"] = connectivity
+    return arrays
+
+
+def _get_leaf_rows(arrays, cell_ids):
+    """Get the rows of the vertices and cells of a leaf.
+
+    The cells of the leaf must be in the mesh.
+
+    Args:
+        arrays (dict): The mesh arrays from :func:`_get_leaf_row_arrays`.
+        cell_ids (numpy.ndarray): The IDs of the cells of the leaf.
+
+    Returns:
+        numpy.ndarray, dict, bool: The rows of the vertices of the leaf, in order of vertex ID,
+        the rows of the cells of the leaf in the form: cell_type_index: row np.array, and
+        whether all vertices of the cells were found.
+    """
+    pos, _found = _search_sorted_ids(arrays["cell_sorted_ids"], cell_ids)
+    type_indices = arrays["cell_type_indices"][pos]
+    rows = arrays["cell_rows"][pos]
+    vertices_per_cell = arrays["vertices_per_cell"]
+
+    # Get the rows of the cells, grouped by type, and the vertices of all of these cells, in
+    # the order of the cells
+    cell_rows = {}
+    offsets = np.concatenate([[0], np.cumsum(vertices_per_cell[type_indices])])
+    cell_vertices = np.empty(offsets[-1], dtype=np.int64)
+    for i in range(len(vertices_per_cell)):
+        of_type = type_indices == i
+        if of_type.any():
+            cell_rows[i] = rows[of_type]
+            positions = offsets[:-1][of_type, np.newaxis] + np.arange(vertices_per_cell[i])
+            cell_vertices[positions] = arrays[f"connectivity_{i}"][cell_rows[i]]
+    vertex_ids = np.unique(cell_vertices)
+    pos, found = _search_sorted_ids(arrays["vertex_sorted_ids"], vertex_ids)
+    return arrays["vertex_order"][pos], cell_rows, bool(found.all())
+
+
+def _get_leaf_rows_in_parallel(arrays, leaf_cells, processes):
+    """Get the rows of the vertices and cells of each leaf with worker processes.
+
+    The mesh arrays are sent once to each worker when it starts, rather than with each leaf.
+
+    Returns:
+        list: The result of :func:`_get_leaf_rows` for each leaf.
+    """
+    chunksize = max(1, len(leaf_cells) // (4 * processes))
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_initialize_leaf_row_worker, initargs=(arrays,)
+    ) as executor:
+        return list(executor.map(_get_worker_leaf_rows, leaf_cells, chunksize=chunksize))
+
+
+def _initialize_leaf_row_worker(arrays):
+    """Set up a worker process with the mesh arrays used to find the rows of each leaf."""
+    _initialize_worker()
+    _worker_arrays.update(arrays)
+
+
+def _get_worker_leaf_rows(cell_ids):
+    """Get the rows of the vertices and cells of a leaf in a worker process."""
+    return _get_leaf_rows(_worker_arrays, cell_ids)
+
+
+def _make_leaf_cell_sets(mesh, leaf_names, set_names):
+    """Get the non-grid cell sets of each leaf.
+
+    Every cell of every set is labeled with its leaf, and the cells are sorted by leaf and set
+    once, so each leaf set is a contiguous part of the sorted cells.
 
     Returns:
-        dict of dict of np.array: The formatted cells
+        list of dict: The cell sets of each leaf, containing only the sets that have cells in
+        the leaf. The cell IDs of each set are sorted.
     """
-    cells_type_and_id = {}
-    # Categorize the cells by topological type
-    for cell_type in list(mesh.cells.keys()):
-        for cell in cells_list:
-            # If the cell is of this type, add it to the cells dict.
-            if cell in mesh.cells[cell_type]:
-                # if type is already in dict add the cell
-                if cell_type in cells_type_and_id:
-                    cells_type_and_id[cell_type].append(cell)
-                # otherwise, add the type and cell
-                else:
-                    cells_type_and_id[cell_type] = []
-                    cells_type_and_id[cell_type].append(cell)
-
-    # Turn this info into normal cells info
-    cells = {}
-    for cell_type in list(cells_type_and_id.keys()):
-        cells[cell_type] = {}
-        for cell in cells_type_and_id[cell_type]:
-            cells[cell_type][cell] = mesh.cells[cell_type][cell]
-
-    return cells
+    leaf_labels = _make_grid_labels(mesh, leaf_names)
+    # ignore the grid sets
+    set_names = [set_name for set_name in set_names if "GRID_" not in set_name.upper()]
+    set_cells = [np.asarray(mesh.cell_sets[set_name]) for set_name in set_names]
+    cells = np.concatenate([np.empty(0, dtype=np.int64)] + set_cells)
+    set_labels = np.repeat(np.arange(len(set_names)), [len(ids) for ids in set_cells])
+    cell_labels = leaf_labels[_get_global_cell_rows(mesh, cells)]
+
+    # Group the cells by leaf and set, dropping cells that are in no leaf and repeated cells
+    order = np.lexsort((cells, set_labels, cell_labels))
+    cells, set_labels, cell_labels = cells[order], set_labels[order], cell_labels[order]
+    keep = cell_labels >= 0
+    keep[1:] &= (
+        (cells[1:] != cells[:-1])
+        | (set_labels[1:] != set_labels[:-1])
+        | (cell_labels[1:] != cell_labels[:-1])
+    )
+    cells, set_labels, cell_labels = cells[keep], set_labels[keep], cell_labels[keep]
+    group_starts = np.flatnonzero(
+        np.concatenate(
+            [
+                [True],
+                (set_labels[1:] != set_labels[:-1]) | (cell_labels[1:] != cell_labels[:-1]),
+            ]
+        )
+    )
+
+    group_ends = np.append(group_starts[1:], len(cells))
+
+    leaf_cell_sets = [{} for _name in leaf_names]
+    for start, end in zip(group_starts.tolist(), group_ends.tolist()):
+        if start < end:
+            set_name = set_names[set_labels[start]]
+            leaf_cell_sets[cell_labels[start]][set_name] = cells[start:end]
+    return leaf_cell_sets
@@ -1,4 +1,5 @@
 """The mesh class and related functions."""
+
 import logging
 
 import numpy as np
@@ -76,6 +77,24 @@ class Mesh:
             The ID array contains the integer IDs of all cells that share the attribute "set_name".
 
         name (str): Name of the mesh.
+
+        vertex_ids (numpy.ndarray): The integer IDs of the vertices, shape (n_vertices,).
+
+        vertex_coords (numpy.ndarray): The x,y,z location of the vertices, in the same order as
+            vertex_ids, shape (n_vertices, 3).
+
+        cell_ids (dict): The integer IDs of the cells of each type. A dictionary of the form:
+            "cell_type": ID np.array.
+
+        cell_connectivity (dict): The vertex IDs of the cells of each type. A dictionary of the
+            form: "cell_type": np.array of shape (n_cells_of_type, n_vertices_per_cell), where the
+            rows are in the same order as cell_ids["cell_type"].
+
+    Note:
+        The mesh data is stored in the contiguous arrays vertex_ids, vertex_coords, cell_ids, and
+        cell_connectivity. The vertices and cells dictionaries are a compatibility view of these
+        arrays, which is only generated when it is accessed. Modifying the dictionaries in place
+        does not modify the arrays. Assign a new dictionary to update the mesh.
     """
 
     def __init__(self, vertices, cells, cell_sets=None, name=""):
@@ -85,6 +104,235 @@ class Mesh:
         self.cell_sets = {} if cell_sets is None else cell_sets
         self.name = name
 
+    @classmethod
+    def from_arrays(
+        cls, vertex_ids, vertex_coords, cell_ids, cell_connectivity, cell_sets=None, name=""
+    ):
+        """Create a mesh directly from vertex and cell arrays.
+
+        Args:
+            vertex_ids (numpy.ndarray): The integer IDs of the vertices, shape (n_vertices,).
+            vertex_coords (numpy.ndarray): The x,y,z location of the vertices, in the same order
+                as vertex_ids, shape (n_vertices, 3).
+            cell_ids (dict): The integer IDs of the cells of each type.
+                A dictionary of the form: "cell_type": ID np.array.
+            cell_connectivity (dict): The vertex IDs of the cells of each type.
+                A dictionary of the form: "cell_type": np.array of shape
+                (n_cells_of_type, n_vertices_per_cell).
+            cell_sets (dict, optional): The sets of cells that share the same attributes.
+            name (str, optional): Name of the mesh.
+
+        Returns:
+            mocmg.mesh.Mesh: The mesh.
+        """
+        mesh = cls(None, None, cell_sets, name)
+        mesh._set_vertex_arrays(vertex_ids, vertex_coords)
+        mesh._set_cell_arrays(cell_ids, cell_connectivity)
+        return mesh
+
+    @property
+    def vertices(self):
+        """dict: The ID and x,y,z location of vertices."""
+        if self._vertices is None and self.vertex_ids is not None:
+            self._vertices = dict(zip(self.vertex_ids.tolist(), self.vertex_coords))
+        return self._vertices
+
+    @vertices.setter
+    def vertices(self, vertices):
+        self._vertices = vertices
+        self._vertex_ids = None
+        self._vertex_coords = None
+        self._vertex_index = None
+        self._cell_areas = None
+        self._cell_bounding_boxes = None
+
+    @property
+    def cells(self):
+        """dict: The individual cells that compose a mesh."""
+        if self._cells is None and self.cell_ids is not None:
+            connectivity = self.cell_connectivity
+            self._cells = {
+                cell_type: dict(zip(ids.tolist(), connectivity[cell_type]))
+                for cell_type, ids in self.cell_ids.items()
+            }
+        return self._cells
+
+    @cells.setter
+    def cells(self, cells):
+        self._cells = cells
+        self._cell_ids = None
+        self._cell_connectivity = None
+        self._cell_index = None
+        self._cell_areas = None
+        self._cell_bounding_boxes = None
+
+    @property
+    def vertex_ids(self):
+        """numpy.ndarray: The integer IDs of the vertices."""
+        if self._vertex_ids is None and self._vertices is not None:
+            self._vertices_to_arrays()
+        return self._vertex_ids
+
+    @property
+    def vertex_coords(self):
+        """numpy.ndarray: The x,y,z location of the vertices, in the order of vertex_ids."""
+        if self._vertex_coords is None and self._vertices is not None:
+            self._vertices_to_arrays()
+        return self._vertex_coords
+
+    @property
+    def cell_ids(self):
+        """dict: The integer IDs of the cells of each type."""
+        if self._cell_ids is None and self._cells is not None:
+            self._cells_to_arrays()
+        return self._cell_ids
+
+    @property
+    def cell_connectivity(self):
+        """dict: The vertex IDs of the cells of each type, in the order of cell_ids."""
+        if self._cell_connectivity is None and self._cells is not None:
+            self._cells_to_arrays()
+        return self._cell_connectivity
+
+    def _set_vertex_arrays(self, vertex_ids, vertex_coords):
+        """Replace the vertex data with the given arrays."""
+        module_log.require(
+            len(vertex_ids) == len(vertex_coords),
+            "The number of vertex IDs and vertex coordinates must match.",
+        )
+        self._vertices = None
+        self._vertex_ids = np.asarray(vertex_ids)
+        self._vertex_coords = np.asarray(vertex_coords)
+        self._vertex_index = None
+        self._cell_areas = None
+        self._cell_bounding_boxes = None
+
+    def _set_cell_arrays(self, cell_ids, cell_connectivity):
+        """Replace the cell data with the given arrays."""
+        module_log.require(
+            list(cell_ids.keys()) == list(cell_connectivity.keys()),
+            "The cell types of the cell IDs and cell connectivity must match.",
+        )
+        for cell_type in cell_ids:
+            module_log.require(
+                len(cell_ids[cell_type]) == len(cell_connectivity[cell_type]),
+                f"The number of '{cell_type}' cell IDs and connectivity rows must match.",
+            )
+        self._cells = None
+        self._cell_ids = {k: np.asarray(v) for k, v in cell_ids.items()}
+        self._cell_connectivity = {k: np.asarray(v) for k, v in cell_connectivity.items()}
+        self._cell_index = None
+        self._cell_areas = None
+        self._cell_bounding_boxes = None
+
+    def _vertices_to_arrays(self):
+        """Generate the vertex arrays from the vertices dictionary."""
+        self._vertex_ids = np.array(list(self._vertices.keys()), dtype=np.int64)
+        if self._vertices:
+            self._vertex_coords = np.stack(list(self._vertices.values()))
+        else:
+            self._vertex_coords = np.empty((0, 3))
+
+    def _cells_to_arrays(self):
+        """Generate the cell arrays from the cells dictionary."""
+        self._cell_ids = {}
+        self._cell_connectivity = {}
+        for cell_type, cells in self._cells.items():
+            self._cell_ids[cell_type] = np.array(list(cells.keys()), dtype=np.int64)
+            if cells:
+                self._cell_connectivity[cell_type] = np.stack(list(cells.values()))
+            else:
+                self._cell_connectivity[cell_type] = np.empty((0, 0), dtype=np.int64)
+
+    def get_vertex_rows(self, vertex_ids):
+        """Get the rows of vertex_coords that correspond to the given vertex IDs.
+
+        Args:
+            vertex_ids (Iterable): Integer vertex IDs. May be an array of any shape.
+
+        Returns:
+            numpy.ndarray: The row of each vertex ID, with the same shape as vertex_ids.
+        """
+        if self._vertex_index is None:
+            self._vertex_index = _make_sorted_index(self.vertex_ids)
+        sorted_ids, order = self._vertex_index
+        pos, found = _search_sorted_ids(sorted_ids, vertex_ids)
+        rows = order[pos]
+        module_log.require(bool(found.all()), "Could not find one or more vertices in the mesh.")
+        return rows
+
+    def get_cell_types_and_rows(self, cell_ids):
+        """Get the cell type and connectivity row of each of the given cell IDs.
+
+        A global index from cell ID to cell type and row is built on the first call and kept
+        until the cells of the mesh are replaced.
+
+        Args:
+            cell_ids (Iterable): Integer cell IDs. May be an array of any shape.
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: The position of each cell's type in
+            list(cell_ids.keys()), and the row of each cell in cell_connectivity[cell_type].
+            Both have the same shape as cell_ids.
+        """
+        type_indices, rows, found = self._lookup_cells(cell_ids)
+        module_log.require(bool(found.all()), "Could not find one or more cells in the mesh.")
+        return type_indices, rows
+
+    def get_cell_rows(self, cell_type, cell_ids):
+        """Get the rows of cell_connectivity[cell_type] that correspond to the given cell IDs.
+
+        Args:
+            cell_type (str): The type of the cells, e.g. "triangle".
+            cell_ids (Iterable): Integer cell IDs. May be an array of any shape.
+
+        Returns:
+            numpy.ndarray: The row of each cell ID, with the same shape as cell_ids.
+        """
+        cell_types = list(self.cell_ids.keys())
+        module_log.require(cell_type in cell_types, f"No cells of type '{cell_type}'.")
+        type_indices, rows, found = self._lookup_cells(cell_ids)
+        found = found & (type_indices == cell_types.index(cell_type))
+        module_log.require(
+            bool(found.all()), f"Could not find one or more '{cell_type}' cells in the mesh."
+        )
+        return rows
+
+    def _lookup_cells(self, cell_ids):
+        """Look up cell IDs in the global cell index, building the index if necessary.
+
+        Returns:
+            numpy.ndarray, numpy.ndarray, numpy.ndarray: The type index and row of each cell,
+            and whether each cell was found.
+        """
+        if self._cell_index is None:
+            ids = list(self.cell_ids.values())
+            all_ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+            type_indices = np.repeat(np.arange(len(ids)), [len(v) for v in ids])
+            rows = np.concatenate([np.arange(len(v)) for v in ids]) if ids else all_ids
+            sorted_ids, order = _make_sorted_index(all_ids)
+            self._cell_index = (sorted_ids, type_indices[order], rows[order])
+
+        sorted_ids, type_indices, rows = self._cell_index
+        pos, found = _search_sorted_ids(sorted_ids, cell_ids)
+        return type_indices[pos], rows[pos], found
+
+    def _group_cells_by_type(self, cell_ids):
+        """Group cell IDs by cell type, keeping the order of the given cell IDs.
+
+        Returns:
+            dict: A dictionary of the form "cell_type": (ID np.array, row np.array), containing
+            only the cell types that are present in cell_ids.
+        """
+        cell_ids = np.asarray(cell_ids)
+        type_indices, rows = self.get_cell_types_and_rows(cell_ids)
+        groups = {}
+        for i, cell_type in enumerate(self.cell_ids.keys()):
+            of_type = type_indices == i
+            if of_type.any():
+                groups[cell_type] = (cell_ids[of_type], rows[of_type])
+        return groups
+
     def n_cells(self):
         """Get the number of cells in the mesh.
 
@@ -92,8 +340,8 @@ class Mesh:
             int: number of cells.
         """
         n_cells = 0
-        for cell_type in self.cells:
-            n_cells = n_cells + len(self.cells[cell_type])
+        for ids in self.cell_ids.values():
+            n_cells = n_cells + len(ids)
         return n_cells
 
     def get_cells(self, cell_set_name):
@@ -110,6 +358,26 @@ class Mesh:
         else:
             module_log.error(f"no cell set named '{cell_set_name}'.")
 
+    def compact_arrays(self, coordinate_dtype=None):
+        """Store the mesh arrays with smaller data types to reduce memory use.
+
+        The vertex IDs, cell IDs, cell connectivity, and cell sets are converted to the smallest
+        unsigned integer type that holds their largest value.
+
+        Args:
+            coordinate_dtype (str or numpy.dtype, optional): Data type of the vertex coordinates,
+                e.g. "float32". By default, the vertex coordinates are not changed.
+        """
+        vertex_coords = self.vertex_coords
+        if coordinate_dtype is not None:
+            vertex_coords = vertex_coords.astype(coordinate_dtype)
+        self._set_vertex_arrays(_to_compact_dtype(self.vertex_ids), vertex_coords)
+        self._set_cell_arrays(
+            {k: _to_compact_dtype(v) for k, v in self.cell_ids.items()},
+            {k: _to_compact_dtype(v) for k, v in self.cell_connectivity.items()},
+        )
+        self.cell_sets = {k: _to_compact_dtype(np.asarray(v)) for k, v in self.cell_sets.items()}
+
     def get_vertices_for_cells(self, cells):
         """Get the vertex IDs from cells.
 
@@ -119,19 +387,15 @@ class Mesh:
         Returns:
             list of Iterables: Vertices for each cell.
         """
-        verts = []
-        keys = self.cells.keys()
-        for cell in cells:
-            for k in keys:
-                if cell in self.cells[k]:
-                    verts.append(self.cells[k][cell])
-                    break
-
+        cell_types = list(self.cell_ids.keys())
+        type_indices, rows, found = self._lookup_cells(np.asarray(cells))
         module_log.require(
-            len(verts) == len(cells),
+            bool(found.all()),
             "Could not find one or more cells in the mesh."
-            + f" len(verts)={len(verts)}, len(cells)={len(cells)}",
+            + f" Missing cells: {np.asarray(cells)[~found]}",
         )
+        connectivity = [self.cell_connectivity[cell_type] for cell_type in cell_types]
+        verts = [connectivity[t][r] for t, r in zip(type_indices.tolist(), rows.tolist())]
         return verts
 
     def get_vertices(self, cell_set_name):
@@ -143,15 +407,88 @@ class Mesh:
         Returns:
             numpy.ndarray: vertex IDs of the set.
         """
-        vert_set = set()
         if cell_set_name in self.cell_sets:
             cells = self.get_cells(cell_set_name)
             verts = self.get_vertices_for_cells(cells)
-            vert_set = vert_set.union(*verts)
-            return np.fromiter(vert_set, int, len(vert_set))
+            return np.unique(np.concatenate(verts))
         else:
             module_log.error(f"no cell set named '{cell_set_name}'.")
 
+    def get_cell_areas(self):
+        """Get the area of every cell in the mesh.
+
+        The areas of all cells of a type are computed together in one vectorized pass and
+        cached until the vertices or cells of the mesh are replaced.
+
+        Returns:
+            dict: A dictionary of the form "cell_type": np.array, where the array contains the
+            area of each cell, in the same order as cell_ids["cell_type"].
+        """
+        if self._cell_areas is None:
+            self._cell_areas = {}
+            for cell_type, connectivity in self.cell_connectivity.items():
+                coords = self.vertex_coords[self.get_vertex_rows(connectivity)]
+                self._cell_areas[cell_type] = _compute_cell_areas(cell_type, coords)
+        return self._cell_areas
+
+    def get_cell_bounding_boxes(self):
+        """Get the bounding box of every cell in the mesh.
+
+        The box of a cell with quadratic edges encloses its curved edges. The boxes are cached
+        until the vertices or cells of the mesh are replaced.
+
+        Returns:
+            dict: A dictionary of the form "cell_type": np.array, where the array contains the
+            minimum and maximum x,y coordinates of each cell, shape (n_cells_of_type, 2, 2), in
+            the same order as cell_ids["cell_type"].
+        """
+        if self._cell_bounding_boxes is None:
+            self._cell_bounding_boxes = {}
+            for cell_type, connectivity in self.cell_connectivity.items():
+                coords = self.vertex_coords[self.get_vertex_rows(connectivity)]
+                self._cell_bounding_boxes[cell_type] = _compute_cell_bounding_boxes(
+                    cell_type, coords
+                )
+        return self._cell_bounding_boxes
+
+    def _find_cells_containing_points(self, xy, max_pairs=2**22):
+        """Find the cell that contains each point by testing the cells whose box contains it.
+
+        A point on an edge shared by two cells is given the first of the cells.
+
+        Args:
+            xy (numpy.ndarray): The x,y coordinates of the points, shape (n_points, 2).
+            max_pairs (int, optional): The largest number of point and cell pairs whose boxes
+                are compared at once.
+
+        Returns:
+            numpy.ndarray: The ID of the cell that contains each point, or -1.
+        """
+        cell_ids = np.full(len(xy), -1, dtype=np.int64)
+        boxes = self.get_cell_bounding_boxes()
+        for cell_type, connectivity in self.cell_connectivity.items():
+            box = boxes[cell_type]
+            if len(box) == 0:
+                continue
+            coords = self.vertex_coords[self.get_vertex_rows(connectivity)]
+            chunk = max(1, max_pairs // len(box))
+            for start in range(0, len(xy), chunk):
+                # Only the points that are not yet found are tested
+                points = start + np.flatnonzero(cell_ids[start : start + chunk] == -1)
+                x = xy[points, 0, np.newaxis]
+                y = xy[points, 1, np.newaxis]
+                in_box = (
+                    (box[:, 0, 0] <= x)
+                    & (x <= box[:, 1, 0])
+                    & (box[:, 0, 1] <= y)
+                    & (y <= box[:, 1, 1])
+                )
+                point_index, rows = np.nonzero(in_box)
+                inside = _points_in_cells(cell_type, coords[rows], xy[points[point_index]])
+                found_points, first = np.unique(point_index[inside], return_index=True)
+                cell_ids[points[found_points]] = self.cell_ids[cell_type][rows[inside][first]]
+        return cell_ids
+
     def get_cell_area(self, cell):
         """Get the area of the cell with the given cell ID.
 
@@ -161,96 +498,10 @@ class Mesh:
         Returns:
             float: The area of the cell.
         """
-        # Find the cell
-        for cell_type in self.cells:
-            if cell in self.cells[cell_type]:
-                vertices = self.cells[cell_type][cell]
-                # Has quadratic edges
-                if _has_quadratic_edges[cell_type]:
-                    # Get linear area and adjust for quadratic edges if it has them.
-                    nvert = len(vertices)
-                    module_log.require(nvert % 2 == 0, "Number of vertices in cell must be even.")
-                    x_lin = np.array([self.vertices[v][0] for v in vertices[0 : int(nvert / 2)]])
-                    y_lin = np.array([self.vertices[v][1] for v in vertices[0 : int(nvert / 2)]])
-                    x_quad = np.array([self.vertices[v][0] for v in vertices[int(nvert / 2) :]])
-                    y_quad = np.array([self.vertices[v][1] for v in vertices[int(nvert / 2) :]])
-
-                    # Shoelace formula may be used for linear edges
-                    # Assumes that vertices are in clockwise or counterclockwise order
-                    x_ = x_lin - x_lin.mean()
-                    y_ = y_lin - y_lin.mean()
-                    correction = x_[-1] * y_[0] - y_[-1] * x_[0]
-                    main_area = np.dot(x_[:-1], y_[1:]) - np.dot(y_[:-1], x_[1:])
-                    area = 0.5 * np.abs(main_area + correction)
-
-                    # Assumed points are in counterclockwise order. Area for the linear
-                    # polygon is computed, then adjusted based on integrals for the quad edges.
-                    # If a quadratic vertex is to the left of the linear edge, the area is added.
-                    # Otherwise it is subtracted.
-                    # Consider the following quadratic triangle with one quad edge:
-                    #        2                   2
-                    #       /  \                /| \
-                    #      /    \              / |  \
-                    #     5      4            5  |   \
-                    #      \      \            \ |    \
-                    #       \      \            \|     \
-                    #        0---3--1            0------1
-                    #     Quad edge (2,5,0)     Linear edges
-                    # Since, point 5 is to the right of linear edge (2,0), the area of the polygon
-                    # constructed by edges [(2,5,0), (0,2)] is added to the total area.
-                    #
-                    # For each edge, compute additional area using quadratic function
-                    # Shift point to origin, rotate so line is x-axis, find quadratic function
-                    # with 3 point fit, integrate, add or subtract based on right or left
-                    for i in range(-1, int(nvert / 2) - 1):
-                        x_e = np.array([x_lin[i], x_lin[i + 1], x_quad[i]])
-                        y_e = np.array([y_lin[i], y_lin[i + 1], y_quad[i]])
-                        # shift to origin
-                        x_e = x_e - x_e[0]
-                        y_e = y_e - y_e[0]
-                        # rotate line to x-axis
-                        if x_e[1] == 0.0:
-                            if y_e[1] >= 0.0:
-                                theta = np.pi / 2.0
-                            else:
-                                theta = -np.pi / 2.0
-                        else:
-                            theta = np.arctan(y_e[1] / x_e[1])
-
-                        if x_e[1] < 0:
-                            theta = theta + np.pi
-                        rotation_matrix = np.array(
-                            [
-                                [np.cos(theta), np.sin(theta)],
-                                [-np.sin(theta), np.cos(theta)],
-                            ]
-                        )
-                        for j in range(1, 3):
-                            v = np.array([[x_e[j]], [y_e[j]]])
-                            v_ = np.dot(rotation_matrix, v)
-                            x_e[j] = v_[0]
-                            y_e[j] = v_[1]
-                        # Get quadratic coefficients and integrate
-                        # ax^2 + bx + c
-                        p = np.poly1d(np.polyfit(x_e, y_e, 2))
-                        p_int = np.polyint(p)
-                        quadarea = p_int(x_e[1]) - p_int(0)
-                        # quadarea will be opposite of correct sign
-                        area = area - quadarea
-                    return area
-
-                # Does not have quadratic edges
-                else:
-                    # No quadratic edges shoelace formula may be used
-                    # Assumes that vertices are in clockwise or counterclockwise order
-                    x = np.array([self.vertices[v][0] for v in vertices])
-                    y = np.array([self.vertices[v][1] for v in vertices])
-                    x_ = x - x.mean()
-                    y_ = y - y.mean()
-                    correction = x_[-1] * y_[0] - y_[-1] * x_[0]
-                    main_area = np.dot(x_[:-1], y_[1:]) - np.dot(y_[:-1], x_[1:])
-                    area = 0.5 * np.abs(main_area + correction)
-                return area
+        type_index, row, found = self._lookup_cells(cell)
+        if found:
+            cell_type = list(self.cell_ids.keys())[type_index]
+            return float(self.get_cell_areas()[cell_type][row])
         module_log.error(f"Cell {cell} does not exist in this mesh")
 
     def get_set_area(self, cell_set_name):
@@ -265,6 +516,193 @@ class Mesh:
         module_log.info(f"Computing '{cell_set_name}' cell set area.")
         cells = self.get_cells(cell_set_name)
         area = 0.0
-        for c in cells:
-            area = area + self.get_cell_area(c)
-        return area
+        areas = self.get_cell_areas()
+        for cell_type, (_ids, rows) in self._group_cells_by_type(cells).items():
+            area = area + areas[cell_type][rows].sum()
+        return float(area)
+
+
+def _to_compact_dtype(data):
+    """Convert an integer array to the smallest unsigned integer type that holds its values."""
+    return data.astype(_get_compact_dtype(data), copy=False)
+
+
+def _get_compact_dtype(data):
+    """Get the smallest unsigned integer type that holds the values of an integer array."""
+    if data.size == 0:
+        return np.dtype(np.uint8)
+    module_log.require(
+        int(data.min()) >= 0, "Negative integers can not be stored as unsigned integers."
+    )
+    return np.min_scalar_type(int(data.max()))
+
+
+def _make_sorted_index(ids):
+    """Make a sorted index of an ID array, used to map IDs to array rows.
+
+    Returns:
+        numpy.ndarray, numpy.ndarray: The sorted IDs, and the row of each sorted ID.
+    """
+    order = np.argsort(ids, kind="stable")
+    return ids[order], order
+
+
+def _search_sorted_ids(sorted_ids, ids):
+    """Find the positions of the given IDs in a sorted ID array.
+
+    Returns:
+        numpy.ndarray, numpy.ndarray: The position of each ID, and whether each ID was found.
+    """
+    ids = np.asarray(ids)
+    if len(sorted_ids) == 0:
+        return np.zeros(ids.shape, dtype=np.int64), np.zeros(ids.shape, dtype=bool)
+    pos = np.searchsorted(sorted_ids, ids)
+    pos = np.minimum(pos, len(sorted_ids) - 1)
+    found = sorted_ids[pos] == ids
+    return pos, found
+
+
+def _compute_cell_areas(cell_type, coords):
+    """Compute the area of each cell of a type.
+
+    The area of the polygon formed by the linear vertices is computed with the shoelace formula.
+    For cells with quadratic edges, the area between each linear edge and the parabola through
+    its two end vertices and its quadratic vertex is then added. Vertices are assumed to be
+    in counterclockwise order.
+
+    Args:
+        cell_type (str): The type of the cells, e.g. "triangle6".
+        coords (numpy.ndarray): The coordinates of the vertices of each cell,
+            shape (n_cells, n_vertices_per_cell, 2 or 3).
+
+    Returns:
+        numpy.ndarray: The area of each cell.
+    """
+    nvert = coords.shape[1]
+    if _has_quadratic_edges[cell_type]:
+        module_log.require(nvert % 2 == 0, "Number of vertices in cell must be even.")
+        nlin = nvert // 2
+    else:
+        nlin = nvert
+
+    # Shoelace formula for the linear edges. Shift to the centroid to reduce round-off.
+    lin = coords[:, :nlin, :2]
+    lin = lin - lin.mean(axis=1, keepdims=True)
+    x, y = lin[:, :, 0], lin[:, :, 1]
+    area = 0.5 * np.abs(np.sum(x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y, axis=1))
+
+    if _has_quadratic_edges[cell_type]:
+        # If a quadratic vertex is to the right of its linear edge, the area is added.
+        # Otherwise it is subtracted.
+        # Consider the following quadratic triangle with one quad edge:
+        #        2                   2
+        #       /  \                /| \
+        #      /    \              / |  \
+        #     5      4            5  |   \
+        #      \      \            \ |    \
+        #       \      \            \|     \
+        #        0---3--1            0------1
+        #     Quad edge (2,5,0)     Linear edges
+        # Since, point 5 is to the right of linear edge (2,0), the area of the polygon
+        # constructed by edges [(2,5,0), (0,2)] is added to the total area.
+        #
+        # Edge i goes from linear vertex i to i+1, through quadratic vertex i. In a frame where
+        # the edge lies on the x-axis from 0 to L, the parabola through the quadratic vertex
+        # (x_m, y_m) integrates to -y_m L^3 / (6 x_m (x_m - L)), which is the negative of the
+        # area added. With e = edge vector and d = quadratic vertex - edge start,
+        # x_m = e.d / L and y_m = (e x d) / L.
+        edge = np.roll(lin, -1, axis=1) - lin
+        to_quad = coords[:, nlin:, :2] - coords[:, :nlin, :2]
+        e_dot_d = np.sum(edge * to_quad, axis=2)
+        e_cross_d = edge[:, :, 0] * to_quad[:, :, 1] - edge[:, :, 1] * to_quad[:, :, 0]
+        length_sq = np.sum(edge * edge, axis=2)
+        area = area + np.sum(
+            e_cross_d * length_sq**2 / (6.0 * e_dot_d * (e_dot_d - length_sq)), axis=1
+        )
+
+    return area
+
+
+def _get_curved_edge_heights(cell_type, coords):
+    """Get the linear edges of each cell and the height of the parabola of each quadratic edge.
+
+    Edge i goes from linear vertex i to i+1. For cells with quadratic edges, the edge is the
+    parabola through its end vertices and quadratic vertex i, whose axis is perpendicular to the
+    linear edge, as in :func:`_compute_cell_areas`. In a frame where the edge lies on the x-axis
+    from 0 to L, the parabola is y = c x (x - L). With e = edge vector and d = quadratic vertex
+    - edge start, c / L = (e x d) / ((e.d) (e.d - L^2)).
+
+    Returns:
+        numpy.ndarray, numpy.ndarray, numpy.ndarray: The linear vertices, shape
+        (n_cells, n_edges, 2), the edge vectors, and c / L for each edge, which is 0 for linear
+        edges.
+    """
+    nvert = coords.shape[1]
+    if _has_quadratic_edges[cell_type]:
+        module_log.require(nvert % 2 == 0, "Number of vertices in cell must be even.")
+        nlin = nvert // 2
+    else:
+        nlin = nvert
+    lin = coords[:, :nlin, :2]
+    edge = np.roll(lin, -1, axis=1) - lin
+    if _has_quadratic_edges[cell_type]:
+        to_quad = coords[:, nlin:, :2] - lin
+        e_dot_d = np.sum(edge * to_quad, axis=2)
+        e_cross_d = edge[:, :, 0] * to_quad[:, :, 1] - edge[:, :, 1] * to_quad[:, :, 0]
+        length_sq = np.sum(edge * edge, axis=2)
+        curvature = e_cross_d / (e_dot_d * (e_dot_d - length_sq))
+    else:
+        curvature = np.zeros(lin.shape[:2])
+    return lin, edge, curvature
+
+
+def _compute_cell_bounding_boxes(cell_type, coords):
+    """Compute the bounding box of each cell of a type.
+
+    A parabolic edge lies inside the triangle formed by its end vertices and the intersection of
+    its end tangents, so the box of these points encloses the curved edges.
+
+    Args:
+        cell_type (str): The type of the cells, e.g. "triangle6".
+        coords (numpy.ndarray): The coordinates of the vertices of each cell,
+            shape (n_cells, n_vertices_per_cell, 2 or 3).
+
+    Returns:
+        numpy.ndarray: The minimum and maximum x,y coordinates of each cell, shape (n_cells, 2, 2).
+    """
+    lin, edge, curvature = _get_curved_edge_heights(cell_type, coords)
+    # The end tangents meet above the middle of the edge, at twice the height of the parabola,
+    # -c L^2 / 2. From the edge start, this is edge / 2 - (c L / 2) * (edge rotated by 90 degrees).
+    normal = np.stack([-edge[:, :, 1], edge[:, :, 0]], axis=2)
+    height = 0.5 * curvature * np.sum(edge * edge, axis=2)
+    tangent_points = lin + 0.5 * edge - height[:, :, np.newaxis] * normal
+    points = np.concatenate([lin, tangent_points], axis=1)
+    return np.stack([points.min(axis=1), points.max(axis=1)], axis=1)
+
+
+def _points_in_cells(cell_type, coords, xy):
+    """Test whether each point is inside the matching cell.
+
+    A point is inside a cell if it is on the inner side of each edge, including quadratic edges.
+    Cells are assumed to be convex, apart from their curved edges, with vertices in
+    counterclockwise order. Points on an edge are inside.
+
+    Args:
+        cell_type (str): The type of the cells, e.g. "triangle6".
+        coords (numpy.ndarray): The coordinates of the vertices of each cell,
+            shape (n, n_vertices_per_cell, 2 or 3).
+        xy (numpy.ndarray): The x,y coordinates of the points, shape (n, 2).
+
+    Returns:
+        numpy.ndarray: Whether each point is inside its cell.
+    """
+    lin, edge, curvature = _get_curved_edge_heights(cell_type, coords)
+    to_point = xy[:, np.newaxis, :] - lin
+    # Distance along and to the left of each edge, times the edge length
+    along = np.sum(edge * to_point, axis=2)
+    left = edge[:, :, 0] * to_point[:, :, 1] - edge[:, :, 1] * to_point[:, :, 0]
+    length_sq = np.sum(edge * edge, axis=2)
+    # Height of the parabola above the point, times the edge length
+    along = np.clip(along, 0.0, length_sq)
+    height = curvature * along * (along - length_sq)
+    return np.all(left - height >= -1.0e-12 * length_sq, axis=1)
@@ -0,0 +1,270 @@
+"""Functions for tracing method of characteristics tracks through a mesh."""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ..initialize import _initialize_worker
+from .mesh import Mesh, _get_curved_edge_heights, _points_in_cells
+
+module_log = logging.getLogger(__name__)
+
+
+def trace_tracks(mesh, azimuthal_angle, ray_spacing, processes=None, max_pairs=2**22):
+    """Trace parallel tracks through a mesh and find the segment of each track in each cell.
+
+    The tracks are the lines at the azimuthal angle, spaced ray_spacing apart, that cross the
+    bounding box of the mesh, spread evenly about the middle of the box. Each track is
+    intersected exactly with the linear and quadratic edges of the cells it crosses. Quadratic
+    edges are the parabolas of :func:`mocmg.mesh.mesh._compute_cell_areas`.
+
+    The leaves of a :class:`mocmg.mesh.GridMesh` are traced separately, in worker processes if
+    requested, and the segments are put in order along each track afterwards. A
+    :class:`mocmg.mesh.Mesh` is traced as a single leaf.
+
+    Args:
+        mesh (mocmg.mesh.Mesh): The mesh or grid mesh.
+        azimuthal_angle (float): The angle of the tracks from the x-axis, in radians.
+        ray_spacing (float): The distance between neighboring tracks.
+        processes (int, optional) : Number of worker processes used to trace the leaves.
+            The result is the same as without workers. By default, the leaves are traced by this
+            process.
+        max_pairs (int, optional): The largest number of track and cell pairs whose boxes are
+            compared at once.
+
+    Returns:
+        dict: The tracks and segments, with the keys
+
+        - "starts", "ends": The x,y coordinates where each track enters and leaves the
+          bounding box of the mesh, shape (n_tracks, 2).
+        - "offsets", "cell_ids", "lengths": The segments in compressed sparse row form.
+          The segments of track i, in order from its start, are in the cells
+          cell_ids[offsets[i]:offsets[i + 1]], with lengths lengths[offsets[i]:offsets[i + 1]].
+    """
+    module_log.info(
+        f"Tracing tracks at angle {azimuthal_angle} with spacing {ray_spacing} through the mesh"
+    )
+    module_log.require(ray_spacing > 0, "Ray spacing must be greater than 0.")
+    module_log.require(
+        processes is None or processes > 0, "Number of processes must be greater than 0."
+    )
+    leaves = _get_leaves(mesh)
+    leaf_arrays = [
+        (leaf.vertex_ids, leaf.vertex_coords, leaf.cell_ids, leaf.cell_connectivity)
+        for leaf in leaves
+    ]
+    vertex_coords = np.concatenate([arrays[1][:, :2] for arrays in leaf_arrays])
+    lower = vertex_coords.min(axis=0)
+    upper = vertex_coords.max(axis=0)
+    # Include the curved edges
+    for leaf in leaves:
+        for boxes in leaf.get_cell_bounding_boxes().values():
+            if len(boxes) > 0:
+                lower = np.minimum(lower, boxes[:, 0].min(axis=0))
+                upper = np.maximum(upper, boxes[:, 1].max(axis=0))
+
+    # Each track is the line {p : p . normal = track_offset}, with p . direction increasing
+    # from its start to its end
+    direction = np.array([np.cos(azimuthal_angle), np.sin(azimuthal_angle)])
+    normal = np.array([-direction[1], direction[0]])
+    corners = np.array([lower, [upper[0], lower[1]], upper, [lower[0], upper[1]]])
+    projections = corners @ normal
+    width = projections.max() - projections.min()
+    # The relative tolerance keeps rounding error from adding a track on the box's edge
+    n_tracks = max(1, int(np.ceil(width / ray_spacing * (1.0 - 1.0e-12))))
+    middle = 0.5 * (projections.max() + projections.min())
+    track_offsets = middle + (np.arange(n_tracks) - 0.5 * (n_tracks - 1)) * ray_spacing
+    t_start, t_end = _clip_tracks(track_offsets, direction, normal, lower, upper)
+    starts = track_offsets[:, np.newaxis] * normal + t_start[:, np.newaxis] * direction
+    ends = track_offsets[:, np.newaxis] * normal + t_end[:, np.newaxis] * direction
+
+    args = [(arrays, track_offsets, direction, normal, max_pairs) for arrays in leaf_arrays]
+    if processes is None:
+        leaf_segments = [_trace_leaf(*leaf_args) for leaf_args in args]
+    else:
+        module_log.info(f"Tracing {len(leaves)} leaves with {processes} processes")
+        chunksize = max(1, len(args) // (4 * processes))
+        with ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker) as executor:
+            leaf_segments = list(executor.map(_trace_leaf, *zip(*args), chunksize=chunksize))
+
+    # Put the segments in order along each track
+    tracks, cell_ids, lengths, positions = (
+        np.concatenate([segments[i] for segments in leaf_segments]) for i in range(4)
+    )
+    order = np.lexsort((positions, tracks))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(tracks, minlength=n_tracks))])
+    module_log.info(f"Traced {n_tracks} tracks with {len(cell_ids)} segments")
+    return {
+        "starts": starts,
+        "ends": ends,
+        "offsets": offsets,
+        "cell_ids": cell_ids[order],
+        "lengths": lengths[order],
+    }
+
+
+def _get_leaves(mesh):
+    """Get the meshes without children below a mesh, in order."""
+    if getattr(mesh, "children", None) is None:
+        return [mesh]
+    return [leaf for child in mesh.children for leaf in _get_leaves(child)]
+
+
+def _clip_tracks(track_offsets, direction, normal, lower, upper):
+    """Get the distance along each track at which it enters and leaves a box.
+
+    Returns:
+        numpy.ndarray, numpy.ndarray: The distances along the direction of the tracks at which
+        they enter and leave the box.
+    """
+    t_start = np.full(len(track_offsets), -np.inf)
+    t_end = np.full(len(track_offsets), np.inf)
+    for axis in range(2):
+        if direction[axis] != 0.0:
+            origin = track_offsets * normal[axis]
+            t_lower = (lower[axis] - origin) / direction[axis]
+            t_upper = (upper[axis] - origin) / direction[axis]
+            t_start = np.maximum(t_start, np.minimum(t_lower, t_upper))
+            t_end = np.minimum(t_end, np.maximum(t_lower, t_upper))
+    return t_start, t_end
+
+
+def _trace_leaf(arrays, track_offsets, direction, normal, max_pairs):
+    """Find the segments of the tracks in the cells of a leaf. Used by worker processes.
+
+    Returns:
+        numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray: The track, cell ID, length,
+        and distance along the track of the start of each segment.
+    """
+    mesh = Mesh.from_arrays(*arrays)
+    segments = [
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype=np.int64),
+        np.empty(0),
+        np.empty(0),
+    ]
+    boxes = mesh.get_cell_bounding_boxes()
+    for cell_type, connectivity in mesh.cell_connectivity.items():
+        if len(connectivity) == 0:
+            continue
+        coords = mesh.vertex_coords[mesh.get_vertex_rows(connectivity)]
+        # The range of the projections of the corners of each cell box onto the track normal
+        corner_x = np.stack([boxes[cell_type][:, 0, 0], boxes[cell_type][:, 1, 0]], axis=1)
+        corner_y = np.stack([boxes[cell_type][:, 0, 1], boxes[cell_type][:, 1, 1]], axis=1)
+        projections = (
+            corner_x[:, :, np.newaxis] * normal[0] + corner_y[:, np.newaxis, :] * normal[1]
+        ).reshape(-1, 4)
+        low = projections.min(axis=1)
+        high = projections.max(axis=1)
+        chunk = max(1, max_pairs // len(connectivity))
+        for start in range(0, len(track_offsets), chunk):
+            offsets = track_offsets[start : start + chunk, np.newaxis]
+            tracks, rows = np.nonzero((low <= offsets) & (offsets <= high))
+            tracks = tracks + start
+            pairs, lengths, positions = _intersect_cells(
+                cell_type, coords[rows], track_offsets[tracks], direction, normal
+            )
+            segments[0] = np.concatenate([segments[0], tracks[pairs]])
+            segments[1] = np.concatenate(
+                [segments[1], mesh.cell_ids[cell_type][rows[pairs]].astype(np.int64)]
+            )
+            segments[2] = np.concatenate([segments[2], lengths])
+            segments[3] = np.concatenate([segments[3], positions])
+    return tuple(segments)
+
+
+def _intersect_cells(cell_type, coords, track_offsets, direction, normal):
+    """Intersect each track with its cell.
+
+    Every crossing of the track with an edge of the cell is found, and the parts of the track
+    between consecutive crossings whose middle is inside the cell are found. Neighboring parts
+    inside the cell are joined into one segment. A track that leaves a concave cell and enters
+    it again has a segment for each time it is inside the cell.
+
+    A part of a track that runs along a straight edge shared by two cells belongs to only one of
+    them. Since the vertices of both cells are in counterclockwise order, the edge runs in the
+    direction of the track in one cell and against it in the other. The part belongs to the
+    cell whose edge runs in the direction of the track, i.e. the cell to the left of the track.
+
+    Args:
+        cell_type (str): The type of the cells, e.g. "triangle6".
+        coords (numpy.ndarray): The coordinates of the vertices of each cell,
+            shape (n, n_vertices_per_cell, 2 or 3).
+        track_offsets (numpy.ndarray): The offset of each track along the normal, shape (n,).
+        direction (numpy.ndarray): The direction of the tracks.
+        normal (numpy.ndarray): The normal of the tracks.
+
+    Returns:
+        numpy.ndarray, numpy.ndarray, numpy.ndarray: The index of the track and cell of each
+        segment, the length of the segment, and the distance along the track at which it starts.
+    """
+    lin, edge, curvature = _get_curved_edge_heights(cell_type, coords)
+    # Edge i is the curve v_i + s edge_i + c_i L_i^2 s (s - 1) rotated(edge_i), for s in [0, 1].
+    # On the track, (point . normal) = track offset, which is a quadratic in s.
+    rotated = np.stack([-edge[:, :, 1], edge[:, :, 0]], axis=2)
+    bend = curvature * np.sum(edge * edge, axis=2) * (rotated @ normal)
+    a = bend
+    b = edge @ normal - bend
+    c = lin @ normal - track_offsets[:, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        linear = np.abs(a) <= 1.0e-12 * np.abs(b)
+        root = np.sqrt(b * b - 4.0 * a * c)
+        # Stable forms of the roots of the quadratic
+        q = -0.5 * (b + np.copysign(root, b))
+        s = np.stack(
+            [np.where(linear, -c / b, q / a), np.where(linear, np.nan, c / q)],
+            axis=2,
+        )
+    # Keep crossings at the vertices that rounding puts just outside of the edge
+    s = np.where((s >= -1.0e-9) & (s <= 1.0 + 1.0e-9), np.clip(s, 0.0, 1.0), np.nan)
+    points = (
+        lin[:, :, np.newaxis]
+        + s[:, :, :, np.newaxis] * edge[:, :, np.newaxis]
+        + (s * (s - 1.0))[:, :, :, np.newaxis]
+        * (curvature * np.sum(edge * edge, axis=2))[:, :, np.newaxis, np.newaxis]
+        * rotated[:, :, np.newaxis]
+    )
+    t = np.sort((points @ direction).reshape(len(coords), -1), axis=1)
+
+    # The straight edges that run along the track, against its direction
+    length_sq = np.sum(edge * edge, axis=2)
+    backward = (
+        (curvature == 0.0)
+        & (np.abs(edge @ normal) <= 1.0e-12 * np.sqrt(length_sq))
+        & (edge @ direction < 0.0)
+    )
+
+    # Join the parts between consecutive crossings whose middle is inside the cell into
+    # segments. A segment ends at the first part outside of the cell. Parts much shorter than
+    # the cell are between two crossings at the same vertex, so they are ignored.
+    pairs = []
+    lengths = []
+    positions = []
+    open_lengths = np.zeros(len(coords))
+    open_positions = np.full(len(coords), np.nan)
+    origin = track_offsets[:, np.newaxis] * normal
+    min_length = 1.0e-9 * np.sqrt(length_sq.max(axis=1))
+    for i in range(t.shape[1] - 1):
+        valid = ~np.isnan(t[:, i + 1]) & (t[:, i + 1] - t[:, i] > min_length)
+        middle = origin[valid] + (0.5 * (t[valid, i] + t[valid, i + 1]))[:, np.newaxis] * direction
+        inside = np.zeros(len(coords), dtype=bool)
+        inside[valid] = _points_in_cells(cell_type, coords[valid], middle)
+        # Leave parts on a backward edge to the cell on the other side of the edge
+        to_middle = middle[:, np.newaxis, :] - lin[valid]
+        left = edge[valid, :, 0] * to_middle[:, :, 1] - edge[valid, :, 1] * to_middle[:, :, 0]
+        on_edge = np.abs(left) <= 1.0e-12 * length_sq[valid]
+        inside[valid] &= ~np.any(backward[valid] & on_edge, axis=1)
+        closed = valid & ~inside & ~np.isnan(open_positions)
+        pairs.append(np.flatnonzero(closed))
+        lengths.append(open_lengths[closed])
+        positions.append(open_positions[closed])
+        open_lengths[closed] = 0.0
+        open_positions[closed] = np.nan
+        opened = inside & np.isnan(open_positions)
+        open_positions[opened] = t[opened, i]
+        open_lengths[inside] += t[inside, i + 1] - t[inside, i]
+    closed = ~np.isnan(open_positions)
+    pairs.append(np.flatnonzero(closed))
+    lengths.append(open_lengths[closed])
+    positions.append(open_positions[closed])
+    return np.concatenate(pairs), np.concatenate(lengths), np.concatenate(positions)
@@ -0,0 +1,404 @@
+"""A bounding volume hierarchy of the cells of a mesh."""
+
+import logging
+
+import h5py
+import numpy as np
+
+from .mesh import _get_curved_edge_heights, _points_in_cells
+
+module_log = logging.getLogger(__name__)
+
+# Number of bits of each coordinate in the Morton codes of the cell centers
+_morton_bits = 16
+
+
+class BoundingVolumeHierarchy:
+    """Class to find the cells of a mesh near points or boxes.
+
+    The cells are sorted along a Morton (Z-order) curve through the centers of their bounding
+    boxes and divided into buckets of leaf_size consecutive cells. The hierarchy is a complete
+    binary tree over the buckets, stored as an implicit heap: node 1 is the root, the children
+    of node k are nodes 2k and 2k+1, and node n_buckets + b is bucket b. Each node has the
+    bounding box of the cells below it. The tree is built and searched one level at a time,
+    with numpy operations over all nodes of the level and all queries at once.
+
+    The bounding boxes of cells with quadratic edges enclose the curved edges. See
+    :meth:`mocmg.mesh.Mesh.get_cell_bounding_boxes`.
+
+    Parameters:
+        mesh (mocmg.mesh.Mesh): The mesh.
+
+        leaf_size (int, optional): The number of cells in each bucket.
+
+    Attributes:
+        mesh (mocmg.mesh.Mesh): The mesh. If its vertices or cells are replaced, the index
+            must be built again.
+
+        leaf_size (int): The number of cells in each bucket.
+
+        cell_types (list of str): The cell types of the mesh.
+
+        cell_ids (numpy.ndarray): The ID of each cell, in the order of the tree.
+
+        cell_type_indices (numpy.ndarray): The position of the type of each cell in cell_types,
+            in the order of the tree.
+
+        cell_rows (numpy.ndarray): The row of each cell in the cell connectivity of its type,
+            in the order of the tree.
+
+        cell_boxes (numpy.ndarray): The minimum and maximum x,y coordinates of each cell, in the
+            order of the tree, shape (n_cells, 2, 2).
+
+        node_boxes (numpy.ndarray): The minimum and maximum x,y coordinates of the cells below
+            each node, shape (2 * n_buckets, 2, 2). Node 0 is not used.
+    """
+
+    def __init__(self, mesh, leaf_size=8):
+        """See class docstring."""
+        module_log.require(leaf_size > 0, "The leaf size must be greater than 0.")
+        module_log.info("Building bounding volume hierarchy")
+        self.mesh = mesh
+        self.leaf_size = leaf_size
+        cell_boxes = mesh.get_cell_bounding_boxes()
+        self.cell_types = list(cell_boxes.keys())
+        boxes = np.concatenate([np.empty((0, 2, 2))] + list(cell_boxes.values()))
+        ids = list(mesh.cell_ids.values())
+        cell_ids = np.concatenate([np.empty(0, dtype=np.int64)] + ids)
+        type_indices = np.repeat(np.arange(len(ids)), [len(v) for v in ids])
+        rows = np.concatenate([np.empty(0, dtype=np.int64)] + [np.arange(len(v)) for v in ids])
+
+        order = np.argsort(_get_morton_codes(boxes.mean(axis=1)), kind="stable")
+        self.cell_ids = cell_ids[order]
+        self.cell_type_indices = type_indices[order]
+        self.cell_rows = rows[order]
+        self.cell_boxes = boxes[order]
+        self.node_boxes = _make_node_boxes(self.cell_boxes, leaf_size)
+
+    @property
+    def n_buckets(self):
+        """int: The number of buckets, which is a power of 2."""
+        return len(self.node_boxes) // 2
+
+    @property
+    def depth(self):
+        """int: The number of levels of the tree below the root."""
+        return self.n_buckets.bit_length() - 1
+
+    def _find_buckets(self, lower, upper):
+        """Find the buckets whose box overlaps each query box.
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: The query and the bucket of each overlapping pair.
+        """
+        # Compare one coordinate at a time, with contiguous arrays of each box bound
+        node_bounds = [
+            np.ascontiguousarray(self.node_boxes[:, i, k]) for i in range(2) for k in range(2)
+        ]
+        query_bounds = [
+            np.ascontiguousarray(bound[:, k]) for bound in [lower, upper] for k in range(2)
+        ]
+        queries = np.arange(len(lower))
+        nodes = np.ones(len(lower), dtype=np.int64)
+        for level in range(self.depth + 1):
+            if level > 0:
+                queries = np.repeat(queries, 2)
+                nodes = np.repeat(2 * nodes, 2)
+                nodes[1::2] += 1
+            keep = np.ones(len(nodes), dtype=bool)
+            for k in range(2):
+                keep &= node_bounds[k][nodes] <= query_bounds[2 + k][queries]
+                keep &= query_bounds[k][queries] <= node_bounds[2 + k][nodes]
+            queries, nodes = queries[keep], nodes[keep]
+        return queries, nodes - self.n_buckets
+
+    def _expand_buckets(self, queries, buckets):
+        """Pair each query with the cells of its bucket.
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: The query and the position of the cell in the order of
+            the tree of each pair.
+        """
+        positions = buckets[:, np.newaxis] * self.leaf_size + np.arange(self.leaf_size)
+        queries = np.repeat(queries, self.leaf_size)
+        positions = positions.ravel()
+        in_mesh = positions < len(self.cell_ids)
+        return queries[in_mesh], positions[in_mesh]
+
+    def _get_cell_coords(self, type_index, positions):
+        """Get the vertex coordinates of the cells at positions in the order of the tree."""
+        cell_type = self.cell_types[type_index]
+        connectivity = self.mesh.cell_connectivity[cell_type][self.cell_rows[positions]]
+        return self.mesh.vertex_coords[self.mesh.get_vertex_rows(connectivity)]
+
+    def locate_points(self, xy):
+        """Find the cell that contains each point.
+
+        Cells are assumed to be convex, apart from their curved edges, with vertices in
+        counterclockwise order. A point on an edge is given one of the cells of the edge.
+
+        Args:
+            xy (numpy.ndarray): The x,y coordinates of the points, shape (n_points, 2). Any
+                further columns, such as z, are ignored.
+
+        Returns:
+            numpy.ndarray: The ID of the cell that contains each point, or -1.
+        """
+        xy = np.atleast_2d(np.asarray(xy, dtype=np.float64))[:, :2]
+        cell_ids = np.full(len(xy), -1, dtype=np.int64)
+        queries, positions = self._expand_buckets(*self._find_buckets(xy, xy))
+        keep = _boxes_overlap(self.cell_boxes[positions], xy[queries], xy[queries])
+        queries, positions = queries[keep], positions[keep]
+        inside = np.zeros(len(queries), dtype=bool)
+        for type_index, cell_type in enumerate(self.cell_types):
+            of_type = self.cell_type_indices[positions] == type_index
+            coords = self._get_cell_coords(type_index, positions[of_type])
+            inside[of_type] = _points_in_cells(cell_type, coords, xy[queries[of_type]])
+        found_queries, first = np.unique(queries[inside], return_index=True)
+        cell_ids[found_queries] = self.cell_ids[positions[inside][first]]
+        return cell_ids
+
+    def query_boxes(self, boxes):
+        """Find the cells whose bounding box overlaps each box.
+
+        Args:
+            boxes (numpy.ndarray): The minimum and maximum x,y coordinates of each box,
+                shape (n_boxes, 2, 2).
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: The offsets and the cell IDs, in compressed sparse row
+            form. The IDs of the cells that overlap box i are cell_ids[offsets[i]:offsets[i + 1]].
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 2, 2)
+        lower, upper = boxes[:, 0], boxes[:, 1]
+        queries, positions = self._expand_buckets(*self._find_buckets(lower, upper))
+        keep = _boxes_overlap(self.cell_boxes[positions], lower[queries], upper[queries])
+        queries, positions = queries[keep], positions[keep]
+        order = np.argsort(queries, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(queries, minlength=len(boxes)))])
+        return offsets, self.cell_ids[positions[order]]
+
+    def nearest_cells(self, xy):
+        """Find the cell nearest to each point.
+
+        The distance to a cell is 0 if the point is inside the cell, or the distance to its
+        nearest edge. Quadratic edges are measured as 8 straight segments along the edge.
+
+        Points inside a cell are found with :meth:`locate_points`. For the other points, the
+        tree is searched one level at a time. Every cell of a node is within the distance
+        to the farthest corner of the box of the node, so nodes whose box is farther than the
+        nearest farthest corner of any node of the level are skipped.
+
+        Args:
+            xy (numpy.ndarray): The x,y coordinates of the points, shape (n_points, 2). Any
+                further columns, such as z, are ignored.
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: The ID of the nearest cell to each point, and the
+            distance to it. If the mesh has no cells, the ID is -1 and the distance is inf.
+        """
+        xy = np.atleast_2d(np.asarray(xy, dtype=np.float64))[:, :2]
+        nearest = np.full(len(xy), -1, dtype=np.int64)
+        distances = np.full(len(xy), np.inf)
+        if len(self.cell_ids) == 0:
+            return nearest, distances
+        # Points inside a cell
+        nearest = self.locate_points(xy)
+        distances[nearest >= 0] = 0.0
+
+        bounds = np.full(len(xy), np.inf)
+        queries = np.flatnonzero(nearest == -1)
+        nodes = np.ones(len(queries), dtype=np.int64)
+        for level in range(self.depth + 1):
+            if level > 0:
+                queries = np.repeat(queries, 2)
+                nodes = np.repeat(2 * nodes, 2)
+                nodes[1::2] += 1
+            queries, nodes = _prune_farther(self.node_boxes[nodes], xy, queries, nodes, bounds)
+
+        # Find the distance to the cells of the buckets
+        queries, positions = self._expand_buckets(queries, nodes - self.n_buckets)
+        queries, positions = _prune_farther(
+            self.cell_boxes[positions], xy, queries, positions, bounds
+        )
+        cell_distances = np.empty(len(queries))
+        for type_index, cell_type in enumerate(self.cell_types):
+            of_type = self.cell_type_indices[positions] == type_index
+            coords = self._get_cell_coords(type_index, positions[of_type])
+            cell_distances[of_type] = _point_cell_distances(cell_type, coords, xy[queries[of_type]])
+
+        # Take the nearest cell of each query, keeping the first of equally near cells
+        order = np.lexsort((positions, cell_distances, queries))
+        queries, positions, cell_distances = (
+            queries[order],
+            positions[order],
+            cell_distances[order],
+        )
+        first = np.ones(len(queries), dtype=bool)
+        first[1:] = queries[1:] != queries[:-1]
+        nearest[queries[first]] = self.cell_ids[positions[first]]
+        distances[queries[first]] = cell_distances[first]
+        return nearest, distances
+
+    def write_hdf5(self, filename, group_name="bvh"):
+        """Write the hierarchy to a group of an HDF5 file.
+
+        The file is opened in append mode, so the hierarchy may be written to the h5 file of
+        the mesh from :func:`mocmg.mesh.write_xdmf_file`. A group with the same name is
+        replaced.
+
+        Args:
+            filename (str): The HDF5 file.
+            group_name (str, optional): The name of the group.
+        """
+        module_log.info(f"Writing bounding volume hierarchy to '{filename}'")
+        with h5py.File(filename, "a") as f:
+            if group_name in f:
+                del f[group_name]
+            group = f.create_group(group_name)
+            group.attrs["leaf_size"] = self.leaf_size
+            group.attrs["cell_types"] = self.cell_types
+            for name in ["cell_ids", "cell_type_indices", "cell_rows", "cell_boxes", "node_boxes"]:
+                group.create_dataset(name, data=getattr(self, name))
+
+    @classmethod
+    def read_hdf5(cls, filename, mesh, group_name="bvh"):
+        """Read a hierarchy from a group of an HDF5 file.
+
+        Args:
+            filename (str): The HDF5 file.
+            mesh (mocmg.mesh.Mesh): The mesh the hierarchy was built for.
+            group_name (str, optional): The name of the group.
+
+        Returns:
+            mocmg.mesh.BoundingVolumeHierarchy: The hierarchy.
+        """
+        module_log.info(f"Reading bounding volume hierarchy from '{filename}'")
+        bvh = cls.__new__(cls)
+        bvh.mesh = mesh
+        with h5py.File(filename, "r") as f:
+            module_log.require(group_name in f, f"No group '{group_name}' in '{filename}'.")
+            group = f[group_name]
+            bvh.leaf_size = int(group.attrs["leaf_size"])
+            bvh.cell_types = [str(cell_type) for cell_type in group.attrs["cell_types"]]
+            for name in ["cell_ids", "cell_type_indices", "cell_rows", "cell_boxes", "node_boxes"]:
+                setattr(bvh, name, group[name][()])
+
+        # Check that the hierarchy matches the mesh
+        module_log.require(
+            bvh.cell_types == list(mesh.cell_ids.keys())
+            and len(bvh.cell_ids) == mesh.n_cells()
+            and all(
+                np.array_equal(
+                    mesh.cell_ids[cell_type][bvh.cell_rows[bvh.cell_type_indices == i]],
+                    bvh.cell_ids[bvh.cell_type_indices == i],
+                )
+                for i, cell_type in enumerate(bvh.cell_types)
+            ),
+            f"The bounding volume hierarchy in '{filename}' does not match the mesh.",
+        )
+        return bvh
+
+
+def _get_morton_codes(points):
+    """Get the Morton code of each point, from its x,y coordinates scaled to the point bounds."""
+    codes = np.zeros(len(points), dtype=np.uint64)
+    if len(points) == 0:
+        return codes
+    lower = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lower, np.finfo(np.float64).tiny)
+    scaled = ((points - lower) / extent * (2**_morton_bits - 1)).astype(np.uint64)
+    for bit in range(_morton_bits):
+        for axis in range(2):
+            bits = (scaled[:, axis] >> np.uint64(bit)) & np.uint64(1)
+            codes |= bits << np.uint64(2 * bit + axis)
+    return codes
+
+
+def _make_node_boxes(cell_boxes, leaf_size):
+    """Make the boxes of the nodes of the tree, level by level from the buckets up.
+
+    Returns:
+        numpy.ndarray: The box of each node, shape (2 * n_buckets, 2, 2).
+    """
+    n_buckets = 1
+    while n_buckets * leaf_size < len(cell_boxes):
+        n_buckets *= 2
+    # Pad the cells with empty boxes to fill the buckets
+    padded = np.empty((n_buckets * leaf_size, 2, 2))
+    padded[:, 0] = np.inf
+    padded[:, 1] = -np.inf
+    padded[: len(cell_boxes)] = cell_boxes
+    padded = padded.reshape(n_buckets, leaf_size, 2, 2)
+    node_boxes = np.empty((2 * n_buckets, 2, 2))
+    node_boxes[n_buckets:, 0] = padded[:, :, 0].min(axis=1)
+    node_boxes[n_buckets:, 1] = padded[:, :, 1].max(axis=1)
+    n_nodes = n_buckets // 2
+    while n_nodes > 0:
+        children = node_boxes[2 * n_nodes : 4 * n_nodes].reshape(n_nodes, 2, 2, 2)
+        node_boxes[n_nodes : 2 * n_nodes, 0] = children[:, :, 0].min(axis=1)
+        node_boxes[n_nodes : 2 * n_nodes, 1] = children[:, :, 1].max(axis=1)
+        n_nodes //= 2
+    node_boxes[0] = np.nan
+    return node_boxes
+
+
+def _boxes_overlap(boxes, lower, upper):
+    """Test whether each box overlaps the box from lower to upper. Empty boxes overlap nothing."""
+    return np.all((boxes[:, 0] <= upper) & (lower <= boxes[:, 1]), axis=1)
+
+
+def _prune_farther(boxes, xy, queries, items, bounds):
+    """Drop the items whose box is farther from the query point than the bound of the query.
+
+    The bound of each query is first lowered to the distance to the farthest corner of the
+    nearest box, since each box contains at least one cell.
+
+    Returns:
+        numpy.ndarray, numpy.ndarray: The queries and items that are kept.
+    """
+    points = xy[queries]
+    far = np.maximum(np.abs(boxes[:, 0] - points), np.abs(boxes[:, 1] - points))
+    far = np.where(
+        np.all(boxes[:, 0] <= boxes[:, 1], axis=1), np.hypot(far[:, 0], far[:, 1]), np.inf
+    )
+    np.minimum.at(bounds, queries, far)
+    keep = _box_distances(boxes, points) <= bounds[queries]
+    return queries[keep], items[keep]
+
+
+def _box_distances(boxes, xy):
+    """Get the distance from each point to its box, which is inf for empty boxes."""
+    gap = np.maximum(np.maximum(boxes[:, 0] - xy, xy - boxes[:, 1]), 0.0)
+    distances = np.sqrt(np.sum(gap * gap, axis=1))
+    return np.where(np.all(boxes[:, 0] <= boxes[:, 1], axis=1), distances, np.inf)
+
+
+def _point_cell_distances(cell_type, coords, xy, n_segments=8):
+    """Get the distance from each point to its cell, which is 0 if the point is inside the cell.
+
+    Quadratic edges are measured as n_segments straight segments along the edge.
+    """
+    lin, edge, curvature = _get_curved_edge_heights(cell_type, coords)
+    if np.any(curvature != 0.0):
+        # Points along the parabola y = c x (x - L), see _compute_cell_bounding_boxes
+        t = np.linspace(0.0, 1.0, n_segments + 1)
+        normal = np.stack([-edge[:, :, 1], edge[:, :, 0]], axis=2)
+        height = curvature * np.sum(edge * edge, axis=2)
+        points = (
+            lin[:, :, np.newaxis]
+            + t[:, np.newaxis] * edge[:, :, np.newaxis]
+            + (t * (t - 1.0))[:, np.newaxis]
+            * height[:, :, np.newaxis, np.newaxis]
+            * normal[:, :, np.newaxis]
+        )
+        starts = points[:, :, :-1].reshape(len(lin), -1, 2)
+        segments = (points[:, :, 1:] - points[:, :, :-1]).reshape(len(lin), -1, 2)
+    else:
+        starts, segments = lin, edge
+    to_point = xy[:, np.newaxis, :] - starts
+    length_sq = np.maximum(np.sum(segments * segments, axis=2), np.finfo(np.float64).tiny)
+    t = np.clip(np.sum(to_point * segments, axis=2) / length_sq, 0.0, 1.0)
+    offset = to_point - t[:, :, np.newaxis] * segments
+    distances = np.sqrt(np.sum(offset * offset, axis=2)).min(axis=1)
+    return np.where(_points_in_cells(cell_type, coords, xy), 0.0, distances)
@@ -1,19 +1,32 @@
 """Functions for reading and writing XDMF files."""
+
+import hashlib
 import logging
 import os
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
 
 import h5py
 import lxml.etree as etree
 import numpy as np
 
+from mocmg.initialize import _initialize_worker
 from mocmg.mesh import GridMesh, Mesh
+from mocmg.mesh.mesh import (
+    _get_compact_dtype,
+    _has_quadratic_edges,
+    _make_sorted_index,
+    _search_sorted_ids,
+)
 
 module_log = logging.getLogger(__name__)
 
 numpy_to_xdmf_dtype = {
+    "int8": ("Char", "1"),
+    "int16": ("Short", "2"),
     "int32": ("Int", "4"),
     "int64": ("Int", "8"),
+    "uint8": ("UChar", "1"),
+    "uint16": ("UShort", "2"),
     "uint32": ("UInt", "4"),
     "uint64": ("UInt", "8"),
     "float32": ("Float", "4"),
@@ -36,8 +49,50 @@ xdmf_int_to_topo_type = {
 
 topo_type_to_xdmf_int = {v: k for k, v in xdmf_int_to_topo_type.items()}
 
+xdmf_to_topo_type = {
+    xdmf_type: topo_type
+    for topo_type, xdmf_types in topo_to_xdmf_type.items()
+    for xdmf_type in xdmf_types
+}
+
+_storage_profiles = {
+    "none": {"compression": None},
+    "lzf": {"compression": "lzf"},
+    "gzip": {"compression": "gzip"},
+    "gzip_shuffle": {"compression": "gzip", "shuffle": True},
+}
+
+_dataset_kinds = ["vertices", "cells", "sets", "material_id"]
+
+_storage_option_names = [
+    "compression",
+    "compression_opts",
+    "shuffle",
+    "chunks",
+    "contiguous_below",
+    "dtype",
+    "drop_z",
+]
+
+topo_type_num_vertices = {
+    "quad": 4,
+    "quad8": 8,
+    "triangle": 3,
+    "triangle6": 6,
+}
+
 
-def write_xdmf_file(filename, mesh, split_level=None, material_name_map=None, compression_opts=4):
+def write_xdmf_file(
+    filename,
+    mesh,
+    split_level=None,
+    material_name_map=None,
+    compression_opts=4,
+    processes=None,
+    deduplicate=False,
+    storage=None,
+    compact=False,
+):
     """Write a mesh object into an XDMF file.
 
     Note that if a mesh has any materials, it is assumed that every cell has a material.
@@ -52,19 +107,74 @@ def write_xdmf_file(filename, mesh, split_level=None, material_name_map=None, co
         mesh (mocmg.mesh.Mesh) : The mesh object to save as an XDMF file.
 
         split_level (int, optional) : Split the mesh into different files based on grid level provided.
+            Each file is named after the file name and the names of the grids above it, e.g.
+            'name_GRID_L1_1_1.xdmf'. With processes, each file is written by a worker process.
+            All files use the same material IDs.
 
         compression_opts (int, optional) : Compression level. May be an integer from 0 to 9, default is 4.
 
+        processes (int, optional) : Number of worker processes used to compute the data of the
+            leaf meshes of a GridMesh. The data is written to the h5 file by this process,
+            in the same order as without workers, so the files are identical.
+            If split_level produces more than one file, the files are instead written in
+            parallel, one per worker at a time. By default, everything is done in this process.
+
+        deduplicate (bool, optional) : Store the data of the leaf meshes of a GridMesh that
+            is the same as the data of an earlier leaf as an HDF5 hard link to it. This is common
+            in lattices, where many leaves are the same up to a translation. The vertices and
+            cells of each leaf are first sorted by their position relative to the leaf, so the
+            cells, cell sets, and material IDs of translated copies are linked even if their
+            IDs are in a different order. The vertex coordinates of a translated copy differ,
+            so they are stored in full. Instead, each leaf that is a translated copy of an
+            earlier leaf is given the h5 group attributes 'instance', the name of the earlier
+            leaf, and 'offset', the translation between them. The XDMF file is the same as
+            without deduplication, but the rows of the h5 data of each leaf may be in a
+            different order.
+
+        storage (str or dict, optional) : How the HDF5 datasets are stored. Either the name of
+            a profile, 'none', 'lzf', 'gzip', or 'gzip_shuffle', or a dictionary of options:
+
+            - 'compression' : None, 'lzf', or 'gzip'.
+            - 'compression_opts' : The gzip level. The default is compression_opts.
+            - 'shuffle' : Apply the shuffle filter, which often improves compression.
+            - 'chunks' : The chunk shape, or the number of rows per chunk.
+              By default, h5py chooses the chunk shape of filtered datasets.
+            - 'contiguous_below' : Datasets smaller than this number of bytes are stored
+              contiguously, without filters.
+            - 'dtype' : The data type of the dataset, e.g. 'float32', or 'compact' for the
+              smallest unsigned integer type that holds the data. 'compact' does not change
+              floating point data.
+            - 'drop_z' : Only used for vertices. Store the x,y coordinates of the vertices
+              with the XDMF 'XY' geometry type. Every z coordinate must be 0.
+
+            The options of each dataset kind, 'vertices', 'cells', 'sets', and 'material_id',
+            may be overridden by a key of that name with a profile name or a dictionary of
+            options. By default, every dataset is compressed with gzip.
+            Example: {"compression": "lzf", "cells": {"compression": "gzip", "shuffle": True}}
+
+        compact (bool, optional) : Store the cells, cell sets, and material IDs with the
+            smallest unsigned integer type that holds them, unless a dtype is given for them in
+            storage. Combine with storage={"vertices": {"dtype": "float32", "drop_z": True}}
+            to also reduce the size of the vertices.
+
+    Returns:
+        list of tuple: The (xdmf, h5) file names of each file that was written.
+
     """
     module_log.require(isinstance(mesh, Mesh), "Invalid type given as input.")
+    module_log.require(
+        processes is None or processes > 0, "Number of processes must be greater than 0."
+    )
+    storage = _make_storage_profile(storage, compression_opts, compact)
 
     if material_name_map is None and (isinstance(mesh, GridMesh) or mesh.cell_sets):
         module_log.info("Generating global material ID map.")
         material_name_map, material_ctr = _make_global_material_id_map(mesh)
 
     if split_level is not None:
-        _handle_split_level(filename, mesh, split_level, material_name_map, compression_opts)
-        return
+        return _handle_split_level(
+            filename, mesh, split_level, material_name_map, storage, processes, deduplicate
+        )
 
     module_log.info(f"Writing mesh data to XDMF file '{filename}'.")
     if isinstance(mesh, Mesh) and not isinstance(mesh, GridMesh):
@@ -74,10 +184,6 @@ def write_xdmf_file(filename, mesh, split_level=None, material_name_map=None, co
         xdmf_file = etree.Element("Xdmf", Version="3.0")
         domain = etree.SubElement(xdmf_file, "Domain")
 
-        vertices = mesh.vertices
-        cells = mesh.cells
-        cell_sets = mesh.cell_sets
-
         if material_name_map:
             # print the material names before any grids
             material_names = list(material_name_map.keys())
@@ -94,11 +200,9 @@ def write_xdmf_file(filename, mesh, split_level=None, material_name_map=None, co
             domain,
             h5_filename,
             h5_file,
-            vertices,
-            cells,
-            cell_sets,
+            mesh,
             material_name_map,
-            compression_opts,
+            storage,
         )
 
         tree = etree.ElementTree(xdmf_file)
@@ -125,79 +229,308 @@ def write_xdmf_file(filename, mesh, split_level=None, material_name_map=None, co
             h5_filename,
             h5_file,
             material_name_map,
-            compression_opts=compression_opts,
+            storage=storage,
+            processes=processes,
+            deduplicate=deduplicate,
         )
 
         tree = etree.ElementTree(xdmf_file)
         tree.write(filename, pretty_print=True, encoding="utf-8", xml_declaration=True)
         h5_file.close()
 
+    return [(filename, h5_filename)]
+
+
+def _make_storage_profile(storage, compression_opts, compact=False):
+    """Make the storage options of each dataset kind from the storage argument.
+
+    See :func:`write_xdmf_file` for the form of the storage argument.
+
+    Returns:
+        dict: A dictionary of the form "dataset_kind": options dict, with every option set.
+        Since it is a valid storage argument, it may be passed to write_xdmf_file again.
+    """
+    if storage is None:
+        storage = "gzip"
+    storage = _get_storage_options(storage)
+    default_options = {
+        "compression": "gzip",
+        "compression_opts": compression_opts,
+        "shuffle": False,
+        "chunks": None,
+        "contiguous_below": 0,
+        "dtype": None,
+        "drop_z": False,
+    }
+    default_options.update({k: v for k, v in storage.items() if k not in _dataset_kinds})
+    profile = {}
+    for kind in _dataset_kinds:
+        options = dict(default_options)
+        if compact and kind != "vertices" and "dtype" not in storage:
+            options["dtype"] = "compact"
+        options.update(_get_storage_options(storage.get(kind, {})))
+        unknown_options = set(options.keys()) - set(_storage_option_names)
+        module_log.require(
+            not unknown_options, f"Unknown storage options for '{kind}': {sorted(unknown_options)}."
+        )
+        module_log.require(
+            options["compression"] in [None, "lzf", "gzip"],
+            f"Unsupported compression '{options['compression']}'.",
+        )
+        profile[kind] = options
+    return profile
+
+
+def _get_storage_options(storage):
+    """Get the options dictionary of a storage profile name or options dictionary."""
+    if isinstance(storage, str):
+        module_log.require(storage in _storage_profiles, f"Unknown storage profile '{storage}'.")
+        return _storage_profiles[storage]
+    return storage
+
+
+def _convert_dtype(storage_options, data):
+    """Convert data to the data type of the storage options."""
+    dtype = storage_options["dtype"]
+    if dtype is None:
+        return data
+    if dtype == "compact":
+        if not np.issubdtype(data.dtype, np.integer):
+            return data
+        dtype = _get_compact_dtype(data)
+    return data.astype(dtype, copy=False)
+
+
+def _get_dataset_options(storage_options, data):
+    """Get the keyword arguments of h5py create_dataset for data with the storage options."""
+    if data.size == 0 or data.nbytes < storage_options["contiguous_below"]:
+        return {}
+    kwargs = {}
+    if storage_options["compression"] is not None:
+        kwargs["compression"] = storage_options["compression"]
+        if storage_options["compression"] == "gzip":
+            kwargs["compression_opts"] = storage_options["compression_opts"]
+    if storage_options["shuffle"]:
+        kwargs["shuffle"] = True
+    chunks = storage_options["chunks"]
+    if chunks is not None:
+        if isinstance(chunks, int):
+            chunks = (chunks,) + data.shape[1:]
+        # A chunk may not be larger than the dataset
+        kwargs["chunks"] = tuple(max(1, min(c, n)) for c, n in zip(chunks, data.shape))
+    return kwargs
+
 
 def _add_uniform_grid(
     name,
     xml_element,
     h5_filename,
     h5_group,
-    vertices,
-    cells,
-    cell_sets,
+    mesh,
     material_name_map,
-    compression_opts,
+    storage,
 ):
     """Add a uniform grid to the xml element and write the h5 data."""
-    # Name is basically group list
-    grid = etree.SubElement(xml_element, "Grid", Name=name, GridType="Uniform")
-    # Create group for name
-    material_names, material_cells = _get_material_sets(cell_sets)
-    this_h5_group = h5_group.create_group(name)
-    _add_geometry(grid, h5_filename, this_h5_group, vertices, compression_opts)
-    _add_topology(grid, h5_filename, this_h5_group, vertices, cells, compression_opts)
+    grid = etree.SubElement(xml_element, "Grid")
+    grid_data = _prepare_uniform_grid(mesh, material_name_map)
+    _write_uniform_grid(name, grid, h5_filename, h5_group, grid_data, storage)
+
+
+def _prepare_uniform_grid(mesh, material_name_map, canonical=False):
+    """Compute the arrays of a uniform grid that are written to the h5 file.
 
+    If canonical is True, the vertices and cells are first put in the order of
+    :func:`_make_canonical_mesh`, and the rows of each cell set are sorted.
+
+    Returns:
+        dict: The vertex coordinates, topology, non-material cell sets, and material IDs of
+        the grid, as used by :func:`_write_uniform_grid`. It only contains arrays, strings, and
+        integers, so it may be sent between processes.
+    """
+    if canonical:
+        mesh = _make_canonical_mesh(mesh)
+    material_names, material_cells, cell_sets = _get_material_sets(mesh.cell_sets)
+    grid_data = {
+        "vertices": mesh.vertex_coords,
+        "topology": _make_topology(mesh),
+        "cell_sets": {},
+        "material_id": None,
+    }
+    if cell_sets or material_cells:
+        cell_row_map = _make_h5_cell_row_map(mesh)
     if cell_sets:
-        _add_cell_sets(grid, h5_filename, this_h5_group, cells, cell_sets, compression_opts)
+        grid_data["cell_sets"] = _make_cell_sets(cell_row_map, cell_sets)
+        if canonical:
+            grid_data["cell_sets"] = {k: np.sort(v) for k, v in grid_data["cell_sets"].items()}
     if material_cells:
+        grid_data["material_id"] = _make_material_ids(
+            cell_row_map, material_name_map, material_names, material_cells
+        )
+    return grid_data
+
+
+def _prepare_leaf_grid(
+    vertex_ids, vertex_coords, cell_ids, cell_connectivity, cell_sets, material_name_map, canonical
+):
+    """Compute the arrays of a leaf grid from the mesh arrays. Used by worker processes."""
+    mesh = Mesh.from_arrays(vertex_ids, vertex_coords, cell_ids, cell_connectivity, cell_sets)
+    return _prepare_uniform_grid(mesh, material_name_map, canonical)
+
+
+def _make_canonical_mesh(mesh):
+    """Reorder the vertices and cells of a mesh so that translated copies have the same arrays.
+
+    The vertices are sorted by their coordinates relative to the minimum corner of their
+    bounding box. The vertices of each cell are rotated, keeping their orientation, to start at
+    the corner that comes first in this order, and the cells of each type are then sorted by
+    their vertices.
+
+    Returns:
+        mocmg.mesh.Mesh: The mesh with reordered arrays.
+    """
+    vertex_coords = mesh.vertex_coords
+    if len(vertex_coords) == 0:
+        return mesh
+    # Round the relative coordinates, so that the order does not depend on rounding errors
+    tolerance = 1e-10 * max(1.0, float(np.abs(vertex_coords).max()))
+    keys = np.round((vertex_coords - vertex_coords.min(axis=0)) / tolerance)
+    vertex_order = np.lexsort(keys.T[::-1])
+    vertex_ranks = np.empty(len(vertex_order), dtype=np.int64)
+    vertex_ranks[vertex_order] = np.arange(len(vertex_order))
+
+    cell_ids = {}
+    cell_connectivity = {}
+    for cell_type, connectivity in mesh.cell_connectivity.items():
+        ranks = vertex_ranks[mesh.get_vertex_rows(connectivity)]
+        num_corners = connectivity.shape[1]
+        if _has_quadratic_edges[cell_type]:
+            num_corners //= 2
+        # The edge midpoints are rotated with the corners
+        start = np.argmin(ranks[:, :num_corners], axis=1)
+        columns = (start[:, np.newaxis] + np.arange(num_corners)) % num_corners
+        if _has_quadratic_edges[cell_type]:
+            columns = np.concatenate([columns, columns + num_corners], axis=1)
+        ranks = np.take_along_axis(ranks, columns, axis=1)
+        cell_order = np.lexsort(ranks.T[::-1])
+        cell_ids[cell_type] = mesh.cell_ids[cell_type][cell_order]
+        cell_connectivity[cell_type] = np.take_along_axis(connectivity, columns, axis=1)[cell_order]
+
+    return Mesh.from_arrays(
+        mesh.vertex_ids[vertex_order],
+        vertex_coords[vertex_order],
+        cell_ids,
+        cell_connectivity,
+        mesh.cell_sets,
+    )
+
+
+def _write_uniform_grid(
+    name, grid, h5_filename, h5_group, grid_data, storage, written_datasets=None
+):
+    """Fill in an empty grid element as a uniform grid and write the h5 data computed for it.
+
+    If written_datasets is given, datasets with the same data as a dataset that was already
+    written are stored as hard links to it. See :func:`_add_data_item`.
+    """
+    # Name is basically group list
+    grid.set("Name", name)
+    grid.set("GridType", "Uniform")
+    # Create group for name
+    this_h5_group = h5_group.create_group(name)
+    _add_geometry(
+        grid,
+        h5_filename,
+        this_h5_group,
+        grid_data["vertices"],
+        storage,
+        written_datasets,
+    )
+    _add_topology(
+        grid,
+        h5_filename,
+        this_h5_group,
+        grid_data["topology"],
+        storage,
+        written_datasets,
+    )
+    _add_cell_sets(
+        grid,
+        h5_filename,
+        this_h5_group,
+        grid_data["cell_sets"],
+        storage,
+        written_datasets,
+    )
+    if grid_data["material_id"] is not None:
         _add_materials(
             grid,
             h5_filename,
             this_h5_group,
-            cells,
-            material_name_map,
-            material_names,
-            material_cells,
-            compression_opts,
+            grid_data["material_id"],
+            storage,
+            written_datasets,
         )
 
 
-def _add_geometry(grid, h5_filename, h5_group, vertices, compression_opts):
-    """Add XYZ vertex locations in the geometry block."""
-    geom = etree.SubElement(grid, "Geometry", GeometryType="XYZ")
-    vert_ids = list(vertices.keys())
-    datatype, precision = numpy_to_xdmf_dtype[vertices[vert_ids[0]].dtype.name]
-    dim = "{} {}".format(len(vert_ids), 3)
-    vertices_data_item = etree.SubElement(
-        geom,
+def _add_data_item(
+    xml_element, h5_filename, h5_group, dataset_name, data, storage_options, written_datasets=None
+):
+    """Write data to a dataset in the h5 group and add a data item that references it.
+
+    The dataset is stored with the options of one dataset kind of the storage profile.
+    See :func:`_make_storage_profile`.
+
+    If written_datasets is given, it maps a key of the data of each dataset written so far to
+    the path of the dataset. Data that was already written is stored as a hard link to the
+    existing dataset, so the data item and the h5 path are the same as without the link.
+    """
+    data = _convert_dtype(storage_options, data)
+    datatype, precision = numpy_to_xdmf_dtype[data.dtype.name]
+    data_item = etree.SubElement(
+        xml_element,
         "DataItem",
         DataType=datatype,
-        Dimensions=dim,
+        Dimensions=" ".join(str(n) for n in data.shape),
         Format="HDF",
         Precision=precision,
     )
-    h5_group.create_dataset(
-        "vertices",
-        data=np.stack(list(vertices.values())),
-        compression="gzip",
-        compression_opts=compression_opts,
-    )
-    vertices_data_item.text = os.path.basename(h5_filename) + ":" + h5_group.name + "/vertices"
+    data_key = None if written_datasets is None else _get_data_key(data)
+    if data_key is not None and data_key in written_datasets:
+        h5_group[dataset_name] = h5_group.file[written_datasets[data_key]]
+    else:
+        h5_group.create_dataset(
+            dataset_name, data=data, **_get_dataset_options(storage_options, data)
+        )
+        if data_key is not None:
+            written_datasets[data_key] = h5_group.name + "/" + dataset_name
+    data_item.text = os.path.basename(h5_filename) + ":" + h5_group.name + "/" + dataset_name
 
 
-def _map_to_0_index(keys):
-    """Map data from current ID to 0 index for hdf5."""
-    list_keys = list(keys)
-    key_map = {}
-    for i, key in enumerate(list_keys):
-        key_map[key] = i
-    return key_map
+def _get_data_key(data):
+    """Get a key that identifies the contents of an array."""
+    data = np.ascontiguousarray(data)
+    return data.dtype.str, data.shape, hashlib.sha1(data.view(np.uint8)).hexdigest()
+
+
+def _add_geometry(grid, h5_filename, h5_group, vertex_coords, storage, written_datasets=None):
+    """Add XYZ, or XY if z is dropped, vertex locations in the geometry block."""
+    if storage["vertices"]["drop_z"]:
+        module_log.require(
+            not vertex_coords[:, 2].any(), "Cannot drop z, since a vertex has a nonzero z."
+        )
+        vertex_coords = vertex_coords[:, :2]
+        geom = etree.SubElement(grid, "Geometry", GeometryType="XY")
+    else:
+        geom = etree.SubElement(grid, "Geometry", GeometryType="XYZ")
+    _add_data_item(
+        geom,
+        h5_filename,
+        h5_group,
+        "vertices",
+        vertex_coords,
+        storage["vertices"],
+        written_datasets,
+    )
 
 
 def _make_global_material_id_map(mesh):
@@ -244,116 +577,118 @@ def _print_material_names_and_ids(material_ctr, material_name_map):
 
 
 def _get_material_sets(cell_sets):
-    """Get the cell sets that are materials."""
+    """Separate the cell sets that are materials from the other cell sets.
+
+    Returns:
+        list, list, dict: The material names, the cells of each material, and the cell sets
+        that are not materials.
+    """
     material_names = []
     material_cells = []
+    other_sets = {}
     if cell_sets:
-        set_names = list(cell_sets.keys())
-        for set_name in set_names:
+        for set_name, set_cells in cell_sets.items():
             if "MATERIAL" in set_name.upper():
                 material_names.append(set_name.replace(" ", "_").upper())
-                material_cells.append(cell_sets.pop(set_name))
+                material_cells.append(set_cells)
+            else:
+                other_sets[set_name] = set_cells
 
-    return material_names, material_cells
+    return material_names, material_cells, other_sets
 
 
-def _add_topology(grid, h5_filename, h5_group, vertices, cells, compression_opts):
-    """Add mesh cells in the topology block."""
-    # Get map of vertex IDs to 0 index hdf5 data
-    vert_map = _map_to_0_index(vertices.keys())
+def _make_topology(mesh):
+    """Compute the topology of the mesh in terms of the 0 index hdf5 vertex data.
+
+    Returns:
+        tuple: The XDMF topology type, the number of cells, the number of vertices per cell
+        (None for mixed topology), and the topology data.
+    """
+    cell_connectivity = mesh.cell_connectivity
+    # Map the vertex IDs of every cell to the 0 index of the vertex in the hdf5 data. The rows
+    # can be larger than the vertex IDs of the cells, so their type must hold every row.
+    row_dtype = np.min_scalar_type(max(len(mesh.vertex_ids) - 1, 0))
+    topo_arrays = {
+        cell_type: mesh.get_vertex_rows(connectivity).astype(
+            np.promote_types(connectivity.dtype, row_dtype), copy=False
+        )
+        for cell_type, connectivity in cell_connectivity.items()
+    }
 
     # Single topology
-    if len(cells) == 1:
-        topo_type = list(cells.keys())[0]
-        xdmf_type = topo_to_xdmf_type[topo_type][0]
-        cell_arrays = list(deepcopy(cells[topo_type]).values())
-        # convert vertices to hdf5 local 0 index
-        for i in range(len(cell_arrays)):
-            for j in range(len(cell_arrays[i])):
-                cell_arrays[i][j] = vert_map[cell_arrays[i][j]]
-
-        num_cells = len(cell_arrays)
-        verts_per_cell = len(cell_arrays[0])
+    if len(topo_arrays) == 1:
+        topo_type = list(topo_arrays.keys())[0]
+        topo_data = topo_arrays[topo_type]
+        num_cells, verts_per_cell = topo_data.shape
+        return topo_to_xdmf_type[topo_type][0], num_cells, verts_per_cell, topo_data
+
+    # Mixed topology
+    # Each cell is written as its XDMF type number followed by its vertices. Interleave
+    # the type numbers with the vertices of all cells of a type at once.
+    total_num_cells = sum(len(topo_array) for topo_array in topo_arrays.values())
+    topo_blocks = []
+    for cell_type, topo_array in topo_arrays.items():
+        num_cells, verts_per_cell = topo_array.shape
+        topo_block = np.empty((num_cells, verts_per_cell + 1), dtype=topo_array.dtype)
+        topo_block[:, 0] = topo_type_to_xdmf_int[cell_type]
+        topo_block[:, 1:] = topo_array
+        topo_blocks.append(topo_block.ravel())
+    return "Mixed", total_num_cells, None, np.concatenate(topo_blocks)
+
+
+def _add_topology(grid, h5_filename, h5_group, topology, storage, written_datasets=None):
+    """Add mesh cells in the topology block."""
+    xdmf_type, num_cells, verts_per_cell, topo_data = topology
+    if verts_per_cell is None:
         topo = etree.SubElement(
             grid,
             "Topology",
             TopologyType=xdmf_type,
             NumberOfElements=str(num_cells),
-            NodesPerElement=str(verts_per_cell),
         )
-        datatype, precision = numpy_to_xdmf_dtype[cell_arrays[0].dtype.name]
-        dim = "{} {}".format(num_cells, verts_per_cell)
-        topo_data_item = etree.SubElement(
-            topo,
-            "DataItem",
-            DataType=datatype,
-            Dimensions=dim,
-            Format="HDF",
-            Precision=precision,
-        )
-        h5_group.create_dataset(
-            "cells",
-            data=np.stack(cell_arrays),
-            compression="gzip",
-            compression_opts=compression_opts,
-        )
-        topo_data_item.text = os.path.basename(h5_filename) + ":" + h5_group.name + "/cells"
-
-    # Mixed topology
     else:
-        total_num_cells = sum(len(cells[cell_type]) for cell_type in cells.keys())
         topo = etree.SubElement(
             grid,
             "Topology",
-            TopologyType="Mixed",
-            NumberOfElements=str(total_num_cells),
+            TopologyType=xdmf_type,
+            NumberOfElements=str(num_cells),
+            NodesPerElement=str(verts_per_cell),
         )
+    _add_data_item(
+        topo, h5_filename, h5_group, "cells", topo_data, storage["cells"], written_datasets
+    )
 
-        vert_map = _map_to_0_index(vertices.keys())
-        topo_data = []
-        total_num_verts = 0
-        for cell_type in cells.keys():
-            first_array = cells[cell_type][list(cells[cell_type].keys())[0]]
-            verts_per_cell = len(first_array)
-            num_cells = len(cells[cell_type].keys())
-            total_num_verts += num_cells * verts_per_cell
-            xdmf_int = topo_type_to_xdmf_int[cell_type]
-            for cell in cells[cell_type].values():
-                new_cell_verts = np.zeros(verts_per_cell + 1, dtype=np.int64)
-                new_cell_verts[0] = xdmf_int
-                for i, vert in enumerate(cell):
-                    new_cell_verts[i + 1] = vert_map[vert]
-                topo_data.append(new_cell_verts)
-
-        dim = str(total_num_cells + total_num_verts)
-        datatype, precision = numpy_to_xdmf_dtype[first_array.dtype.name]
-        topo_data_item = etree.SubElement(
-            topo,
-            "DataItem",
-            DataType=datatype,
-            Dimensions=dim,
-            Format="HDF",
-            Precision=precision,
-        )
-        h5_group.create_dataset(
-            "cells",
-            data=np.concatenate(topo_data),
-            compression="gzip",
-            compression_opts=compression_opts,
-        )
-        topo_data_item.text = os.path.basename(h5_filename) + ":" + h5_group.name + "/cells"
 
+def _make_material_ids(cell_row_map, material_name_map, material_names, material_cells):
+    """Compute the material ID of each cell, in the order of the hdf5 data."""
+    total_num_cells = len(cell_row_map[0])
+    # Scatter the ID of each material to the hdf5 rows of its cells. Cell IDs that are not in
+    # the mesh are ignored.
+    material_rows = []
+    material_ids = []
+    for material, cells in zip(material_names, material_cells):
+        rows, found = _map_to_h5_cell_rows(cell_row_map, cells)
+        material_rows.append(rows[found])
+        material_ids.append(np.full(np.count_nonzero(found), material_name_map[material]))
+    material_rows = np.concatenate(material_rows)
+    material_array = np.zeros(total_num_cells, dtype=np.int64) - 1
+    material_array[material_rows] = np.concatenate(material_ids)
+    materials_per_cell = np.bincount(material_rows, minlength=total_num_cells)
 
-def _add_materials(
-    grid,
-    h5_filename,
-    h5_group,
-    cells,
-    material_name_map,
-    material_names,
-    material_cells,
-    compression_opts,
-):
+    num_multiple = np.count_nonzero(materials_per_cell > 1)
+    module_log.require(
+        num_multiple == 0, f"{num_multiple} cells were assigned more than one material."
+    )
+    num_with_material = np.count_nonzero(materials_per_cell)
+    module_log.require(
+        num_with_material == total_num_cells,
+        f"Total number of cells ({total_num_cells}) not equal to "
+        + f"number of cells with a material ({num_with_material}).",
+    )
+    return material_array
+
+
+def _add_materials(grid, h5_filename, h5_group, material_array, storage, written_datasets=None):
     """Add materials in an attribute block."""
     material_attribute = etree.SubElement(
         grid,
@@ -361,139 +696,467 @@ def _add_materials(
         Center="Cell",
         Name="MaterialID",
     )
-    total_num_cells = sum(len(cells[cell_type]) for cell_type in cells.keys())
-    material_array = np.zeros(total_num_cells, dtype=np.int64) - 1
-    mat_ctr = 0
-    # If any cell has multiple materials this is going to give index out of bounds.
-    # TODO: Add check for multiple mat cells, but no cell should have multiple materials
-    for cell_type in cells.keys():
-        for cell in cells[cell_type].keys():
-            for i, material in enumerate(material_names):
-                if cell in material_cells[i]:
-                    material_array[mat_ctr] = material_name_map[material]
-                    mat_ctr = mat_ctr + 1
-
-    module_log.require(
-        mat_ctr == total_num_cells,
-        f"Total number of cells ({total_num_cells}) not equal to "
-        + f"number of cells with a material ({mat_ctr}).",
-    )
-    module_log.require(all(material_array >= 0), "A cell was not assigned a material.")
-    datatype, precision = numpy_to_xdmf_dtype[material_array[0].dtype.name]
-    material_id_data_item = etree.SubElement(
+    _add_data_item(
         material_attribute,
-        "DataItem",
-        DataType=datatype,
-        Dimensions=str(total_num_cells),
-        Format="HDF",
-        Precision=precision,
-    )
-    h5_group.create_dataset(
+        h5_filename,
+        h5_group,
         "material_id",
-        data=material_array,
-        compression="gzip",
-        compression_opts=compression_opts,
-    )
-    material_id_data_item.text = (
-        os.path.basename(h5_filename) + ":" + h5_group.name + "/material_id"
+        material_array,
+        storage["material_id"],
+        written_datasets,
     )
 
 
-def _add_cell_sets(grid, h5_filename, h5_group, cells, cell_sets, compression_opts):
+def _make_h5_cell_row_map(mesh):
+    """Make a map from cell ID to the 0 index of the cell in the hdf5 data.
+
+    The topology is written type by type, in the order of mesh.cell_ids, so the hdf5 row of a
+    cell is its position in the concatenation of the cell ID arrays.
+
+    Returns:
+        numpy.ndarray, numpy.ndarray: The sorted cell IDs, and the hdf5 row of each.
+    """
+    cell_ids = list(mesh.cell_ids.values())
+    all_ids = np.concatenate(cell_ids) if cell_ids else np.empty(0, dtype=np.int64)
+    return _make_sorted_index(all_ids)
+
+
+def _map_to_h5_cell_rows(cell_row_map, cell_ids):
+    """Map cell IDs to hdf5 rows with a map from :func:`_make_h5_cell_row_map`.
+
+    Returns:
+        numpy.ndarray, numpy.ndarray: The hdf5 row of each cell, and whether each cell was
+        found in the mesh. The row of a cell that was not found is meaningless.
+    """
+    sorted_ids, rows = cell_row_map
+    pos, found = _search_sorted_ids(sorted_ids, cell_ids)
+    return rows[pos], found
+
+
+def _make_cell_sets(cell_row_map, cell_sets):
+    """Map the cell IDs in each cell set to the 0 index of the cells in the hdf5 data."""
+    h5_cell_sets = {}
+    for set_name, set_cells in cell_sets.items():
+        set_cells_post_map, found = _map_to_h5_cell_rows(cell_row_map, set_cells)
+        module_log.require(
+            bool(found.all()), f"Cell set '{set_name}' contains cells that are not in the mesh."
+        )
+        h5_cell_sets[set_name] = set_cells_post_map
+    return h5_cell_sets
+
+
+def _add_cell_sets(grid, h5_filename, h5_group, h5_cell_sets, storage, written_datasets=None):
     """Add cells_sets in set blocks."""
-    set_names = list(cell_sets.keys())
-    # Need to map the cell ids in cell sets to how the data appears in the h5 by mapping to
-    # a 0 index array.
-    cell_id_map = {}
-    cell_ctr = 0
-    for cell_type in cells.keys():
-        for cell_id in cells[cell_type].keys():
-            cell_id_map[cell_id] = cell_ctr
-            cell_ctr = cell_ctr + 1
-
-    for set_name in set_names:
+    for set_name, set_cells in h5_cell_sets.items():
         set_block = etree.SubElement(grid, "Set", Name=set_name, SetType="Cell")
-        set_cells = cell_sets[set_name]
-        set_cells_post_map = np.zeros(len(set_cells), dtype=np.int64)
-        for i, cell_id in enumerate(set_cells):
-            set_cells_post_map[i] = cell_id_map[cell_id]
-        datatype, precision = numpy_to_xdmf_dtype[set_cells_post_map[0].dtype.name]
-        dim = str(len(set_cells_post_map))
-        set_data_item = etree.SubElement(
+        _add_data_item(
             set_block,
-            "DataItem",
-            DataType=datatype,
-            Dimensions=dim,
-            Format="HDF",
-            Precision=precision,
-        )
-        h5_group.create_dataset(
+            h5_filename,
+            h5_group,
             set_name,
-            data=set_cells_post_map,
-            compression="gzip",
-            compression_opts=compression_opts,
+            set_cells,
+            storage["sets"],
+            written_datasets,
         )
-        set_data_item.text = os.path.basename(h5_filename) + ":" + h5_group.name + "/" + set_name
 
 
 def _add_gridmesh_levels(
-    xml_mesh_list, h5_filename, h5_group, material_name_map, compression_opts=4
+    xml_mesh_list,
+    h5_filename,
+    h5_group,
+    material_name_map,
+    storage,
+    processes=None,
+    deduplicate=False,
 ):
-    child_list = []
-    for parent_xml_tree, mesh in xml_mesh_list:
-        # If it has children, write the tree and add children to child list
-        if mesh.children is not None:
-            mesh_xml_tree = etree.SubElement(
-                parent_xml_tree, "Grid", Name=mesh.name, GridType="Tree"
+    """Add the grids of each level of the GridMesh to the xml and write the leaf data.
+
+    The tree grids are added level by level. The arrays of the leaf grids are then computed,
+    in worker processes if requested, and written to the h5 file in order by this process.
+    """
+    leaf_list = []
+    while xml_mesh_list:
+        child_list = []
+        for parent_xml_tree, mesh in xml_mesh_list:
+            # If it has children, write the tree and add children to child list
+            if mesh.children is not None:
+                mesh_xml_tree = etree.SubElement(
+                    parent_xml_tree, "Grid", Name=mesh.name, GridType="Tree"
+                )
+                for child_mesh in mesh.children:
+                    child_list.append((mesh_xml_tree, child_mesh))
+            else:
+                # If there are not children, this must be the bottom level.
+                # Add the empty grid now, so the grids stay in order.
+                leaf_list.append((etree.SubElement(parent_xml_tree, "Grid"), mesh))
+        xml_mesh_list = child_list
+
+    if processes is None:
+        leaf_data = (
+            _prepare_uniform_grid(mesh, material_name_map, deduplicate) for _, mesh in leaf_list
+        )
+        _write_leaf_grids(leaf_list, leaf_data, h5_filename, h5_group, storage, deduplicate)
+    else:
+        module_log.info(f"Preparing {len(leaf_list)} leaf grids with {processes} processes")
+        chunksize = max(1, len(leaf_list) // (4 * processes))
+        with ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker) as executor:
+            # Only the arrays of each leaf are sent, since a leaf references the whole tree.
+            leaf_data = executor.map(
+                _prepare_leaf_grid,
+                [mesh.vertex_ids for _, mesh in leaf_list],
+                [mesh.vertex_coords for _, mesh in leaf_list],
+                [mesh.cell_ids for _, mesh in leaf_list],
+                [mesh.cell_connectivity for _, mesh in leaf_list],
+                [mesh.cell_sets for _, mesh in leaf_list],
+                [material_name_map] * len(leaf_list),
+                [deduplicate] * len(leaf_list),
+                chunksize=chunksize,
             )
-            for child_mesh in mesh.children:
-                child_list.append((mesh_xml_tree, child_mesh))
-        else:
-            # If there are not children, this must be the bottom level. Write the data
-            _add_uniform_grid(
-                mesh.name,
-                parent_xml_tree,
-                h5_filename,
-                h5_group,
-                mesh.vertices,
-                mesh.cells,
-                mesh.cell_sets,
-                material_name_map,
-                compression_opts,
+            _write_leaf_grids(leaf_list, leaf_data, h5_filename, h5_group, storage, deduplicate)
+
+
+def _write_leaf_grids(leaf_list, leaf_data, h5_filename, h5_group, storage, deduplicate):
+    """Write the leaf grid data into the empty leaf grid elements as it becomes available.
+
+    If deduplicate is True, the leaf data must be computed in canonical order. Data that was
+    already written for another leaf is stored as a hard link, and each leaf that is the same
+    as an earlier leaf up to a translation is given the h5 group attributes 'instance', the name
+    of the earlier leaf, and 'offset', the translation from the earlier leaf to this leaf.
+    """
+    written_datasets = {} if deduplicate else None
+    instances = {}
+    for (grid, mesh), grid_data in zip(leaf_list, leaf_data):
+        _write_uniform_grid(
+            mesh.name,
+            grid,
+            h5_filename,
+            h5_group,
+            grid_data,
+            storage,
+            written_datasets,
+        )
+        if deduplicate:
+            instance = _find_instance(instances, mesh.name, grid_data)
+            if instance is not None:
+                instance_name, offset = instance
+                h5_group[mesh.name].attrs["instance"] = instance_name
+                h5_group[mesh.name].attrs["offset"] = offset
+
+
+def _find_instance(instances, name, grid_data):
+    """Find an earlier leaf that is the same as this leaf up to a translation.
+
+    Leaves are the same if their topology, cell sets, and materials are the same, and
+    their vertices are the same relative to the minimum corner of their bounding box.
+    If there is no such leaf, this leaf is added to instances.
+
+    Returns:
+        tuple or None: The name of the earlier leaf and the offset of this leaf from it.
+    """
+    vertex_coords = grid_data["vertices"]
+    if len(vertex_coords) == 0:
+        return None
+    key = (
+        _get_data_key(grid_data["topology"][3]),
+        tuple(_get_data_key(cells) for cells in grid_data["cell_sets"].values()),
+        None if grid_data["material_id"] is None else _get_data_key(grid_data["material_id"]),
+        vertex_coords.shape,
+    )
+    origin = vertex_coords.min(axis=0)
+    relative_coords = vertex_coords - origin
+    tolerance = 1e-10 * max(1.0, float(np.abs(vertex_coords).max()))
+    for instance_name, instance_origin, instance_coords in instances.get(key, []):
+        if np.allclose(relative_coords, instance_coords, rtol=0, atol=tolerance):
+            return instance_name, origin - instance_origin
+    instances.setdefault(key, []).append((name, origin, relative_coords))
+    return None
+
+
+def _handle_split_level(
+    filename, mesh, split_level, material_name_map, storage, processes, deduplicate
+):
+    """Write each mesh at the split level to its own file.
+
+    Returns:
+        list of tuple: The (xdmf, h5) file names of each file that was written.
+    """
+    split_files = _get_split_files(filename, mesh, split_level)
+    if processes is None or len(split_files) == 1:
+        for split_filename, split_mesh in split_files:
+            write_xdmf_file(
+                split_filename,
+                split_mesh,
+                material_name_map=material_name_map,
+                storage=storage,
+                processes=processes,
+                deduplicate=deduplicate,
+            )
+    else:
+        module_log.info(f"Writing {len(split_files)} XDMF files with {processes} processes")
+        with ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker) as executor:
+            # Wait for every file and raise any error from the workers.
+            list(
+                executor.map(
+                    _write_split_file,
+                    [split_filename for split_filename, _ in split_files],
+                    [_gridmesh_to_arrays(split_mesh) for _, split_mesh in split_files],
+                    [material_name_map] * len(split_files),
+                    [storage] * len(split_files),
+                    [deduplicate] * len(split_files),
+                )
             )
 
-    if child_list:
-        _add_gridmesh_levels(child_list, h5_filename, h5_group, material_name_map, compression_opts)
+    return [
+        (split_filename, os.path.splitext(split_filename)[0] + ".h5")
+        for split_filename, _ in split_files
+    ]
 
 
-def _handle_split_level(filename, mesh, split_level, material_name_map, compression_opts):
+def _get_split_files(filename, mesh, split_level):
+    """Get the file name and mesh of each file to write for the split level."""
     # Check that the level is appropriate
     module_log.require(split_level >= 0, "split_level must be greater than or equal to 0.")
-    # If level is 0, write
+    # If level is 0, write this mesh
     if split_level == 0:
-        write_xdmf_file(
-            filename,
-            mesh,
-            split_level=None,
-            material_name_map=material_name_map,
-            compression_opts=compression_opts,
+        return [(filename, mesh)]
+
+    # Otherwise go to the next level
+    next_mesh = mesh
+    for _i in range(split_level):
+        module_log.require(
+            getattr(next_mesh, "children", None) is not None,
+            "split_level is too high. Not enough grid levels in mesh.",
         )
+        next_mesh = next_mesh.children[0]
+    split_files = []
+    for child in mesh.children:
+        new_filename = os.path.splitext(filename)[0] + "_" + child.name + ".xdmf"
+        split_files.extend(_get_split_files(new_filename, child, split_level - 1))
+    return split_files
+
+
+def _write_split_file(filename, mesh_arrays, material_name_map, storage, deduplicate):
+    """Write a mesh from :func:`_gridmesh_to_arrays` to a file. Used by worker processes."""
+    write_xdmf_file(
+        filename,
+        _gridmesh_from_arrays(mesh_arrays),
+        material_name_map=material_name_map,
+        storage=storage,
+        deduplicate=deduplicate,
+    )
+
+
+def _gridmesh_to_arrays(mesh):
+    """Convert a mesh and its children to nested dictionaries of arrays.
+
+    Unlike the mesh, the result does not reference the parent of the mesh, so only the data
+    of this part of the hierarchy is sent to a worker process.
+    """
+    if getattr(mesh, "children", None) is not None:
+        return {
+            "name": mesh.name,
+            "children": [_gridmesh_to_arrays(child) for child in mesh.children],
+        }
+    return {
+        "name": mesh.name,
+        "type": type(mesh),
+        "arrays": (
+            mesh.vertex_ids,
+            mesh.vertex_coords,
+            mesh.cell_ids,
+            mesh.cell_connectivity,
+            mesh.cell_sets,
+        ),
+    }
+
+
+def _gridmesh_from_arrays(mesh_arrays):
+    """Convert nested dictionaries of arrays from :func:`_gridmesh_to_arrays` to a mesh."""
+    if "children" in mesh_arrays:
+        children = [_gridmesh_from_arrays(child) for child in mesh_arrays["children"]]
+        return GridMesh(children=children, name=mesh_arrays["name"])
+    return mesh_arrays["type"].from_arrays(*mesh_arrays["arrays"], name=mesh_arrays["name"])
+
+
+def read_xdmf_file(filename, grid_name=None):
+    """Read an XDMF file written by :func:`mocmg.mesh.write_xdmf_file` into a mesh object.
+
+    A uniform grid is read as a :class:`mocmg.mesh.Mesh`. A tree of grids is read as a
+    :class:`mocmg.mesh.GridMesh` hierarchy. Cell sets are read from the 'Set' blocks, and the
+    material cell sets are recreated from the 'MaterialID' attribute and the 'MaterialNames'
+    information.
+
+    Since the XDMF file stores vertices and cells by their position in the HDF5 data, the
+    vertex and cell IDs are numbered from 1 in the order they appear in the file. The numbering
+    continues from one uniform grid to the next, so IDs are unique across a tree of grids.
+
+    Args:
+        filename (str) : File name of the form 'name.xdmf'.
+
+        grid_name (str, optional) : Only read the grid with this name and the grids below it.
+            HDF5 data that belongs to other grids is not read.
+
+    Returns:
+        mocmg.mesh.Mesh : The mesh.
+    """
+    module_log.info(f"Reading mesh data from XDMF file '{filename}'.")
+    domain = etree.parse(filename).getroot().find("Domain")
+    module_log.require(domain is not None, "No Domain in XDMF file.")
 
-    # Otherwise call next level
+    material_names = []
+    material_information = domain.find("Information[@Name='MaterialNames']")
+    if material_information is not None and material_information.text:
+        material_names = material_information.text.split()
+
+    if grid_name is None:
+        grid = domain.find("Grid")
+        module_log.require(grid is not None, "No Grid in XDMF file.")
     else:
-        next_mesh = mesh
-        for _i in range(split_level):
-            module_log.require(
-                next_mesh.children is not None,
-                "split_level is too high. Not enough grid levels in mesh.",
-            )
-            next_mesh = next_mesh.children[0]
-        for child in mesh.children:
-            new_filename = os.path.splitext(filename)[0] + "_" + child.name + ".xdmf"
-            write_xdmf_file(
-                new_filename,
-                child,
-                split_level=split_level - 1,
-                material_name_map=material_name_map,
-                compression_opts=compression_opts,
-            )
+        grids = domain.xpath(".//Grid[@Name=$name]", name=grid_name)
+        module_log.require(len(grids) > 0, f"No grid named '{grid_name}'.")
+        grid = grids[0]
+
+    h5_files = {}
+    try:
+        mesh = _read_grid(
+            grid,
+            os.path.dirname(filename),
+            h5_files,
+            material_names,
+            in_tree=_is_in_tree(grid),
+            id_offsets=[0, 0],
+        )
+    finally:
+        for h5_file in h5_files.values():
+            h5_file.close()
+
+    return mesh
+
+
+def _is_in_tree(grid):
+    """Check if a grid is, or belongs to, a tree of grids."""
+    return grid.get("GridType") == "Tree" or grid.getparent().tag == "Grid"
+
+
+def _read_grid(grid, xdmf_dir, h5_files, material_names, in_tree, id_offsets):
+    """Read a grid element and the grids below it.
+
+    id_offsets is the number of vertices and cells in the uniform grids read before this one. It
+    is updated as grids are read.
+    """
+    name = grid.get("Name", "")
+    if grid.get("GridType") == "Tree":
+        children = [
+            _read_grid(child, xdmf_dir, h5_files, material_names, in_tree, id_offsets)
+            for child in grid.findall("Grid")
+        ]
+        return GridMesh(children=children, name=name)
+
+    module_log.require(
+        grid.get("GridType") == "Uniform", f"Unsupported GridType '{grid.get('GridType')}'."
+    )
+    geometry = grid.find("Geometry")
+    vertex_coords = _read_data_item(geometry.find("DataItem"), xdmf_dir, h5_files)
+    if geometry.get("GeometryType") == "XY":
+        vertex_coords = np.column_stack([vertex_coords, np.zeros(len(vertex_coords))])
+    vertex_ids = np.arange(1, len(vertex_coords) + 1) + id_offsets[0]
+
+    topology = grid.find("Topology")
+    topo_data = _read_data_item(topology.find("DataItem"), xdmf_dir, h5_files).astype(np.int64)
+    if topology.get("TopologyType") == "Mixed":
+        cell_rows, cell_connectivity = _split_mixed_topology(topo_data)
+    else:
+        topo_type = xdmf_to_topo_type[topology.get("TopologyType")]
+        cell_rows = {topo_type: np.arange(len(topo_data))}
+        cell_connectivity = {topo_type: topo_data}
+    # Convert the 0 index hdf5 data to IDs
+    cell_ids = {k: rows + 1 + id_offsets[1] for k, rows in cell_rows.items()}
+    cell_connectivity = {k: conn + 1 + id_offsets[0] for k, conn in cell_connectivity.items()}
+
+    cell_sets = {}
+    for set_block in grid.findall("Set"):
+        if set_block.get("SetType") == "Cell":
+            set_rows = _read_data_item(set_block.find("DataItem"), xdmf_dir, h5_files)
+            cell_sets[set_block.get("Name")] = set_rows.astype(np.int64) + 1 + id_offsets[1]
+    material_attribute = grid.find("Attribute[@Name='MaterialID']")
+    if material_attribute is not None:
+        material_ids = _read_data_item(material_attribute.find("DataItem"), xdmf_dir, h5_files)
+        material_ids = material_ids.astype(np.int64)
+        cell_sets.update(
+            _material_ids_to_cell_sets(material_ids, material_names, 1 + id_offsets[1])
+        )
+
+    id_offsets[0] += len(vertex_ids)
+    id_offsets[1] += sum(len(rows) for rows in cell_rows.values())
+    mesh_type = GridMesh if in_tree else Mesh
+    return mesh_type.from_arrays(
+        vertex_ids, vertex_coords, cell_ids, cell_connectivity, cell_sets, name=name
+    )
+
+
+def _read_data_item(data_item, xdmf_dir, h5_files):
+    """Read the HDF5 dataset referenced by a data item."""
+    module_log.require(
+        data_item.get("Format") == "HDF", "Only HDF data items are supported in XDMF files."
+    )
+    h5_filename, h5_path = data_item.text.strip().split(":/", 1)
+    h5_filename = os.path.join(xdmf_dir, h5_filename)
+    if h5_filename not in h5_files:
+        h5_files[h5_filename] = h5py.File(h5_filename, "r")
+    return h5_files[h5_filename]["/" + h5_path][()]
+
+
+def _split_mixed_topology(topo_data):
+    """Split mixed topology data into the cells of each type.
+
+    Mixed topology data is a sequence of cells, each given by its XDMF type number followed by
+    its vertices. Consecutive cells of the same type are split off together in one operation.
+
+    Returns:
+        dict, dict: The 0 index row of each cell in the topology, and the cell vertices,
+        for each cell type.
+    """
+    rows = {}
+    connectivity = {}
+    pos = 0
+    row = 0
+    while pos < len(topo_data):
+        xdmf_int = int(topo_data[pos])
+        module_log.require(
+            xdmf_int in xdmf_int_to_topo_type, f"Unsupported XDMF cell type {xdmf_int}."
+        )
+        topo_type = xdmf_int_to_topo_type[xdmf_int]
+        stride = topo_type_num_vertices[topo_type] + 1
+        # The run of cells of this type ends at the first cell start with a different type.
+        not_this_type = np.flatnonzero(topo_data[pos::stride] != xdmf_int)
+        if len(not_this_type) > 0:
+            num_cells = int(not_this_type[0])
+        else:
+            num_cells = len(topo_data[pos::stride])
+        module_log.require(
+            pos + num_cells * stride <= len(topo_data), "Incomplete mixed topology data."
+        )
+        cells = topo_data[pos : pos + num_cells * stride].reshape(num_cells, stride)[:, 1:]
+        cell_rows = np.arange(row, row + num_cells)
+        if topo_type in rows:
+            rows[topo_type] = np.concatenate([rows[topo_type], cell_rows])
+            connectivity[topo_type] = np.concatenate([connectivity[topo_type], cells])
+        else:
+            rows[topo_type] = cell_rows
+            connectivity[topo_type] = cells
+        pos = pos + num_cells * stride
+        row = row + num_cells
+
+    return rows, connectivity
+
+
+def _material_ids_to_cell_sets(material_ids, material_names, first_id=1):
+    """Convert per cell material IDs to material cell sets, with cell IDs from first_id."""
+    module_log.require(
+        len(material_ids) == 0 or int(material_ids.max()) < len(material_names),
+        "MaterialID is larger than the number of MaterialNames.",
+    )
+    order = np.argsort(material_ids, kind="stable")
+    counts = np.bincount(material_ids, minlength=len(material_names))
+    material_cells = np.split(order + first_id, np.cumsum(counts)[:-1])
+    return {material_names[i]: cells for i, cells in enumerate(material_cells) if len(cells) > 0}
@@ -4,13 +4,14 @@ import os
 import sys
 from unittest import TestCase
 
+import h5py
 import numpy as np
 
 import mocmg
 import mocmg.mesh
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from testing_utils import captured_output
+from testing_utils import captured_output, start_method
 
 
 class TestAbaqusIO(TestCase):
@@ -547,3 +548,208 @@ class TestAbaqusIO(TestCase):
                 self.assertEqual(cells["triangle"][i][j], cells_ref["triangle"][i][j])
         # cell_sets
         self.assertEqual(cell_sets, {})
+
+    def test_line_formats(self):
+        """Test reading CRLF line endings, comment lines, and continued element lines."""
+        filepath = "line_formats_test.inp"
+        text = "\r\n".join(
+            [
+                "** Comment before the nodes",
+                "*NODE",
+                "1, 0.0, 0.0, 0.0",
+                "** Comment inside a block",
+                "2, 1.0, 0.0, 0.0",
+                "3, 0.0, 1.0, 0.0",
+                "",
+                "4, 1.0, 1.0, 0.0",
+                "**NODE",
+                "** ELEMENT, TYPE=CPS3",
+                "*ELEMENT, type=CPS3",
+                "1, 1,",
+                "  2, 3",
+                "2, 2, 4, 3",
+                "*ELSET,ELSET=SET1",
+                "1, 2,",
+                "** Last comment",
+            ]
+        )
+        with open(filepath, "w", newline="") as f:
+            f.write(text)
+        mocmg.initialize()
+        mesh = mocmg.mesh.read_abaqus_file(filepath)
+        os.remove(filepath)
+        self.assertEqual(mesh.vertex_ids.tolist(), [1, 2, 3, 4])
+        self.assertEqual(
+            mesh.vertex_coords.tolist(),
+            [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [1.0, 1.0, 0.0]],
+        )
+        self.assertEqual(list(mesh.cell_ids.keys()), ["triangle"])
+        self.assertEqual(mesh.cell_ids["triangle"].tolist(), [1, 2])
+        self.assertEqual(mesh.cell_connectivity["triangle"].tolist(), [[1, 2, 3], [2, 4, 3]])
+        self.assertEqual(list(mesh.cell_sets.keys()), ["SET1"])
+        self.assertEqual(mesh.cell_sets["SET1"].tolist(), [1, 2])
+
+    def test_empty_element_block(self):
+        """Test that element blocks without data lines are skipped."""
+        filepath = "empty_block_test.inp"
+        lines = [
+            "*NODE",
+            "1, 0.0, 0.0, 0.0",
+            "2, 1.0, 0.0, 0.0",
+            "3, 0.0, 1.0, 0.0",
+            "*ELEMENT, type=T3D2, ELSET=Line1",
+            "*ELEMENT, type=CPS3, ELSET=Surface1",
+            "*ELEMENT, type=CPS3, ELSET=Surface1",
+            "1, 1, 2, 3",
+            "*ELSET,ELSET=SET1",
+        ]
+        with open(filepath, "w") as f:
+            f.write("\n".join(lines))
+        mocmg.initialize()
+        mesh = mocmg.mesh.read_abaqus_file(filepath)
+        os.remove(filepath)
+        self.assertEqual(mesh.vertex_ids.tolist(), [1, 2, 3])
+        self.assertEqual(list(mesh.cell_ids.keys()), ["triangle"])
+        self.assertEqual(mesh.cell_ids["triangle"].tolist(), [1])
+        self.assertEqual(mesh.cell_connectivity["triangle"].tolist(), [[1, 2, 3]])
+        self.assertEqual(list(mesh.cell_sets.keys()), ["SET1"])
+        self.assertEqual(mesh.cell_sets["SET1"].tolist(), [])
+
+    def test_malformed_line(self):
+        """Test reading files with a data line that cannot be parsed."""
+        filepath = "malformed_test.inp"
+        for lines, message in [
+            (
+                ["*NODE", "1, 0.0, 0.0, 0.0", "2, 1.0, x, 0.0", "3, 0.0, 1.0, 0.0"],
+                "Could not read *NODE block. Invalid value in data line.",
+            ),
+            (
+                ["*NODE", "1, 0.0, 0.0, 0.0", "2, 1.0, 0.0", "3, 0.0, 1.0, 0.0, 0.0"],
+                "Could not read *NODE block. Inconsistent line length.",
+            ),
+            (
+                ["*ELSET,ELSET=SET1", "1, 2,, 3"],
+                "Could not read *ELSET block. Invalid value in data line.",
+            ),
+            (
+                ["*NODE", "1, 0.0, 0.0, 0.0", "*ELEMENT, type=CPS3", "1, 1, 2.5, 3"],
+                "Could not read *ELEMENT block. Invalid value in data line.",
+            ),
+            (
+                ["*ELSET,ELSET=SET1", "1, 2e0, 3"],
+                "Could not read *ELSET block. Invalid value in data line.",
+            ),
+        ]:
+            with open(filepath, "w") as f:
+                f.write("\n".join(lines))
+            with self.assertRaises(SystemExit):
+                with captured_output() as (out, err):
+                    mocmg.initialize()
+                    mocmg.mesh.read_abaqus_file(filepath)
+            os.remove(filepath)
+            self.assertEqual(
+                err.getvalue().splitlines()[0].split(None, 1)[1],
+                f"ERROR     : mocmg.mesh.abaqus_IO - {message}",
+            )
+
+    def test_processes(self):
+        """Test that reading with worker processes gives the same mesh as reading serially."""
+        mocmg.initialize()
+        filepath = "tests/mesh/abaqus_files/disks_mixed.inp"
+        mesh_ref = mocmg.mesh.read_abaqus_file(filepath)
+        for method in ["fork", "spawn"]:
+            with start_method(method):
+                mesh = mocmg.mesh.read_abaqus_file(filepath, processes=2)
+            self.assertTrue(np.array_equal(mesh.vertex_ids, mesh_ref.vertex_ids))
+            self.assertTrue(np.array_equal(mesh.vertex_coords, mesh_ref.vertex_coords))
+            self.assertEqual(list(mesh.cell_ids.keys()), list(mesh_ref.cell_ids.keys()))
+            for cell_type in mesh_ref.cell_ids:
+                self.assertTrue(
+                    np.array_equal(mesh.cell_ids[cell_type], mesh_ref.cell_ids[cell_type])
+                )
+                self.assertTrue(
+                    np.array_equal(
+                        mesh.cell_connectivity[cell_type], mesh_ref.cell_connectivity[cell_type]
+                    )
+                )
+            self.assertEqual(list(mesh.cell_sets.keys()), list(mesh_ref.cell_sets.keys()))
+            for set_name in mesh_ref.cell_sets:
+                self.assertTrue(
+                    np.array_equal(mesh.cell_sets[set_name], mesh_ref.cell_sets[set_name])
+                )
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.read_abaqus_file(filepath, processes=0)
+
+    def test_cache(self):
+        """Test reading an abaqus file through the binary sidecar cache."""
+        filepath = "disks_mixed_cache_test.inp"
+        cache_filepath = filepath + ".cache.h5"
+        with open("tests/mesh/abaqus_files/disks_mixed.inp") as f:
+            text = f.read()
+        with open(filepath, "w") as f:
+            f.write(text)
+        mocmg.initialize()
+        mesh_ref = mocmg.mesh.read_abaqus_file(filepath)
+        self.assertFalse(os.path.isfile(cache_filepath))
+        messages = []
+        for _i in range(5):
+            with captured_output() as (out, err):
+                mocmg.initialize()
+                mesh = mocmg.mesh.read_abaqus_file(filepath, cache=True)
+            messages.append([line.split(None, 1)[1] for line in out.getvalue().splitlines()])
+            self.assertTrue(np.array_equal(mesh.vertex_ids, mesh_ref.vertex_ids))
+            self.assertTrue(np.array_equal(mesh.vertex_coords, mesh_ref.vertex_coords))
+            self.assertEqual(list(mesh.cell_ids.keys()), list(mesh_ref.cell_ids.keys()))
+            for cell_type in mesh_ref.cell_ids:
+                self.assertTrue(
+                    np.array_equal(mesh.cell_ids[cell_type], mesh_ref.cell_ids[cell_type])
+                )
+                self.assertTrue(
+                    np.array_equal(
+                        mesh.cell_connectivity[cell_type], mesh_ref.cell_connectivity[cell_type]
+                    )
+                )
+            self.assertEqual(list(mesh.cell_sets.keys()), list(mesh_ref.cell_sets.keys()))
+            for set_name in mesh_ref.cell_sets:
+                self.assertTrue(
+                    np.array_equal(mesh.cell_sets[set_name], mesh_ref.cell_sets[set_name])
+                )
+            del mesh
+            if _i == 1:
+                # Same content, new modification time
+                stat = os.stat(filepath)
+                os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            if _i == 2:
+                # The new modification time is stored in the cache
+                with h5py.File(cache_filepath, "r") as f:
+                    self.assertEqual(f.attrs["mtime_ns"], os.stat(filepath).st_mtime_ns)
+                # Changed content, same size
+                with open(filepath, "w") as f:
+                    f.write(text.replace("Material_Uranium", "Material_Uranimu"))
+                stat = os.stat(filepath)
+                os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+                mesh_ref.cell_sets["MATERIAL_URANIMU"] = mesh_ref.cell_sets.pop("MATERIAL_URANIUM")
+                mesh_ref.cell_sets = {
+                    k: mesh_ref.cell_sets[k] for k in ["MATERIAL_URANIMU", "DISK2", "DISK1"]
+                }
+            if _i == 3:
+                # Changed content, same size and modification time, e.g. copied with "cp -p"
+                stat = os.stat(filepath)
+                with open(filepath, "w") as f:
+                    f.write(text)
+                os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                mesh_ref.cell_sets["MATERIAL_URANIUM"] = mesh_ref.cell_sets.pop("MATERIAL_URANIMU")
+                mesh_ref.cell_sets = {
+                    k: mesh_ref.cell_sets[k] for k in ["MATERIAL_URANIUM", "DISK2", "DISK1"]
+                }
+
+        parse_ref = [
+            f"INFO      : mocmg.mesh.abaqus_IO - Reading mesh data from {filepath}",
+            f"INFO      : mocmg.mesh.abaqus_IO - Writing cached mesh data to {cache_filepath}",
+        ]
+        cached_ref = [
+            f"INFO      : mocmg.mesh.abaqus_IO - Reading cached mesh data from {cache_filepath}"
+        ]
+        self.assertEqual(messages, [parse_ref, cached_ref, cached_ref, parse_ref, parse_ref])
+        os.remove(filepath)
+        os.remove(cache_filepath)
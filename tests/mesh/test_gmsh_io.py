@@ -0,0 +1,69 @@
+"""Test reading meshes directly from gmsh."""
+import os
+import sys
+from unittest import TestCase
+
+import gmsh
+import numpy as np
+
+import mocmg
+import mocmg.mesh
+import mocmg.model
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from testing_utils import captured_output
+
+
+class TestGmshIO(TestCase):
+    """Test the gmsh IO functions."""
+
+    def test_read_gmsh_model(self):
+        """Test that reading the gmsh model matches the Abaqus file round trip."""
+        filename = "read_gmsh_model.inp"
+        mocmg.initialize()
+        gmsh.initialize()
+        gmsh.model.occ.addDisk(1.0, 1.0, 0.0, 0.5, 0.5)
+        gmsh.model.occ.addDisk(3.0, 1.0, 0.0, 0.5, 0.5)
+        gmsh.model.occ.synchronize()
+        p = gmsh.model.addPhysicalGroup(2, [1, 2])
+        gmsh.model.setPhysicalName(2, p, "Material_UO2")
+        mocmg.model.overlay_rectangular_grid([0.0, 0.0, 0.0, 4.0, 2.0, 0.0], nx=[2], ny=[1])
+        gmsh.model.mesh.setSize(gmsh.model.getEntities(0), 0.5)
+        gmsh.option.setNumber("Mesh.ElementOrder", 2)
+        gmsh.model.mesh.generate(2)
+        gmsh.write(filename)
+
+        with captured_output() as (out, err):
+            mocmg.initialize()
+            mesh = mocmg.mesh.read_gmsh_model(name="two_pins")
+        out = [line.split(None, 1)[1] for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            out, ["INFO      : mocmg.mesh.gmsh_IO - Reading mesh data from the gmsh model"]
+        )
+        self.assertEqual(err.getvalue(), "")
+        gmsh.clear()
+        gmsh.finalize()
+
+        mesh_ref = mocmg.mesh.read_abaqus_file(filename)
+        os.remove(filename)
+        self.assertEqual(mesh.name, "two_pins")
+        # vertices
+        rows = mesh.get_vertex_rows(mesh_ref.vertex_ids)
+        self.assertTrue(np.array_equal(mesh.vertex_coords[rows], mesh_ref.vertex_coords))
+        # cells
+        self.assertEqual(list(mesh.cell_ids.keys()), list(mesh_ref.cell_ids.keys()))
+        for cell_type in mesh_ref.cell_ids:
+            rows = mesh.get_cell_rows(cell_type, mesh_ref.cell_ids[cell_type])
+            self.assertTrue(
+                np.array_equal(
+                    mesh.cell_connectivity[cell_type][rows], mesh_ref.cell_connectivity[cell_type]
+                )
+            )
+        # cell_sets
+        self.assertEqual(sorted(mesh.cell_sets.keys()), sorted(mesh_ref.cell_sets.keys()))
+        for set_name in mesh_ref.cell_sets:
+            self.assertTrue(
+                np.array_equal(
+                    np.sort(mesh.cell_sets[set_name]), np.sort(mesh_ref.cell_sets[set_name])
+                )
+            )
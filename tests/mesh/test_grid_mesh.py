@@ -9,8 +9,10 @@ from mesh_data import (
     linear_triangle_cell_sets,
     linear_triangle_cells,
     linear_triangle_vertices,
+    pin_1_cell_sets,
     pin_1_cells,
     pin_1_vertices,
+    pin_2_cell_sets,
     pin_2_cells,
     pin_2_vertices,
     quadratic_quadrilateral_cell_sets,
@@ -200,3 +202,70 @@ class TestGridMesh(TestCase):
             name = mesh.name
             self.assertEqual(name, ref_names[i])
             self.assertEqual("both_pins", mesh.parent.name)
+
+    def test_from_mesh_rows(self):
+        """Test a grid mesh that is a view of part of another mesh."""
+        mocmg.initialize()
+        mesh = mocmg.mesh.Mesh(two_disks_tri6_quad8_vertices, two_disks_tri6_quad8_cells)
+        vertex_rows = mesh.get_vertex_rows([5, 31, 4, 32, 33, 11])
+        cell_rows = {"triangle6": mesh.get_cell_rows("triangle6", [1])}
+        view = mocmg.mesh.GridMesh.from_mesh_rows(
+            mesh, vertex_rows, cell_rows, {"DISK": np.array([1])}, name="view"
+        )
+        self.assertEqual(view.name, "view")
+        self.assertEqual(view.vertex_ids.tolist(), [5, 31, 4, 32, 33, 11])
+        self.assertTrue(np.array_equal(view.vertex_coords, mesh.vertex_coords[vertex_rows]))
+        self.assertEqual(list(view.cells.keys()), ["triangle6"])
+        self.assertEqual(view.cells["triangle6"][1].tolist(), [5, 31, 4, 32, 33, 11])
+        self.assertAlmostEqual(view.get_set_area("DISK"), mesh.get_cell_area(1), 6)
+        # The view is not a copy of the mesh data
+        self.assertIsNone(view._vertex_coords)
+        self.assertIsNone(view._cell_connectivity)
+        # Replacing the data makes the grid mesh independent of the other mesh
+        view.compact_arrays()
+        self.assertIsNone(view._vertex_rows)
+        self.assertIsNone(view._cell_rows)
+        self.assertEqual(view.vertex_ids.tolist(), [5, 31, 4, 32, 33, 11])
+        self.assertEqual(view.cells["triangle6"][1].tolist(), [5, 31, 4, 32, 33, 11])
+
+    def test_queries_with_children(self):
+        """Test the queries of a grid mesh with children."""
+        mocmg.initialize()
+        mesh1 = mocmg.mesh.GridMesh(pin_1_vertices, pin_1_cells, pin_1_cell_sets, name="pin1")
+        mesh2 = mocmg.mesh.GridMesh(pin_2_vertices, pin_2_cells, pin_2_cell_sets, name="pin2")
+        both_pins_mesh = mocmg.mesh.GridMesh(children=[mesh1, mesh2], name="both_pins")
+        root = mocmg.mesh.GridMesh(children=[both_pins_mesh], name="root")
+        # n_cells
+        self.assertEqual(root.n_cells(), mesh1.n_cells() + mesh2.n_cells())
+        # get_cells
+        water_cells = np.concatenate(
+            [pin_1_cell_sets["MATERIAL_WATER"], pin_2_cell_sets["MATERIAL_WATER"]]
+        )
+        self.assertTrue(np.array_equal(root.get_cells("MATERIAL_WATER"), water_cells))
+        self.assertTrue(
+            np.array_equal(root.get_cells("MATERIAL_UO2"), pin_1_cell_sets["MATERIAL_UO2"])
+        )
+        with self.assertRaises(SystemExit):
+            root.get_cells("BAD NAME")
+        # get_set_area
+        water_area = mesh1.get_set_area("MATERIAL_WATER") + mesh2.get_set_area("MATERIAL_WATER")
+        self.assertAlmostEqual(root.get_set_area("MATERIAL_WATER"), water_area, 6)
+        self.assertAlmostEqual(
+            root.get_set_area("MATERIAL_MOX"), mesh2.get_set_area("MATERIAL_MOX"), 6
+        )
+        with self.assertRaises(SystemExit):
+            root.get_set_area("BAD NAME")
+        # get_bounding_box
+        coords = np.concatenate([mesh1.vertex_coords, mesh2.vertex_coords])
+        bounding_box = root.get_bounding_box()
+        self.assertTrue(np.array_equal(bounding_box[0], coords.min(axis=0)))
+        self.assertTrue(np.array_equal(bounding_box[1], coords.max(axis=0)))
+        # Mesh methods that need vertices and cells are not supported with children
+        with self.assertRaises(SystemExit):
+            root.compact_arrays()
+        with self.assertRaises(SystemExit):
+            both_pins_mesh.get_cell_areas()
+        self.assertEqual(list(mesh1.get_cell_areas()), list(mesh1.cell_ids))
+        # Replacing the data of a child clears the summaries of its parents
+        mesh2.vertices = {k: v + np.array([1.0, 0.0, 0.0]) for k, v in pin_2_vertices.items()}
+        self.assertEqual(root.get_bounding_box()[1][0], bounding_box[1][0] + 1.0)
@@ -1,7 +1,10 @@
 """Test the make_gridmesh function."""
+import os
+import sys
 from copy import deepcopy
 from unittest import TestCase
 
+import numpy as np
 from mesh_data import (
     pin_1_cell_sets,
     pin_1_cells,
@@ -28,6 +31,9 @@ from mesh_data import (
 import mocmg
 import mocmg.mesh
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from testing_utils import start_method
+
 
 class TestMakeGridMesh(TestCase):
     """Test the make_gridmesh function."""
@@ -248,6 +254,10 @@ class TestMakeGridMesh(TestCase):
         level3_1_1, level3_2_1, level3_1_2, level3_2_2 = level2_1_1.children
         self.assertEqual(level3_1_1.name, "GRID_L3_1_1")
         self.assertEqual(level3_2_1.name, "GRID_L3_2_1")
+        # The hierarchy is built by reference
+        self.assertIs(level3_1_1.parent, level2_1_1)
+        self.assertIs(level2_1_1.parent, level1)
+        self.assertIs(level1.parent, grid_mesh)
         self.assertEqual(level3_1_2.name, "GRID_L3_1_2")
         self.assertEqual(level3_2_2.name, "GRID_L3_2_2")
         level3_3_1, level3_4_1, level3_3_2, level3_4_2 = level2_2_1.children
@@ -427,3 +437,124 @@ class TestMakeGridMesh(TestCase):
                 self.assertEqual(
                     level1_2_1.cell_sets[set_name][cell], pin_2_cell_sets[set_name][cell]
                 )
+
+    def test_make_gridmesh_grid_not_contained_in_parent(self):
+        """Test that a grid spanning two parent grids is an error."""
+        mocmg.initialize()
+        cell_sets = deepcopy(pin_1and2_cell_sets)
+        cell_sets["GRID_L1_2_1"] = cell_sets.pop("GRID_L1_1_1")[:1]
+        mesh = mocmg.mesh.Mesh(pin_1and2_vertices, pin_1and2_cells, cell_sets, name="both_pins")
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.make_gridmesh(mesh)
+
+    def test_make_gridmesh_processes(self):
+        """Test making the leaf meshes with worker processes."""
+        mocmg.initialize()
+        mesh = mocmg.mesh.Mesh(
+            three_level_grid_vertices, three_level_grid_cells, three_level_grid_cell_sets
+        )
+        ref_grid_mesh = mocmg.mesh.make_gridmesh(mesh)
+        for method in ["fork", "spawn"]:
+            with start_method(method):
+                grid_mesh = mocmg.mesh.make_gridmesh(mesh, processes=2)
+            ref_meshes = [ref_grid_mesh]
+            meshes = [grid_mesh]
+            while ref_meshes:
+                ref_mesh = ref_meshes.pop()
+                test_mesh = meshes.pop()
+                self.assertEqual(ref_mesh.name, test_mesh.name)
+                if ref_mesh.children is not None:
+                    self.assertEqual(len(ref_mesh.children), len(test_mesh.children))
+                    ref_meshes.extend(ref_mesh.children)
+                    meshes.extend(test_mesh.children)
+                    continue
+                self.assertEqual(ref_mesh.vertex_ids.tolist(), test_mesh.vertex_ids.tolist())
+                self.assertEqual(ref_mesh.vertex_coords.tolist(), test_mesh.vertex_coords.tolist())
+                for cell_type, ids in ref_mesh.cell_ids.items():
+                    self.assertEqual(ids.tolist(), test_mesh.cell_ids[cell_type].tolist())
+                    self.assertEqual(
+                        ref_mesh.cell_connectivity[cell_type].tolist(),
+                        test_mesh.cell_connectivity[cell_type].tolist(),
+                    )
+                self.assertEqual(list(ref_mesh.cell_ids), list(test_mesh.cell_ids))
+                for set_name, ids in ref_mesh.cell_sets.items():
+                    self.assertEqual(ids.tolist(), test_mesh.cell_sets[set_name].tolist())
+                self.assertEqual(list(ref_mesh.cell_sets), list(test_mesh.cell_sets))
+
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.make_gridmesh(mesh, processes=0)
+
+    def test_make_gridmesh_grid_lookup(self):
+        """Test finding grids, children, and neighbors in a GridMesh hierarchy."""
+        mocmg.initialize()
+        mesh = mocmg.mesh.Mesh(
+            three_level_grid_vertices, three_level_grid_cells, three_level_grid_cell_sets
+        )
+        grid_mesh = mocmg.mesh.make_gridmesh(mesh)
+        self.assertEqual(grid_mesh.grid_index, None)
+        # get_grid
+        grid = grid_mesh.get_grid("GRID_L3_2_3")
+        self.assertEqual(grid.name, "GRID_L3_2_3")
+        self.assertEqual(grid.grid_index, (3, 2, 3))
+        self.assertIs(grid_mesh.get_grid((3, 2, 3)), grid)
+        self.assertIs(grid_mesh.get_grid("Grid_L3_02_03"), grid)
+        self.assertIs(grid.get_grid("GRID_L1_1_1"), grid_mesh.children[0])
+        self.assertIs(grid.get_grid("mesh_domain"), grid_mesh)
+        with self.assertRaises(SystemExit):
+            grid_mesh.get_grid("GRID_L3_5_1")
+        # parent and get_child
+        self.assertEqual(grid.parent.name, "GRID_L2_1_2")
+        self.assertIs(grid.parent.get_child(2, 3), grid)
+        self.assertIsNone(grid.parent.get_child(3, 3))
+        self.assertIsNone(grid.get_child(1, 1))
+        self.assertIs(grid_mesh.get_child(1, 1), grid_mesh.children[0])
+        # get_neighbor
+        self.assertEqual(grid.get_neighbor("east").name, "GRID_L3_3_3")
+        self.assertEqual(grid.get_neighbor("West").name, "GRID_L3_1_3")
+        self.assertEqual(grid.get_neighbor("north").name, "GRID_L3_2_4")
+        self.assertEqual(grid.get_neighbor("south").name, "GRID_L3_2_2")
+        neighbors = grid_mesh.get_grid("GRID_L2_2_2").get_neighbors()
+        self.assertEqual(neighbors["west"].name, "GRID_L2_1_2")
+        self.assertEqual(neighbors["south"].name, "GRID_L2_2_1")
+        self.assertIsNone(neighbors["east"])
+        self.assertIsNone(neighbors["north"])
+        with self.assertRaises(SystemExit):
+            grid.get_neighbor("up")
+        with self.assertRaises(SystemExit):
+            grid_mesh.get_neighbor("east")
+
+    def test_make_gridmesh_locate_points(self):
+        """Test finding the cells that contain points in a GridMesh hierarchy."""
+        mocmg.initialize()
+        for vertices, cells, cell_sets in [
+            (three_level_grid_vertices, three_level_grid_cells, three_level_grid_cell_sets),
+            (pin_1and2_vertices, pin_1and2_cells, pin_1and2_cell_sets),
+        ]:
+            mesh = mocmg.mesh.Mesh(vertices, cells, cell_sets)
+            grid_mesh = mocmg.mesh.make_gridmesh(mesh)
+            leaf_names = [name for name in cell_sets if name.startswith("GRID_L")]
+            max_level = max(int(name[6]) for name in leaf_names)
+            leaf_names = [name for name in leaf_names if int(name[6]) == max_level]
+            # The centroid of the linear vertices of each cell is inside the cell
+            ref_cell_ids = []
+            centroids = []
+            for cell_type in cells:
+                nlin = 3 if cell_type.startswith("triangle") else 4
+                for cell_id, cell_vertices in cells[cell_type].items():
+                    ref_cell_ids.append(cell_id)
+                    coords = np.array([vertices[v] for v in cell_vertices[:nlin]])
+                    centroids.append(coords.mean(axis=0))
+            cell_ids, names = grid_mesh.locate_points(np.array(centroids))
+            self.assertEqual(cell_ids.tolist(), ref_cell_ids)
+            for cell_id, name in zip(cell_ids, names):
+                ref_name = [n for n in leaf_names if cell_id in cell_sets[n]][0]
+                self.assertEqual(name, ref_name)
+            # Points outside of the mesh
+            cell_ids, names = grid_mesh.locate_points([[-1.0, -1.0], [1.0e3, 0.0]])
+            self.assertEqual(cell_ids.tolist(), [-1, -1])
+            self.assertEqual(names.tolist(), ["", ""])
+            # A leaf finds its own cells
+            leaf = grid_mesh.get_grid(leaf_names[0])
+            cell_ids, names = leaf.locate_points(np.array(centroids))
+            self.assertEqual(set(cell_ids[cell_ids >= 0].tolist()), set(cell_sets[leaf_names[0]]))
+            self.assertEqual(set(names.tolist()), {leaf_names[0], ""})
@@ -1,4 +1,5 @@
 """Test the mesh class and its functions."""
+
 from unittest import TestCase
 
 import numpy as np
@@ -161,6 +162,21 @@ class TestMesh(TestCase):
         cell_area = mesh.get_cell_area(1)
         self.assertAlmostEqual(cell_area, 1.0, 6)
 
+    def test_get_cell_areas(self):
+        """Test the batched cell area computation on a mixed topology mesh."""
+        mocmg.initialize()
+        mesh = mocmg.mesh.Mesh(two_disks_tri6_quad8_vertices, two_disks_tri6_quad8_cells)
+        areas = mesh.get_cell_areas()
+        self.assertEqual(list(areas.keys()), ["triangle6", "quad8"])
+        self.assertEqual(len(areas["triangle6"]), 7)
+        self.assertEqual(len(areas["quad8"]), 6)
+        for cell_type in areas:
+            for i, cell in enumerate(mesh.cell_ids[cell_type]):
+                self.assertEqual(areas[cell_type][i], mesh.get_cell_area(cell))
+        # Both disks have radius 1
+        self.assertAlmostEqual(areas["triangle6"].sum(), np.pi, 2)
+        self.assertAlmostEqual(areas["quad8"].sum(), np.pi, 2)
+
     def test_on_mixed_topology(self):
         """Test the mesh class functions on a mixed topology mesh."""
         ref_vertices = two_disks_tri6_quad8_vertices
@@ -175,3 +191,82 @@ class TestMesh(TestCase):
         for i, vset in enumerate(verts_from_cells_ref):
             for j, v in enumerate(vset):
                 self.assertEqual(v, verts_from_cells[i][j])
+
+    def test_arrays(self):
+        """Test the array storage of the mesh and the dictionary views."""
+        mocmg.initialize()
+        # dict -> arrays
+        mesh = mocmg.mesh.Mesh(two_disks_tri6_quad8_vertices, two_disks_tri6_quad8_cells)
+        self.assertTrue(np.array_equal(mesh.vertex_ids, list(two_disks_tri6_quad8_vertices.keys())))
+        self.assertEqual(mesh.vertex_coords.shape, (len(two_disks_tri6_quad8_vertices), 3))
+        self.assertEqual(list(mesh.cell_ids.keys()), ["triangle6", "quad8"])
+        self.assertTrue(np.array_equal(mesh.cell_ids["quad8"], [8, 9, 10, 11, 12, 13]))
+        self.assertTrue(
+            np.array_equal(mesh.cell_connectivity["quad8"][0], [19, 20, 39, 41, 27, 42, 43, 44])
+        )
+        self.assertEqual(mesh.n_cells(), 13)
+        # rows
+        rows = mesh.get_vertex_rows([2, 49, 1])
+        self.assertTrue(np.array_equal(mesh.vertex_ids[rows], [2, 49, 1]))
+        rows = mesh.get_cell_rows("quad8", np.array([[13, 8]]))
+        self.assertTrue(np.array_equal(rows, [[5, 0]]))
+        with self.assertRaises(SystemExit):
+            mesh.get_vertex_rows([1111111])
+        with self.assertRaises(SystemExit):
+            mesh.get_cell_rows("quad8", [1])
+        # cell types and rows
+        types, rows = mesh.get_cell_types_and_rows(np.array([13, 1, 7, 8]))
+        self.assertTrue(np.array_equal(types, [1, 0, 0, 1]))
+        self.assertTrue(np.array_equal(rows, [5, 0, 6, 0]))
+        with self.assertRaises(SystemExit):
+            mesh.get_cell_types_and_rows([1, 14])
+        # arrays -> dict
+        mesh = mocmg.mesh.Mesh.from_arrays(
+            np.array([5, 3, 7, 9]),
+            np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 1.0, 0.0], [0.0, 1.0, 0.0]]),
+            {"triangle": np.array([2, 1])},
+            {"triangle": np.array([[5, 3, 7], [5, 7, 9]])},
+            {"MATERIAL_UO2": np.array([1, 2])},
+            name="square",
+        )
+        self.assertEqual(mesh.name, "square")
+        self.assertEqual(list(mesh.vertices.keys()), [5, 3, 7, 9])
+        self.assertTrue(np.array_equal(mesh.vertices[7], [1.0, 1.0, 0.0]))
+        self.assertEqual(list(mesh.cells["triangle"].keys()), [2, 1])
+        self.assertTrue(np.array_equal(mesh.cells["triangle"][1], [5, 7, 9]))
+        self.assertTrue(np.array_equal(mesh.get_vertices("MATERIAL_UO2"), [3, 5, 7, 9]))
+        self.assertAlmostEqual(mesh.get_set_area("MATERIAL_UO2"), 1.0, 6)
+        # assigning a new dict replaces the arrays and the cell index
+        self.assertTrue(np.array_equal(mesh.get_cell_rows("triangle", [1, 2]), [1, 0]))
+        mesh.cells = {"quad": {1: np.array([5, 3, 7, 9])}}
+        self.assertEqual(list(mesh.cell_ids.keys()), ["quad"])
+        self.assertEqual(mesh.n_cells(), 1)
+        self.assertTrue(np.array_equal(mesh.get_cell_rows("quad", [1]), [0]))
+        with self.assertRaises(SystemExit):
+            mesh.get_cell_rows("triangle", [1])
+        with self.assertRaises(SystemExit):
+            mesh.get_cell_types_and_rows([2])
+
+    def test_compact_arrays(self):
+        """Test storing the mesh arrays with smaller data types."""
+        mocmg.initialize()
+        cell_sets = {"DISK1": np.array([1, 2, 3, 4, 5, 6, 7])}
+        ref_mesh = mocmg.mesh.Mesh(
+            two_disks_tri6_quad8_vertices, two_disks_tri6_quad8_cells, cell_sets
+        )
+        mesh = mocmg.mesh.Mesh(two_disks_tri6_quad8_vertices, two_disks_tri6_quad8_cells, cell_sets)
+        mesh.compact_arrays(coordinate_dtype="float32")
+        self.assertEqual(mesh.vertex_ids.dtype, np.uint8)
+        self.assertEqual(mesh.vertex_coords.dtype, np.float32)
+        for cell_type in ref_mesh.cell_ids:
+            self.assertEqual(mesh.cell_ids[cell_type].dtype, np.uint8)
+            self.assertEqual(mesh.cell_connectivity[cell_type].dtype, np.uint8)
+            self.assertTrue(
+                np.array_equal(
+                    mesh.cell_connectivity[cell_type], ref_mesh.cell_connectivity[cell_type]
+                )
+            )
+        self.assertEqual(mesh.cell_sets["DISK1"].dtype, np.uint8)
+        self.assertTrue(np.allclose(mesh.vertex_coords, ref_mesh.vertex_coords, atol=1e-7))
+        self.assertAlmostEqual(mesh.get_set_area("DISK1"), ref_mesh.get_set_area("DISK1"), 6)
+        self.assertTrue(np.array_equal(mesh.get_vertices("DISK1"), ref_mesh.get_vertices("DISK1")))
@@ -0,0 +1,145 @@
+"""Test the ray tracing functions."""
+
+import os
+import sys
+from unittest import TestCase
+
+import numpy as np
+from mesh_data import (
+    linear_quadrilateral_cells,
+    linear_quadrilateral_vertices,
+    three_level_grid_cell_sets,
+    three_level_grid_cells,
+    three_level_grid_vertices,
+    two_disks_tri6_quad8_cells,
+    two_disks_tri6_quad8_vertices,
+)
+
+import mocmg
+import mocmg.mesh
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from testing_utils import start_method
+
+
+class TestRayTracing(TestCase):
+    """Test the ray tracing functions."""
+
+    def test_trace_tracks_quads(self):
+        """Test the segments of tracks through two squares."""
+        mocmg.initialize()
+        vertices = {
+            1: np.array([0.0, 0.0, 0.0]),
+            2: np.array([1.0, 0.0, 0.0]),
+            3: np.array([2.0, 0.0, 0.0]),
+            4: np.array([0.0, 1.0, 0.0]),
+            5: np.array([1.0, 1.0, 0.0]),
+            6: np.array([2.0, 1.0, 0.0]),
+        }
+        cells = {"quad": {1: np.array([1, 2, 5, 4]), 2: np.array([2, 3, 6, 5])}}
+        mesh = mocmg.mesh.Mesh(vertices, cells)
+        tracks = mocmg.mesh.trace_tracks(mesh, 0.0, 0.5)
+        self.assertTrue(np.allclose(tracks["starts"], [[0.0, 0.25], [0.0, 0.75]]))
+        self.assertTrue(np.allclose(tracks["ends"], [[2.0, 0.25], [2.0, 0.75]]))
+        self.assertEqual(tracks["offsets"].tolist(), [0, 2, 4])
+        self.assertEqual(tracks["cell_ids"].tolist(), [1, 2, 1, 2])
+        self.assertTrue(np.allclose(tracks["lengths"], 1.0))
+        # Tracks in the opposite direction cross the cells in the opposite order
+        tracks = mocmg.mesh.trace_tracks(mesh, np.pi, 0.5)
+        self.assertEqual(tracks["cell_ids"].tolist(), [2, 1, 2, 1])
+        # Diagonal tracks
+        tracks = mocmg.mesh.trace_tracks(mesh, np.pi / 4, 0.1)
+        for i in range(len(tracks["starts"])):
+            length = np.linalg.norm(tracks["ends"][i] - tracks["starts"][i])
+            segments = tracks["lengths"][tracks["offsets"][i] : tracks["offsets"][i + 1]]
+            self.assertAlmostEqual(segments.sum(), length)
+        # Errors
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.trace_tracks(mesh, 0.0, 0.0)
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.trace_tracks(mesh, 0.0, 0.5, processes=0)
+
+    def test_trace_tracks_shared_edges(self):
+        """Test that tracks along edges shared by two cells are only counted once."""
+        mocmg.initialize()
+        # A 2 by 2 grid of unit squares, and the same squares split into triangles
+        vertices = {
+            3 * j + i + 1: np.array([float(i), float(j), 0.0]) for j in range(3) for i in range(3)
+        }
+        corners = [np.array([1, 2, 5, 4]) + 3 * j + i for j in range(2) for i in range(2)]
+        quads = {"quad": {i + 1: corner for i, corner in enumerate(corners)}}
+        triangles = {"triangle": {}}
+        for i, corner in enumerate(corners):
+            triangles["triangle"][2 * i + 1] = corner[[0, 1, 2]]
+            triangles["triangle"][2 * i + 2] = corner[[0, 2, 3]]
+        for cells, angle, spacing in [
+            (quads, 0.0, 2.0 / 3.0),
+            (quads, np.pi / 2, 2.0 / 3.0),
+            (quads, np.pi, 2.0 / 3.0),
+            (triangles, np.pi / 4, np.sqrt(2.0) / 3.0),
+            (triangles, 5 * np.pi / 4, np.sqrt(2.0) / 3.0),
+        ]:
+            mesh = mocmg.mesh.Mesh(vertices, cells)
+            tracks = mocmg.mesh.trace_tracks(mesh, angle, spacing)
+            offsets = tracks["offsets"]
+            for i in range(len(tracks["starts"])):
+                length = np.linalg.norm(tracks["ends"][i] - tracks["starts"][i])
+                segments = tracks["lengths"][offsets[i] : offsets[i + 1]]
+                self.assertAlmostEqual(segments.sum(), length)
+                self.assertTrue(np.all(segments > 0.1))
+
+    def test_trace_tracks_concave(self):
+        """Test that a track that enters a concave cell twice has two segments in it."""
+        mocmg.initialize()
+        # A square whose top edge bends down to y = 1 + (x - 1)^2
+        vertices = {
+            1: np.array([0.0, 0.0, 0.0]),
+            2: np.array([2.0, 0.0, 0.0]),
+            3: np.array([2.0, 2.0, 0.0]),
+            4: np.array([0.0, 2.0, 0.0]),
+            5: np.array([1.0, 0.0, 0.0]),
+            6: np.array([2.0, 1.0, 0.0]),
+            7: np.array([1.0, 1.0, 0.0]),
+            8: np.array([0.0, 1.0, 0.0]),
+        }
+        cells = {"quad8": {1: np.array([1, 2, 3, 4, 5, 6, 7, 8])}}
+        mesh = mocmg.mesh.Mesh(vertices, cells)
+        tracks = mocmg.mesh.trace_tracks(mesh, 0.0, 0.5)
+        self.assertTrue(np.allclose(tracks["starts"][:, 1], [0.25, 0.75, 1.25, 1.75]))
+        self.assertEqual(tracks["offsets"].tolist(), [0, 1, 2, 4, 6])
+        self.assertEqual(tracks["cell_ids"].tolist(), [1, 1, 1, 1, 1, 1])
+        gap = np.sqrt(0.75)
+        self.assertTrue(np.allclose(tracks["lengths"], [2.0, 2.0, 0.5, 0.5, 1.0 - gap, 1.0 - gap]))
+
+    def test_trace_tracks_areas(self):
+        """Test that the segment lengths times the spacing approximate the cell areas."""
+        mocmg.initialize()
+        spacing = 0.002
+        for vertices, cells in [
+            (linear_quadrilateral_vertices, linear_quadrilateral_cells),
+            (two_disks_tri6_quad8_vertices, two_disks_tri6_quad8_cells),
+        ]:
+            mesh = mocmg.mesh.Mesh(vertices, cells)
+            ref_areas = mesh.get_cell_areas()
+            for angle in [0.3, 2.0]:
+                tracks = mocmg.mesh.trace_tracks(mesh, angle, spacing)
+                areas = np.bincount(tracks["cell_ids"], weights=tracks["lengths"]) * spacing
+                for cell_type, cell_ids in mesh.cell_ids.items():
+                    self.assertTrue(np.allclose(areas[cell_ids], ref_areas[cell_type], rtol=1.0e-2))
+
+    def test_trace_tracks_gridmesh(self):
+        """Test tracing the leaves of a grid mesh, with and without worker processes."""
+        mocmg.initialize()
+        mesh = mocmg.mesh.Mesh(
+            three_level_grid_vertices, three_level_grid_cells, three_level_grid_cell_sets
+        )
+        grid_mesh = mocmg.mesh.make_gridmesh(mesh)
+        ref_tracks = mocmg.mesh.trace_tracks(mesh, 1.0, 0.1)
+        tracks = mocmg.mesh.trace_tracks(grid_mesh, 1.0, 0.1)
+        for key, ref_array in ref_tracks.items():
+            self.assertTrue(np.allclose(tracks[key], ref_array))
+        for method in ["fork", "spawn"]:
+            with start_method(method):
+                parallel_tracks = mocmg.mesh.trace_tracks(grid_mesh, 1.0, 0.1, processes=2)
+            for key, array in tracks.items():
+                self.assertTrue(np.array_equal(parallel_tracks[key], array))
@@ -0,0 +1,95 @@
+"""Test the bounding volume hierarchy class."""
+
+import os
+from unittest import TestCase
+
+import numpy as np
+from mesh_data import (
+    linear_triangle_cells,
+    linear_triangle_vertices,
+    two_disks_tri6_quad8_cells,
+    two_disks_tri6_quad8_vertices,
+)
+
+import mocmg
+import mocmg.mesh
+from mocmg.mesh.spatial_index import _point_cell_distances
+
+
+class TestBoundingVolumeHierarchy(TestCase):
+    """Test the bounding volume hierarchy class."""
+
+    def test_queries(self):
+        """Test point, box, and nearest cell queries against testing every cell."""
+        mocmg.initialize()
+        rng = np.random.default_rng(0)
+        for vertices, cells in [
+            (linear_triangle_vertices, linear_triangle_cells),
+            (two_disks_tri6_quad8_vertices, two_disks_tri6_quad8_cells),
+        ]:
+            mesh = mocmg.mesh.Mesh(vertices, cells)
+            bvh = mocmg.mesh.BoundingVolumeHierarchy(mesh, leaf_size=2)
+            all_ids = np.concatenate(list(mesh.cell_ids.values()))
+            self.assertEqual(sorted(bvh.cell_ids.tolist()), sorted(all_ids.tolist()))
+            lower = mesh.vertex_coords[:, :2].min(axis=0) - 0.5
+            upper = mesh.vertex_coords[:, :2].max(axis=0) + 0.5
+            xy = lower + rng.random((500, 2)) * (upper - lower)
+            # locate_points
+            cell_ids = bvh.locate_points(xy)
+            self.assertTrue(np.array_equal(cell_ids, mesh._find_cells_containing_points(xy)))
+            self.assertTrue(np.any(cell_ids >= 0))
+            self.assertTrue(np.any(cell_ids == -1))
+            # query_boxes
+            boxes = np.stack([xy, xy + 0.25], axis=1)
+            offsets, box_cells = bvh.query_boxes(boxes)
+            self.assertEqual(len(offsets), len(boxes) + 1)
+            all_boxes = np.concatenate(list(mesh.get_cell_bounding_boxes().values()))
+            for i, box in enumerate(boxes):
+                overlap = np.all((all_boxes[:, 0] <= box[1]) & (box[0] <= all_boxes[:, 1]), axis=1)
+                self.assertEqual(
+                    sorted(box_cells[offsets[i] : offsets[i + 1]].tolist()),
+                    sorted(all_ids[overlap].tolist()),
+                )
+            # nearest_cells
+            nearest, distances = bvh.nearest_cells(xy)
+            ref_distances = np.full((len(xy), len(all_ids)), np.inf)
+            column = 0
+            for cell_type, connectivity in mesh.cell_connectivity.items():
+                coords = mesh.vertex_coords[mesh.get_vertex_rows(connectivity)]
+                for row in range(len(connectivity)):
+                    ref_distances[:, column] = _point_cell_distances(
+                        cell_type, np.repeat(coords[row : row + 1], len(xy), axis=0), xy
+                    )
+                    column += 1
+            self.assertTrue(np.allclose(distances, ref_distances.min(axis=1)))
+            self.assertTrue(np.all(distances[cell_ids >= 0] == 0.0))
+            inside_nearest, inside_distances = bvh.nearest_cells(xy[cell_ids >= 0])
+            self.assertTrue(np.array_equal(inside_nearest, cell_ids[cell_ids >= 0]))
+            self.assertTrue(np.all(inside_distances == 0.0))
+            columns = [all_ids.tolist().index(cell_id) for cell_id in nearest]
+            self.assertTrue(np.allclose(ref_distances[np.arange(len(xy)), columns], distances))
+
+    def test_hdf5(self):
+        """Test writing and reading the hierarchy."""
+        mocmg.initialize()
+        filename = "bvh_test.h5"
+        mesh = mocmg.mesh.Mesh(two_disks_tri6_quad8_vertices, two_disks_tri6_quad8_cells)
+        bvh = mocmg.mesh.BoundingVolumeHierarchy(mesh)
+        bvh.write_hdf5(filename)
+        # Writing again replaces the group
+        bvh.write_hdf5(filename)
+        read_bvh = mocmg.mesh.BoundingVolumeHierarchy.read_hdf5(filename, mesh)
+        self.assertEqual(read_bvh.leaf_size, bvh.leaf_size)
+        self.assertEqual(read_bvh.cell_types, bvh.cell_types)
+        for name in ["cell_ids", "cell_type_indices", "cell_rows", "cell_boxes"]:
+            self.assertTrue(np.array_equal(getattr(read_bvh, name), getattr(bvh, name)))
+        self.assertTrue(np.array_equal(read_bvh.node_boxes[1:], bvh.node_boxes[1:]))
+        xy = mesh.vertex_coords[:, :2] * 0.9
+        self.assertTrue(np.array_equal(read_bvh.locate_points(xy), bvh.locate_points(xy)))
+        # The hierarchy must match the mesh
+        other_mesh = mocmg.mesh.Mesh(linear_triangle_vertices, linear_triangle_cells)
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.BoundingVolumeHierarchy.read_hdf5(filename, other_mesh)
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.BoundingVolumeHierarchy.read_hdf5(filename, mesh, group_name="no_group")
+        os.remove(filename)
@@ -21,7 +21,7 @@ import mocmg
 import mocmg.mesh
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from testing_utils import captured_output
+from testing_utils import captured_output, start_method
 
 two_disks_tri6_quad8_cells_h5_ref = np.concatenate(
     [
@@ -464,6 +464,28 @@ class TestXDMFIO(TestCase):
 
         os.remove(filename + ".h5")
 
+    def test_disks_mixed_topology_with_overlapping_materials(self):
+        """Test writing xdmf file that has cells with more than one material."""
+        filename = "mixed_topology_disks_with_overlapping_materials"
+        vertices = two_disks_tri6_quad8_vertices
+        cells = two_disks_tri6_quad8_cells
+        cell_sets = {
+            "Material DISK1": np.array([1, 2, 3, 4, 5, 6, 7, 8]),
+            "Material DISK2": np.array([7, 8, 9, 10, 11, 12, 13]),
+        }
+        err_ref = ["ERROR     : mocmg.mesh.xdmf_IO - 2 cells were assigned more than one material."]
+        with self.assertRaises(SystemExit):
+            with captured_output() as (out, err):
+                mocmg.initialize()
+                mesh = mocmg.mesh.Mesh(vertices, cells, cell_sets=cell_sets)
+                mocmg.mesh.write_xdmf_file(filename + ".xdmf", mesh)
+
+        err = err.getvalue().splitlines()
+        err = [line.split(None, 1)[1] for line in [err[0]]]
+        self.assertEqual(err, err_ref)
+
+        os.remove(filename + ".h5")
+
     def test_three_level_grid(self):
         """Test writing a mesh with three grid levels and no materials."""
         name = "three_lvl_grid"
@@ -619,6 +641,116 @@ class TestXDMFIO(TestCase):
         os.remove(filename + ".xdmf")
         os.remove(filename + ".h5")
 
+    def test_gridmesh_two_pins_processes(self):
+        """Test writing a GridMesh for two pins with the leaf data computed by workers."""
+        filename = "gridmesh_two_pins"
+        ref_vertices = pin_1and2_vertices
+        ref_cells = pin_1and2_cells
+        ref_cell_sets = pin_1and2_cell_sets_1_level
+        mesh = mocmg.mesh.Mesh(ref_vertices, ref_cells, ref_cell_sets)
+        gridmesh = mocmg.mesh.make_gridmesh(mesh)
+        for method in ["fork", "spawn"]:
+            with start_method(method):
+                mocmg.mesh.write_xdmf_file(filename + ".xdmf", gridmesh, processes=2)
+
+            # Check xdmf
+            ref_file = open("./tests/mesh/xdmf_files/" + filename + ".xdmf", "r")
+            test_file = open(filename + ".xdmf", "r")
+            ref_lines = ref_file.readlines()
+            test_lines = test_file.readlines()
+            ref_file.close()
+            test_file.close()
+            self.assertEqual(ref_lines, test_lines)
+
+            # Check h5
+            with h5py.File("./tests/mesh/xdmf_files/" + filename + ".h5", "r") as ref_f:
+                with h5py.File(filename + ".h5", "r") as f:
+                    for grid in ["GRID_L1_1_1", "GRID_L1_2_1"]:
+                        self.assertEqual(set(f[grid].keys()), set(ref_f[grid].keys()))
+                        for dataset in ref_f[grid].keys():
+                            self.assertTrue(
+                                np.array_equal(f[grid][dataset][()], ref_f[grid][dataset][()])
+                            )
+
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.write_xdmf_file(filename + ".xdmf", gridmesh, processes=0)
+
+        os.remove(filename + ".xdmf")
+        os.remove(filename + ".h5")
+
+    def test_gridmesh_deduplicate(self):
+        """Test writing a GridMesh of translated copies of a pin with deduplication."""
+        filename = "gridmesh_deduplicate"
+        mesh = mocmg.mesh.Mesh(pin_1and2_vertices, pin_1and2_cells, pin_1and2_cell_sets_1_level)
+        pin = mocmg.mesh.make_gridmesh(mesh).children[0]
+        # The last copy has its vertices and cells in a different order, and the vertices of
+        # each cell start at a different corner
+        connectivity = pin.cell_connectivity["triangle6"]
+        reordered_pin = mocmg.mesh.Mesh.from_arrays(
+            pin.vertex_ids[::-1],
+            pin.vertex_coords[::-1],
+            {"triangle6": pin.cell_ids["triangle6"][::-1]},
+            {"triangle6": connectivity[::-1][:, [1, 2, 0, 4, 5, 3]]},
+            pin.cell_sets,
+        )
+        pins = []
+        for i, (copy, offset) in enumerate([(pin, 0.0), (pin, 1.26), (reordered_pin, 2.52)]):
+            pins.append(
+                mocmg.mesh.GridMesh.from_arrays(
+                    copy.vertex_ids,
+                    copy.vertex_coords + np.array([offset, 0.0, 0.0]),
+                    copy.cell_ids,
+                    copy.cell_connectivity,
+                    copy.cell_sets,
+                    name=f"GRID_L1_{i + 1}_1",
+                )
+            )
+        gridmesh = mocmg.mesh.GridMesh(children=pins, name="lattice")
+        mocmg.mesh.write_xdmf_file("ref_" + filename + ".xdmf", gridmesh)
+        mocmg.mesh.write_xdmf_file(filename + ".xdmf", gridmesh, deduplicate=True)
+
+        # The xdmf only differs in the h5 file name
+        with open("ref_" + filename + ".xdmf", "r") as ref_file:
+            ref_lines = [line.replace("ref_", "") for line in ref_file.readlines()]
+        with open(filename + ".xdmf", "r") as test_file:
+            test_lines = test_file.readlines()
+        self.assertEqual(ref_lines, test_lines)
+
+        # Check h5
+        with h5py.File(filename + ".h5", "r") as f:
+            for grid in ["GRID_L1_2_1", "GRID_L1_3_1"]:
+                for dataset in ["cells", "material_id", "Pin_1"]:
+                    self.assertEqual(f[grid][dataset].id, f["GRID_L1_1_1"][dataset].id)
+                self.assertNotEqual(f[grid]["vertices"].id, f["GRID_L1_1_1"]["vertices"].id)
+                self.assertEqual(f[grid].attrs["instance"], "GRID_L1_1_1")
+            self.assertNotIn("instance", f["GRID_L1_1_1"].attrs)
+            self.assertTrue(np.allclose(f["GRID_L1_2_1"].attrs["offset"], [1.26, 0.0, 0.0]))
+            self.assertTrue(np.allclose(f["GRID_L1_3_1"].attrs["offset"], [2.52, 0.0, 0.0]))
+        self.assertLess(
+            os.path.getsize(filename + ".h5"), os.path.getsize("ref_" + filename + ".h5")
+        )
+
+        # The data is read as if it was not deduplicated
+        read_mesh = mocmg.mesh.read_xdmf_file(filename + ".xdmf")
+        for child, ref_child in zip(read_mesh.children, pins):
+            # The vertices and cells of each leaf are in canonical order
+            coords = child.vertex_coords
+            ref_coords = ref_child.vertex_coords
+            self.assertTrue(
+                np.array_equal(
+                    coords[np.lexsort(coords.T[::-1])], ref_coords[np.lexsort(ref_coords.T[::-1])]
+                )
+            )
+            self.assertEqual(child.n_cells(), ref_child.n_cells())
+            for set_name in ref_child.cell_sets:
+                self.assertAlmostEqual(
+                    child.get_set_area(set_name), ref_child.get_set_area(set_name)
+                )
+
+        for prefix in ["", "ref_"]:
+            os.remove(prefix + filename + ".xdmf")
+            os.remove(prefix + filename + ".h5")
+
     def test_gridmesh_two_pins_split_level_negative(self):
         """Test writing a GridMesh for two pins but the split level is negative."""
         filename = "gridmesh_two_pins"
@@ -694,3 +826,282 @@ class TestXDMFIO(TestCase):
         os.remove(filename + "_GRID_L1_1_1.h5")
         os.remove(filename + "_GRID_L1_2_1.xdmf")
         os.remove(filename + "_GRID_L1_2_1.h5")
+
+    def test_read_disks_mixed_topology_with_materials(self):
+        """Test reading xdmf file for two disks with mixed topology and materials."""
+        filename = "./tests/mesh/xdmf_files/mixed_topology_disks_with_materials.xdmf"
+        ref_vertices = two_disks_tri6_quad8_vertices
+        ref_cells = two_disks_tri6_quad8_cells
+        ref_cell_sets = {
+            "MATERIAL_DISK1": np.array([1, 2, 3, 4, 5, 6, 7]),
+            "MATERIAL_DISK2": np.array([8, 9, 10, 11, 12, 13]),
+        }
+        out_ref = [
+            "INFO      : mocmg.mesh.xdmf_IO - Reading mesh data from XDMF file '" + filename + "'.",
+        ]
+        err_ref = []
+        with captured_output() as (out, err):
+            mocmg.initialize()
+            mesh = mocmg.mesh.read_xdmf_file(filename)
+
+        # message
+        out, err = out.getvalue().splitlines(), err.getvalue().splitlines()
+        # strip times
+        out = [line.split(None, 1)[1] for line in out]
+        err = [line.split(None, 1)[1] for line in err]
+        self.assertEqual(out, out_ref)
+        self.assertEqual(err, err_ref)
+
+        self.assertIsInstance(mesh, mocmg.mesh.Mesh)
+        self.assertEqual(mesh.name, "mixed_topology_disks_with_materials")
+        # Vertices
+        self.assertEqual(list(mesh.vertices.keys()), list(ref_vertices.keys()))
+        for i in ref_vertices:
+            self.assertTrue(np.array_equal(mesh.vertices[i], ref_vertices[i]))
+        # Cells
+        self.assertEqual(list(mesh.cells.keys()), list(ref_cells.keys()))
+        for cell_type in ref_cells:
+            self.assertEqual(list(mesh.cells[cell_type].keys()), list(ref_cells[cell_type].keys()))
+            for i in ref_cells[cell_type]:
+                self.assertTrue(np.array_equal(mesh.cells[cell_type][i], ref_cells[cell_type][i]))
+        # Cell sets
+        self.assertEqual(list(mesh.cell_sets.keys()), list(ref_cell_sets.keys()))
+        for set_name in ref_cell_sets:
+            self.assertTrue(np.array_equal(mesh.cell_sets[set_name], ref_cell_sets[set_name]))
+
+    def test_read_gridmesh_two_pins(self):
+        """Test reading the xdmf file of a GridMesh for two pins with materials."""
+        filename = "./tests/mesh/xdmf_files/gridmesh_two_pins.xdmf"
+        ref_vertices = pin_1and2_vertices
+        ref_cells = pin_1and2_cells
+        ref_cell_sets = pin_1and2_cell_sets_1_level
+        mesh = mocmg.mesh.Mesh(ref_vertices, ref_cells, ref_cell_sets)
+        ref_gridmesh = mocmg.mesh.make_gridmesh(mesh)
+        gridmesh = mocmg.mesh.read_xdmf_file(filename)
+
+        self.assertIsInstance(gridmesh, mocmg.mesh.GridMesh)
+        self.assertEqual(gridmesh.name, "mesh_domain")
+        self.assertEqual(len(gridmesh.children), 2)
+        for child, ref_child in zip(gridmesh.children, ref_gridmesh.children):
+            self.assertIsInstance(child, mocmg.mesh.GridMesh)
+            self.assertEqual(child.name, ref_child.name)
+            self.assertIs(child.parent, gridmesh)
+            # The IDs are renumbered, so compare the coordinates of each cell's vertices.
+            self.assertEqual(child.n_cells(), ref_child.n_cells())
+            for cell_type in ref_child.cells:
+                ref_coords = ref_child.vertex_coords[
+                    ref_child.get_vertex_rows(ref_child.cell_connectivity[cell_type])
+                ]
+                coords = child.vertex_coords[
+                    child.get_vertex_rows(child.cell_connectivity[cell_type])
+                ]
+                self.assertTrue(np.array_equal(coords, ref_coords))
+            self.assertEqual(set(child.cell_sets.keys()), set(ref_child.cell_sets.keys()))
+            for set_name in ref_child.cell_sets:
+                self.assertAlmostEqual(
+                    child.get_set_area(set_name), ref_child.get_set_area(set_name)
+                )
+
+    def test_read_gridmesh_unique_ids(self):
+        """Test that the vertex and cell IDs of a GridMesh read from xdmf are unique."""
+        mocmg.initialize()
+        for filename in [
+            "./tests/mesh/xdmf_files/gridmesh_two_pins.xdmf",
+            "./tests/mesh/xdmf_files/gridmesh_three_level_grid.xdmf",
+        ]:
+            gridmesh = mocmg.mesh.read_xdmf_file(filename)
+            leaves = []
+            meshes = [gridmesh]
+            while meshes:
+                mesh = meshes.pop()
+                if mesh.children is None:
+                    leaves.append(mesh)
+                else:
+                    meshes.extend(mesh.children)
+            vertex_ids = np.concatenate([leaf.vertex_ids for leaf in leaves])
+            cell_ids = np.concatenate([ids for leaf in leaves for ids in leaf.cell_ids.values()])
+            self.assertEqual(len(np.unique(vertex_ids)), len(vertex_ids))
+            self.assertEqual(len(np.unique(cell_ids)), len(cell_ids))
+            self.assertEqual(gridmesh.n_cells(), len(cell_ids))
+            for set_name in gridmesh._get_summary()["set_areas"]:
+                set_cells = gridmesh.get_cells(set_name)
+                self.assertEqual(len(np.unique(set_cells)), len(set_cells))
+
+    def test_read_grid_name(self):
+        """Test reading one grid of a GridMesh xdmf file."""
+        filename = "./tests/mesh/xdmf_files/gridmesh_three_level_grid.xdmf"
+        gridmesh = mocmg.mesh.read_xdmf_file(filename, grid_name="GRID_L2_1_1")
+        self.assertEqual(gridmesh.name, "GRID_L2_1_1")
+        self.assertEqual(
+            [child.name for child in gridmesh.children],
+            ["GRID_L3_1_1", "GRID_L3_2_1", "GRID_L3_1_2", "GRID_L3_2_2"],
+        )
+        leaf = gridmesh.children[0]
+        self.assertEqual(leaf.n_cells(), 4)
+        self.assertTrue(
+            np.array_equal(
+                leaf.cell_connectivity["quad"],
+                [[5, 2, 6, 9], [6, 3, 7, 9], [1, 5, 9, 8], [4, 8, 9, 7]],
+            )
+        )
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.read_xdmf_file(filename, grid_name="GRID_L4_1_1")
+
+    def test_gridmesh_two_pins_split_level_processes(self):
+        """Test writing a GridMesh for two pins split at level 1, one file per worker."""
+        filename = "gridmesh_two_pins"
+        ref_vertices = pin_1and2_vertices
+        ref_cells = pin_1and2_cells
+        ref_cell_sets = pin_1and2_cell_sets_1_level
+        mesh = mocmg.mesh.Mesh(ref_vertices, ref_cells, ref_cell_sets)
+        gridmesh = mocmg.mesh.make_gridmesh(mesh)
+        for method in ["fork", "spawn"]:
+            with start_method(method):
+                files = mocmg.mesh.write_xdmf_file(
+                    filename + ".xdmf", gridmesh, split_level=1, processes=2
+                )
+            self.assertEqual(
+                files,
+                [
+                    (filename + "_GRID_L1_1_1.xdmf", filename + "_GRID_L1_1_1.h5"),
+                    (filename + "_GRID_L1_2_1.xdmf", filename + "_GRID_L1_2_1.h5"),
+                ],
+            )
+
+            # Just check first pin
+            # Check xdmf
+            ref_file = open("./tests/mesh/xdmf_files/gridmesh_two_pins_GRID_L1_1_1.xdmf", "r")
+            test_file = open(filename + "_GRID_L1_1_1.xdmf", "r")
+            ref_lines = ref_file.readlines()
+            test_lines = test_file.readlines()
+            ref_file.close()
+            test_file.close()
+            self.assertEqual(ref_lines, test_lines)
+
+            # Check h5
+            with h5py.File(
+                "./tests/mesh/xdmf_files/gridmesh_two_pins_GRID_L1_1_1.h5", "r"
+            ) as ref_f:
+                with h5py.File(filename + "_GRID_L1_1_1.h5", "r") as f:
+                    for dataset in ref_f["GRID_L1_1_1"].keys():
+                        self.assertTrue(
+                            np.array_equal(
+                                f["GRID_L1_1_1"][dataset][()], ref_f["GRID_L1_1_1"][dataset][()]
+                            )
+                        )
+
+            for xdmf_filename, h5_filename in files:
+                os.remove(xdmf_filename)
+                os.remove(h5_filename)
+
+    def test_storage(self):
+        """Test writing xdmf files with different HDF5 storage options."""
+        filename = "mixed_topology_disks_storage"
+        cell_sets = {
+            "DISK1": np.array([1, 2, 3, 4, 5, 6, 7]),
+            "Material DISK1": np.array([1, 2, 3, 4, 5, 6, 7]),
+            "Material DISK2": np.array([8, 9, 10, 11, 12, 13]),
+        }
+        with captured_output():
+            mocmg.initialize()
+        mesh = mocmg.mesh.Mesh(
+            two_disks_tri6_quad8_vertices, two_disks_tri6_quad8_cells, cell_sets=cell_sets
+        )
+        ref_files = mocmg.mesh.write_xdmf_file("ref_" + filename + ".xdmf", mesh)
+        with h5py.File(ref_files[0][1], "r") as f:
+            ref_data = {k: v[()] for k, v in f["ref_" + filename].items()}
+
+        storages = [
+            ("none", [(None, False, None)] * 4),
+            ("lzf", [("lzf", False, None)] * 4),
+            ("gzip_shuffle", [("gzip", True, None)] * 4),
+            (
+                {
+                    "compression": "lzf",
+                    "chunks": 16,
+                    "cells": {"compression": "gzip", "compression_opts": 9, "shuffle": True},
+                    "sets": "none",
+                    "material_id": {"contiguous_below": 1024},
+                },
+                [("lzf", False, (16, 3)), ("gzip", True, (16,)), (None, False, (7,))]
+                + [(None, False, None)],
+            ),
+        ]
+        for storage, ref_options in storages:
+            mocmg.mesh.write_xdmf_file(filename + ".xdmf", mesh, storage=storage)
+            with h5py.File(filename + ".h5", "r") as f:
+                group = f[filename]
+                for dataset, (compression, shuffle, chunks) in zip(
+                    ["vertices", "cells", "DISK1", "material_id"], ref_options
+                ):
+                    self.assertEqual(group[dataset].compression, compression)
+                    self.assertEqual(group[dataset].shuffle, shuffle)
+                    if chunks is not None or compression is None:
+                        self.assertEqual(group[dataset].chunks, chunks)
+                    self.assertTrue(np.array_equal(group[dataset][()], ref_data[dataset]))
+            # The xdmf is the same for every storage
+            with open("ref_" + filename + ".xdmf", "r") as ref_file:
+                ref_lines = [line.replace("ref_", "") for line in ref_file.readlines()]
+            with open(filename + ".xdmf", "r") as test_file:
+                self.assertEqual(ref_lines, test_file.readlines())
+
+        # Compact data types
+        storage = {"vertices": {"dtype": "float32", "drop_z": True}}
+        mocmg.mesh.write_xdmf_file(filename + ".xdmf", mesh, storage=storage, compact=True)
+        with h5py.File(filename + ".h5", "r") as f:
+            group = f[filename]
+            self.assertEqual(group["vertices"].dtype, np.float32)
+            self.assertEqual(group["vertices"].shape, (49, 2))
+            for dataset in ["cells", "DISK1", "material_id"]:
+                self.assertEqual(group[dataset].dtype, np.uint8)
+                self.assertTrue(np.array_equal(group[dataset][()], ref_data[dataset]))
+        read_mesh = mocmg.mesh.read_xdmf_file(filename + ".xdmf")
+        self.assertTrue(np.allclose(read_mesh.vertex_coords, mesh.vertex_coords, atol=1e-7))
+        for cell_type in mesh.cell_connectivity:
+            self.assertTrue(
+                np.array_equal(
+                    read_mesh.cell_connectivity[cell_type], mesh.cell_connectivity[cell_type]
+                )
+            )
+        self.assertTrue(np.array_equal(read_mesh.cell_sets["DISK1"], cell_sets["DISK1"]))
+        self.assertTrue(
+            np.array_equal(read_mesh.cell_sets["MATERIAL_DISK2"], cell_sets["Material DISK2"])
+        )
+        # Compact mesh arrays, with more unused vertices before the vertices of the cells than
+        # the connectivity type can hold
+        unused_ids = np.arange(1000, 1300)
+        compact_mesh = mocmg.mesh.Mesh.from_arrays(
+            np.concatenate([unused_ids, mesh.vertex_ids]),
+            np.concatenate([np.zeros((len(unused_ids), 3)), mesh.vertex_coords]),
+            mesh.cell_ids,
+            mesh.cell_connectivity,
+        )
+        compact_mesh.compact_arrays()
+        self.assertEqual(compact_mesh.cell_connectivity["quad8"].dtype, np.uint8)
+        mocmg.mesh.write_xdmf_file(filename + ".xdmf", compact_mesh)
+        read_mesh = mocmg.mesh.read_xdmf_file(filename + ".xdmf")
+        for cell_type, connectivity in mesh.cell_connectivity.items():
+            read_connectivity = read_mesh.cell_connectivity[cell_type]
+            self.assertTrue(
+                np.array_equal(
+                    read_mesh.vertex_coords[read_mesh.get_vertex_rows(read_connectivity)],
+                    mesh.vertex_coords[mesh.get_vertex_rows(connectivity)],
+                )
+            )
+        bad_mesh = mocmg.mesh.Mesh.from_arrays(
+            mesh.vertex_ids,
+            mesh.vertex_coords + np.array([0.0, 0.0, 1.0]),
+            mesh.cell_ids,
+            mesh.cell_connectivity,
+        )
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.write_xdmf_file(filename + ".xdmf", bad_mesh, storage=storage)
+
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.write_xdmf_file(filename + ".xdmf", mesh, storage="zstd")
+        with self.assertRaises(SystemExit):
+            mocmg.mesh.write_xdmf_file(filename + ".xdmf", mesh, storage={"cells": {"level": 1}})
+
+        for prefix in ["", "ref_"]:
+            os.remove(prefix + filename + ".xdmf")
+            os.remove(prefix + filename + ".h5")
@@ -1,4 +1,5 @@
 """Functions to help with code testing."""
+import multiprocessing
 import subprocess
 import sys
 from contextlib import contextmanager
@@ -31,3 +32,19 @@ def run_from_shell(cmd):
     )
     stdout, stderr = proc.communicate()
     return stdout, stderr
+
+
+@contextmanager
+def start_method(method):
+    """Set the default way that multiprocessing starts worker processes.
+
+    Example:
+        with start_method("spawn"):
+            some_function(processes=2)
+    """
+    old_method = multiprocessing.get_start_method(allow_none=True)
+    try:
+        multiprocessing.set_start_method(method, force=True)
+        yield
+    finally:
+        multiprocessing.set_start_method(old_method, force=True)